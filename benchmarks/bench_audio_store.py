@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Audio Store Benchmark
+Write, ranged read and compaction cost of the local and S3 audio backends, the S3 one against fake_s3.py
+
+    python benchmarks/bench_audio_store.py --blobs 200 --size 65536
+
+Each backend is checked before it is timed: bytes read back (whole and ranged)
+must match what was written, and compaction must keep the metadata of any blob
+whose delete failed so the next pass retries it.
+"""
+
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from common import PROJECTS_DIR, free_port, print_table
+from fake_s3 import start_fake_s3
+
+sys.path.insert(0, str(PROJECTS_DIR / "elevenlabs-voice-bot"))
+from audio_store import AudioMetadata, LocalBlobStore, S3BlobStore, compact  # noqa: E402
+
+BUCKET = "voice-audio"
+
+
+class FlakyStore:
+    """Wraps a backend so deletes of the given keys fail, like a permission or network error would"""
+
+    def __init__(self, store, failing):
+        self.store = store
+        self.failing = set(failing)
+
+    def __getattr__(self, name):
+        return getattr(self.store, name)
+
+    def delete(self, key):
+        if key in self.failing:
+            raise OSError(f"delete of {key} refused")
+        self.store.delete(key)
+
+
+def check_backend(store, metadata, refuse_deletes):
+    """Round-trip, ranged reads and compaction with failing deletes; raises AssertionError on any mismatch"""
+    data = os.urandom(200_000)
+    store.put("check-audio", data)
+    assert b"".join(store.read("check-audio")) == data, "full read mismatch"
+    assert b"".join(store.read("check-audio", 1000, 70_999)) == data[1000:71_000], "ranged read mismatch"
+    assert b"".join(store.read("check-audio", 150_000)) == data[150_000:], "open-ended range mismatch"
+    store.delete("check-audio")
+    store.delete("check-audio")  # deleting a missing blob is not an error
+
+    old = {"timestamp": datetime.now() - timedelta(days=2)}
+    ids = [f"check-expired-{i}" for i in range(7)]
+    for audio_id in ids:
+        store.put(audio_id, b"x")
+        metadata.add(audio_id, 1, old)
+    assert compact(refuse_deletes(ids[:3]), metadata, 3600, batch_size=2) == 4, "compaction removed the wrong count"
+    assert all(metadata.get(audio_id) for audio_id in ids[:3]), "metadata dropped for a blob that was not deleted"
+    assert b"".join(store.read(ids[0])) == b"x", "blob with a failed delete went missing"
+    assert compact(refuse_deletes([]), metadata, 3600) == 3, "failed deletes were not retried"
+    assert not any(metadata.get(audio_id) for audio_id in ids), "expired metadata left behind"
+
+
+def bench_backend(name, store, metadata, blobs, size):
+    payload = os.urandom(size)
+    ids = [f"bench-{name}-{i:06d}" for i in range(blobs)]
+
+    started = time.perf_counter()
+    for audio_id in ids:
+        store.put(audio_id, payload)
+    put_ms = (time.perf_counter() - started) / blobs * 1000
+
+    started = time.perf_counter()
+    for audio_id in ids:
+        start = random.randrange(size // 2)
+        assert b"".join(store.read(audio_id, start, start + 4095)) == payload[start:start + 4096]
+    range_ms = (time.perf_counter() - started) / blobs * 1000
+
+    old = {"timestamp": datetime.now() - timedelta(days=2)}
+    for audio_id in ids:
+        metadata.add(audio_id, size, old)
+    started = time.perf_counter()
+    removed = compact(store, metadata, 3600, batch_size=100)
+    compact_ms = (time.perf_counter() - started) / blobs * 1000
+    assert removed == blobs, f"{name}: compacted {removed} of {blobs}"
+
+    return {"backend": name, "put_ms": round(put_ms, 3), "range_read_ms": round(range_ms, 3),
+            "compact_ms_per_blob": round(compact_ms, 3)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--blobs", type=int, default=200)
+    parser.add_argument("--size", type=int, default=64 * 1024, help="bytes per blob")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds fake_s3.py adds per request")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    # boto3 signs every request, so it needs credentials even though fake_s3.py ignores them
+    os.environ.setdefault("AWS_ACCESS_KEY_ID", "fake")
+    os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "fake")
+    # The checks make deletes fail on purpose
+    logging.getLogger("audio_store").setLevel(logging.CRITICAL)
+    port = free_port()
+    s3_server = start_fake_s3(port, args.latency)
+
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        local = LocalBlobStore(os.path.join(tmp, "blobs"))
+        s3 = S3BlobStore(BUCKET, endpoint_url=f"http://127.0.0.1:{port}")
+
+        def refuse_s3_deletes(keys):
+            # Refused at the server, the way a bucket policy would, so boto3's error path is exercised too
+            s3_server.deny_delete = {f"{BUCKET}/{s3.prefix}{key}" for key in keys}
+            return s3
+
+        backends = [
+            ("local", local, lambda keys: FlakyStore(local, keys)),
+            ("s3", s3, refuse_s3_deletes),
+        ]
+        for name, store, refuse_deletes in backends:
+            metadata = AudioMetadata(os.path.join(tmp, f"{name}.sqlite3"))
+            check_backend(store, metadata, refuse_deletes)
+            rows.append(bench_backend(name, store, metadata, args.blobs, args.size))
+
+    result = {"blobs": args.blobs, "size": args.size, "checks": "passed", "backends": rows}
+    if args.json:
+        print(json.dumps(result, indent=2))
+        return
+    print_table(f"{args.blobs} blobs of {args.size:,} bytes (checks passed)", rows)
+
+
+if __name__ == "__main__":
+    main()
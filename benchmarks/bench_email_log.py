@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Email Log Benchmark
+Write throughput and /email-stats cost at 1M emails, in-memory dict scan vs the email bot's EmailLog.
+
+    python benchmarks/bench_email_log.py --records 1000000
+"""
+
+import argparse
+import json
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from common import PROJECTS_DIR, percentile, print_table
+
+sys.path.insert(0, str(PROJECTS_DIR / "email-automation-bot"))
+from email_log import EmailLog  # noqa: E402
+
+CATEGORIES = ["support", "sales", "billing", "general"]
+
+
+def dict_stats(history):
+    """The scan /email-stats used to do over bot.email_history"""
+    category_counts = {}
+    for email in history.values():
+        category_counts[email["category"]] = category_counts.get(email["category"], 0) + 1
+    return {
+        "total_emails": len(history),
+        "ai_generated": sum(1 for email in history.values() if email["ai_generated"]),
+        "category_distribution": category_counts,
+        "last_24h": len([e for e in history.values() if e["timestamp"] > datetime.now() - timedelta(days=1)]),
+    }
+
+
+def timed(fn, repeat):
+    latencies = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        latencies.append((time.perf_counter() - started) * 1000)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--records", type=int, default=1000000)
+    parser.add_argument("--row-commit-sample", type=int, default=20000, help="rows inserted one commit at a time")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+    rng = random.Random(7)
+    rows = []
+
+    # Old message IDs: one per second, so a burst overwrites itself
+    history = {}
+    for i in range(args.records):
+        history[f"msg_{datetime.now().strftime('%Y%m%d_%H%M%S')}"] = {
+            "category": rng.choice(CATEGORIES), "ai_generated": i % 3 == 0, "timestamp": datetime.now()}
+    kept = len(history)
+    history = {i: {"category": rng.choice(CATEGORIES), "ai_generated": i % 3 == 0, "timestamp": datetime.now()}
+               for i in range(args.records)}
+    latencies = timed(lambda: dict_stats(history), max(1, args.repeat // 4))
+    rows.append({"store": "dict (old)", "records": args.records, "ids_kept": kept, "write_rows_per_s": None,
+                 "stats_p50_ms": round(percentile(latencies, 50), 3)})
+    del history
+
+    with tempfile.TemporaryDirectory() as workdir:
+        # Row-at-a-time commits, for comparison with write-behind batches
+        conn = sqlite3.connect(os.path.join(workdir, "rows.sqlite3"))
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("CREATE TABLE email_log (id INTEGER PRIMARY KEY, category TEXT, ai_generated INTEGER, "
+                     "created_at REAL)")
+        started = time.perf_counter()
+        for i in range(args.row_commit_sample):
+            conn.execute("INSERT INTO email_log VALUES (?, ?, ?, ?)", (i, rng.choice(CATEGORIES), i % 3 == 0, time.time()))
+            conn.commit()
+        row_rate = args.row_commit_sample / (time.perf_counter() - started)
+        conn.close()
+        rows.append({"store": "sqlite, commit per row", "records": args.row_commit_sample, "ids_kept": None,
+                     "write_rows_per_s": round(row_rate), "stats_p50_ms": None})
+
+        log = EmailLog(url=f"sqlite:///{os.path.join(workdir, 'email_log.sqlite3')}", batch_size=500)
+        ids = set()
+        started = time.perf_counter()
+        for i in range(args.records):
+            message_id = log.new_message_id()
+            ids.add(message_id)
+            log.record(message_id, "outbound", f"user{i}@example.com", f"Subject {i}", "Body " * 20,
+                       rng.choice(CATEGORIES), "normal", i % 3 == 0)
+            if (i + 1) % log.batch_size == 0:
+                log.flush()
+        log.flush()
+        write_rate = args.records / (time.perf_counter() - started)
+        latencies = timed(log.stats, args.repeat)
+        stats = log.stats()
+        assert stats["total_emails"] == args.records, stats
+        rows.append({"store": "EmailLog (sqlite)", "records": args.records, "ids_kept": len(ids),
+                     "write_rows_per_s": round(write_rate), "stats_p50_ms": round(percentile(latencies, 50), 3)})
+
+    if args.json:
+        print(json.dumps(rows, indent=2))
+    else:
+        print_table("Email history", rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+FAQ Index Benchmark
+Build and query cost of the WhatsApp bot's TF-IDF FAQ index at 10k entries.
+
+    python benchmarks/bench_faq_index.py --faqs 10000 --queries 2000
+"""
+
+import argparse
+import json
+import random
+import sys
+import time
+
+from common import PROJECTS_DIR, percentile, print_table
+
+sys.path.insert(0, str(PROJECTS_DIR / "whatsapp-automation-bot"))
+from faq_index import FAQIndex  # noqa: E402
+
+TOPICS = ["order", "refund", "delivery", "invoice", "subscription", "password", "warranty",
+          "appointment", "store", "discount", "payment", "account", "shipping", "return"]
+ASKS = ["How do I {verb} my {topic}?", "Can I {verb} a {topic} online?", "What is the {topic} policy for {place}?",
+        "Where can I {verb} the {topic} number {n}?", "Why was my {topic} {state}?"]
+VERBS = ["cancel", "track", "change", "update", "check", "renew", "download"]
+PLACES = ["Lahore", "Karachi", "Dubai", "London", "Islamabad", "Toronto"]
+STATES = ["delayed", "declined", "cancelled", "charged twice", "not received"]
+
+
+def synthetic_faqs(count, rng):
+    faqs = {}
+    for i in range(count):
+        question = rng.choice(ASKS).format(verb=rng.choice(VERBS), topic=rng.choice(TOPICS),
+                                           place=rng.choice(PLACES), state=rng.choice(STATES), n=i)
+        faqs.setdefault(rng.choice(TOPICS), []).append({"question": question, "answer": f"Answer {i}"})
+    return faqs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--faqs", type=int, default=10000)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    faqs = synthetic_faqs(args.faqs, rng)
+    questions = [entry["question"] for entries in faqs.values() for entry in entries]
+
+    started = time.perf_counter()
+    index = FAQIndex("/nonexistent/faq_database.json", lambda: faqs)
+    build_ms = (time.perf_counter() - started) * 1000
+
+    # Half near-duplicates of known questions, half unrelated chatter
+    queries = [rng.choice(questions).lower().rstrip("?") if i % 2 == 0 else f"hello there, message {i}"
+               for i in range(args.queries)]
+    latencies = []
+    for query in queries:
+        started = time.perf_counter()
+        index.match(query)
+        latencies.append((time.perf_counter() - started) * 1000)
+
+    result = {
+        "faqs": args.faqs,
+        "build_ms": round(build_ms, 1),
+        "query_p50_ms": round(percentile(latencies, 50), 3),
+        "query_p99_ms": round(percentile(latencies, 99), 3),
+        "queries_per_s": round(len(latencies) / (sum(latencies) / 1000), 1),
+        "hit_rate": index.stats()["hit_rate"],
+    }
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print_table("FAQ index", [result])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Voice History Benchmark
+Compares the old dict-scan /voice-stats and cleanup with VoiceHistory at scale.
+
+    python benchmarks/bench_history_store.py --entries 1000000
+"""
+
+import argparse
+import json
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+from common import PROJECTS_DIR, print_table
+
+sys.path.insert(0, str(PROJECTS_DIR / "elevenlabs-voice-bot"))
+from history_store import VoiceHistory  # noqa: E402
+
+LANGUAGES = ["en", "es", "fr", "de", "it", "pt", "ar", "zh", "ja"]
+VOICES = ["21m00Tcm4TlvDq8ikWAM", "AZnzlk1XvdvUeBnXmlld", "EXAVITQu4vr4xnSDxMaL"]
+
+
+def make_records(count):
+    start = datetime.now() - timedelta(hours=20)
+    step = timedelta(hours=20) / count
+    for i in range(count):
+        yield f"audio-{i}", {
+            "text": "Thank you for calling.",
+            "voice_id": random.choice(VOICES),
+            "language": random.choice(LANGUAGES),
+            "speed": 1.0,
+            "emotion": "neutral",
+            "timestamp": start + step * i,
+            "file_path": f"/tmp/voice_audio-{i}.mp3",
+        }
+
+
+def legacy_stats(history):
+    """The pre-VoiceHistory /voice-stats body"""
+    language_counts = {}
+    voice_counts = {}
+    for generation in history.values():
+        language_counts[generation["language"]] = language_counts.get(generation["language"], 0) + 1
+        voice_counts[generation["voice_id"]] = voice_counts.get(generation["voice_id"], 0) + 1
+    cutoff = datetime.now() - timedelta(days=1)
+    return len(history), language_counts, voice_counts, len([g for g in history.values() if g["timestamp"] > cutoff])
+
+
+def legacy_cleanup(history):
+    """The pre-VoiceHistory cleanup_old_files scan"""
+    now = datetime.now()
+    return [audio_id for audio_id, info in history.items() if (now - info["timestamp"]).days > 1]
+
+
+def timed(fn, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - started) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--entries", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    records = list(make_records(args.entries))
+    legacy = dict(records)
+    store = VoiceHistory(max_entries=args.entries)
+    started = time.perf_counter()
+    for audio_id, record in records:
+        store.add(audio_id, record)
+    insert_us = (time.perf_counter() - started) / args.entries * 1e6
+
+    rows = [
+        {"operation": "stats", "legacy_ms": round(timed(lambda: legacy_stats(legacy), args.repeat), 3),
+         "voice_history_ms": round(timed(store.stats, args.repeat * 100), 4)},
+        {"operation": "expiry scan", "legacy_ms": round(timed(lambda: legacy_cleanup(legacy), args.repeat), 3),
+         "voice_history_ms": round(timed(store.expire, args.repeat * 100), 4)},
+    ]
+    result = {"entries": args.entries, "insert_us_per_entry": round(insert_us, 2), "operations": rows}
+    if args.json:
+        print(json.dumps(result, indent=2))
+        return
+    print_table(f"{args.entries:,} history entries (insert {insert_us:.2f} us/entry)", rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+IMAP Ingestion Benchmark
+Backlog throughput, live-arrival lag and memory of the email bot's IMAPIngestor against the fake IMAP server.
+
+    python benchmarks/bench_imap_ingest.py --backlog 500 --handler-latency 0.05 --levels 1 8 32
+"""
+
+import argparse
+import asyncio
+import email
+import imaplib
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from common import PROJECTS_DIR, free_port, percentile, print_table
+from fake_imap import make_message, start_fake_imap
+
+sys.path.insert(0, str(PROJECTS_DIR / "email-automation-bot"))
+from imap_ingest import IMAPIngestor  # noqa: E402
+
+
+def fill_mailbox(server, count, attachment_every, attachment_kb):
+    for i in range(count):
+        attach = attachment_kb * 1024 if attachment_every and i % attachment_every == 0 else 0
+        server.add_message(make_message(i, attachment_bytes=attach, attachment_first=(i // attachment_every) % 2 == 1
+                                        if attachment_every else False))
+
+
+def naive_backlog(port, count):
+    """Baseline: fetch whole messages one at a time and parse them fully in memory"""
+    tracemalloc.start()
+    started = time.perf_counter()
+    imap = imaplib.IMAP4("127.0.0.1", port)
+    imap.login("bench", "fake")
+    imap.select("INBOX", readonly=True)
+    for uid in range(1, count + 1):
+        _, data = imap.uid("FETCH", str(uid), "(BODY.PEEK[])")
+        message = email.message_from_bytes(data[0][1])
+        next((part.get_payload(decode=True) for part in message.walk()
+              if part.get_content_type() == "text/plain"), b"")
+    imap.logout()
+    elapsed = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+async def run_ingestor(port, state_file, concurrency, handler_latency, until, arrivals=None):
+    """Follow the mailbox until ``until(processed)`` is true; returns the ingestor and handler lags"""
+    lags = []
+
+    async def handler(item):
+        await asyncio.sleep(handler_latency)  # stands in for categorize_email + generate_response
+        if "@" in item["subject"]:
+            lags.append(time.time() - float(item["subject"].rsplit("@", 1)[1]))
+
+    ingestor = IMAPIngestor(handler, host="127.0.0.1", port=port, username="bench", password="fake",
+                            use_ssl=False, state_file=state_file, concurrency=concurrency, start_from="all")
+    ingestor.start()
+    feeder = asyncio.ensure_future(arrivals()) if arrivals else None
+    while not until(ingestor.processed):
+        await asyncio.sleep(0.01)
+    if feeder:
+        await feeder
+    await ingestor.stop()
+    return ingestor, lags
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--backlog", type=int, default=500)
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--handler-latency", type=float, default=0.05, help="simulated categorize + reply time")
+    parser.add_argument("--latency", type=float, default=0.001, help="fake server delay per command")
+    parser.add_argument("--attachment-every", type=int, default=5, help="every Nth message carries an attachment")
+    parser.add_argument("--attachment-kb", type=int, default=2048)
+    parser.add_argument("--live-rate", type=float, default=50, help="messages/s delivered during the live phase")
+    parser.add_argument("--live-seconds", type=float, default=5)
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    rows = []
+    with tempfile.TemporaryDirectory() as workdir:
+        port = free_port()
+        server = start_fake_imap(port, args.latency)
+        fill_mailbox(server, args.backlog, args.attachment_every, args.attachment_kb)
+
+        elapsed, peak = naive_backlog(port, args.backlog)
+        rows.append({"mode": "naive full fetch", "concurrency": 1, "msgs_per_s": round(args.backlog / elapsed, 1),
+                     "peak_mem_mb": round(peak / 2 ** 20, 1), "mb_fetched": None, "refetched": None})
+
+        for level in args.levels:
+            state_file = os.path.join(workdir, f"state_{level}.json")
+            tracemalloc.start()
+            started = time.perf_counter()
+            ingestor, _ = asyncio.run(run_ingestor(port, state_file, level, args.handler_latency,
+                                                   lambda processed: processed >= args.backlog))
+            elapsed = time.perf_counter() - started
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            # A restart against the same state file must not pick anything up again
+            deadline = time.monotonic() + 1.0
+            restarted, _ = asyncio.run(run_ingestor(port, state_file, level, 0,
+                                                    lambda processed: time.monotonic() > deadline))
+            rows.append({"mode": "IMAPIngestor", "concurrency": level,
+                         "msgs_per_s": round(args.backlog / elapsed, 1), "peak_mem_mb": round(peak / 2 ** 20, 1),
+                         "mb_fetched": round(ingestor.bytes_fetched / 2 ** 20, 1),
+                         "refetched": restarted.fetched})
+
+        # Live phase: messages arrive while the ingestor is IDLE; lag is arrival to handler completion
+        total = int(args.live_rate * args.live_seconds)
+        base = len(server.uids())
+
+        async def arrivals():
+            for i in range(total):
+                server.add_message(make_message(base + i, subject=f"Live {i} @{time.time()}"))
+                await asyncio.sleep(1 / args.live_rate)
+
+        live_state = os.path.join(workdir, f"state_{args.levels[-1]}.json")
+        _, lags = asyncio.run(run_ingestor(port, live_state, args.levels[-1], args.handler_latency,
+                                           lambda processed: processed >= total, arrivals))
+        server.shutdown()
+        server.server_close()
+
+    live = {"arrival_rate": args.live_rate, "messages": total,
+            "lag_p50_ms": round(percentile(lags, 50) * 1000, 1), "lag_p95_ms": round(percentile(lags, 95) * 1000, 1),
+            "handler_ms": args.handler_latency * 1000}
+    if args.json:
+        print(json.dumps({"backlog": rows, "live": live}, indent=2))
+    else:
+        print_table(f"IMAP backlog ({args.backlog} messages)", rows)
+        print_table("IMAP live arrivals (IDLE)", [live])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+LLM Concurrency Benchmark
+Measures /send-email and /generate-voice throughput against a fake OpenAI upstream.
+
+With blocking OpenAI calls throughput stays flat at roughly 1/latency no matter
+how many clients are connected; with the async pooled client it should scale
+with concurrency up to LLM_MAX_CONCURRENCY.
+
+    python benchmarks/bench_llm_concurrency.py --latency 0.2 --levels 1 8 32
+"""
+
+import argparse
+import json
+
+from common import (fake_upstream_env, free_port, print_table, run_load, start_service,
+                    stop_service, uvicorn_command)
+from fake_upstreams import start_fake_upstreams
+
+
+def email_payload(i):
+    return {
+        "to_email": f"customer{i}@example.com",
+        "subject": f"Question about order #{i}",
+        "content": "auto Hello, I was charged twice for my subscription this month.",
+    }
+
+
+def voice_payload(i):
+    return {"text": f"Bonjour et bienvenue, votre numero est {i}.", "language": "fr"}
+
+
+TARGETS = {
+    "email-automation-bot": ("/send-email", email_payload),
+    "elevenlabs-voice-bot": ("/generate-voice", voice_payload),
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--latency", type=float, default=0.2, help="fake upstream latency in seconds")
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--requests-per-client", type=int, default=4)
+    parser.add_argument("--services", nargs="+", default=list(TARGETS))
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    upstream = start_fake_upstreams(latency=args.latency)
+    upstream_url = f"http://127.0.0.1:{upstream.server_address[1]}"
+    results = {}
+    try:
+        for project in args.services:
+            path, payload_factory = TARGETS[project]
+            port = free_port()
+            process = start_service(project, uvicorn_command(port), port, fake_upstream_env(upstream_url))
+            try:
+                rows = []
+                for level in args.levels:
+                    url = f"http://127.0.0.1:{port}{path}"
+                    rows.append(run_load(url, payload_factory, level, level * args.requests_per_client))
+                results[project] = rows
+            finally:
+                stop_service(process)
+    finally:
+        upstream.shutdown()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    for project, rows in results.items():
+        print_table(f"{project} (upstream latency {args.latency * 1000:.0f} ms)", rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,349 @@
+#!/usr/bin/env python3
+"""
+Load Test Suite
+Mixed traffic across all bots against local fake upstreams, with JSON results that can be compared between commits.
+
+Every selected bot is started as it is deployed (the WhatsApp and Xera bots
+under gunicorn, the email and voice bots under uvicorn) and pointed at
+fake_upstreams.py and fake_smtp.py. Clients then send a weighted mix of
+webhooks, emails, voice generations and stats calls for --duration seconds
+while each service's resident memory is sampled.
+
+    python benchmarks/bench_load_suite.py --duration 60 --clients 32 --output benchmarks/results/baseline.json
+    python benchmarks/bench_load_suite.py --duration 60 --clients 32 --compare benchmarks/results/baseline.json
+"""
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+from common import (REPO_ROOT, fake_upstream_env, free_port, gunicorn_command, percentile, print_table,
+                    start_service, stop_service, timed_request, uvicorn_command)
+from fake_smtp import start_fake_smtp
+from fake_upstreams import start_fake_upstreams
+
+# service -> (command for a port and worker count, health check path)
+SERVICES = {
+    "whatsapp-automation-bot": (lambda port, workers: gunicorn_command(port, workers=workers), "/health"),
+    "email-automation-bot": (uvicorn_command, "/health"),
+    "elevenlabs-voice-bot": (uvicorn_command, "/health"),
+    "xera-business-bot": (lambda port, workers: gunicorn_command(port, "xera_bot.wsgi:application", workers),
+                          "/admin/login/"),
+}
+
+FAQ_QUESTIONS = ["What are your business hours?", "How can I contact support?"]
+OPEN_QUESTIONS = ["Can I change the delivery address on order {i}?", "Do you ship to Lahore? Order {i}",
+                  "My invoice {i} looks wrong, who should I talk to?"]
+EMAIL_BODIES = ["auto Hello, I was charged twice for order {i} this month.",
+                "auto Hi team, where is my delivery for order {i}? It is a week late.",
+                "Please find the signed contract {i} attached."]
+VOICE_LINES = [("Welcome to our store, how can I help you today?", "en"),
+               ("Your appointment is confirmed for tomorrow at ten.", "en"),
+               ("Bonjour et bienvenue, votre numero est {i}.", "fr"),
+               ("Gracias por llamar, un agente le atendera pronto.", "es")]
+
+
+def webhook_payload(questions):
+    def build(i, rng):
+        return {"message": {
+            "id": f"wamid.load-{i}",
+            "from": f"92300{rng.randrange(2000):07d}",
+            "text": {"body": rng.choice(questions).format(i=i)},
+        }}
+    return build
+
+
+def email_payload(i, rng):
+    return {"to_email": f"customer{i}@domain{i % 8}.example", "subject": f"Order {i}",
+            "content": rng.choice(EMAIL_BODIES).format(i=i)}
+
+
+def voice_payload(i, rng):
+    # A few fixed lines, so the audio and translation caches see realistic repeats
+    text, language = rng.choice(VOICE_LINES)
+    return {"text": text.format(i=i % 50), "language": language}
+
+
+# operation -> (service, path, payload factory or None for GET)
+OPERATIONS = {
+    "webhook-faq": ("whatsapp-automation-bot", "/webhook", webhook_payload(FAQ_QUESTIONS)),
+    "webhook-llm": ("whatsapp-automation-bot", "/webhook", webhook_payload(OPEN_QUESTIONS)),
+    "send-email": ("email-automation-bot", "/send-email", email_payload),
+    "email-stats": ("email-automation-bot", "/email-stats", None),
+    "generate-voice": ("elevenlabs-voice-bot", "/generate-voice", voice_payload),
+    "voice-stats": ("elevenlabs-voice-bot", "/voice-stats", None),
+    "xera-admin": ("xera-business-bot", "/admin/login/", None),
+}
+DEFAULT_MIX = ["webhook-faq=20", "webhook-llm=20", "send-email=25", "email-stats=5",
+               "generate-voice=20", "voice-stats=5", "xera-admin=5"]
+
+
+def parse_mix(items):
+    mix = {}
+    for item in items:
+        name, _, weight = item.partition("=")
+        if name not in OPERATIONS:
+            raise SystemExit(f"unknown operation {name!r}; choose from {', '.join(OPERATIONS)}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def service_env(args, upstream_url, smtp_port, workdir, service):
+    env = dict(fake_upstream_env(upstream_url))
+    env.update({
+        "EMAIL_SERVER": "127.0.0.1",
+        "EMAIL_PORT": str(smtp_port),
+        "EMAIL_USERNAME": "load@example.com",
+        "EMAIL_PASSWORD": "fake",
+        "SMTP_USE_TLS": "false",
+        "SMTP_DOMAIN_RATE": "1000",
+        "SMTP_RETRY_BASE_SECONDS": "1",
+        "OUTBOX_DB": os.path.join(workdir, "outbox.sqlite3"),
+        "EMAIL_LOG_URL": "",
+        "EMAIL_LOG_DB": os.path.join(workdir, "email_log.sqlite3"),
+        "IMAP_SERVER": "",
+        "CLASSIFIER_MODEL_DIR": os.path.join(workdir, "classifier"),
+        "REDIS_URL": "",
+        "WEBHOOK_MODE": args.webhook_mode,
+        "AUDIO_STORE": "local",
+        "AUDIO_STORE_DIR": os.path.join(workdir, "audio"),
+        "AUDIO_METADATA_DB": os.path.join(workdir, "audio.sqlite3"),
+        "VOICE_CACHE_DIR": os.path.join(workdir, "voice_cache"),
+        "TRANSLATION_CACHE_DB": os.path.join(workdir, "translations.sqlite3"),
+    })
+    if args.workers > 1:
+        metrics_dir = os.path.join(workdir, f"prometheus-{service}")
+        os.makedirs(metrics_dir, exist_ok=True)
+        env["PROMETHEUS_MULTIPROC_DIR"] = metrics_dir
+    return env
+
+
+def process_table():
+    """pid -> (parent pid, resident KiB) for every process, via ps so it also works on macOS"""
+    output = subprocess.run(["ps", "-A", "-o", "pid=", "-o", "ppid=", "-o", "rss="],
+                            capture_output=True, text=True).stdout
+    table = {}
+    for line in output.splitlines():
+        fields = line.split()
+        if len(fields) == 3 and all(field.isdigit() for field in fields):
+            table[int(fields[0])] = (int(fields[1]), int(fields[2]))
+    return table
+
+
+def tree_rss_mb(table, root):
+    """Resident memory of a process and all its descendants (gunicorn and uvicorn workers)"""
+    children = {}
+    for pid, (ppid, _) in table.items():
+        children.setdefault(ppid, []).append(pid)
+    total, stack = 0, [root]
+    while stack:
+        pid = stack.pop()
+        total += table.get(pid, (0, 0))[1]
+        stack.extend(children.get(pid, ()))
+    return round(total / 1024, 1)
+
+
+def sample_memory(processes, interval, started, stop, samples):
+    while not stop.is_set():
+        table = process_table()
+        samples.append({"t": round(time.perf_counter() - started, 1),
+                        **{name: tree_rss_mb(table, process.pid) for name, process in processes.items()}})
+        stop.wait(interval)
+
+
+def run_client(index, base_urls, names, weights, started, deadline, results):
+    rng = random.Random(index)
+    sequence = 0
+    while time.perf_counter() < deadline:
+        name = rng.choices(names, weights)[0]
+        service, path, payload_factory = OPERATIONS[name]
+        payload = payload_factory(index * 1000000 + sequence, rng) if payload_factory else None
+        sent_at = time.perf_counter() - started
+        latency, status = timed_request(base_urls[service] + path, payload)
+        results.append((sent_at, name, latency, status))
+        sequence += 1
+
+
+def summarise(name, results, elapsed):
+    latencies = [latency for _, _, latency, status in results if 200 <= status < 300]
+    return {
+        "operation": name,
+        "requests": len(results),
+        "errors": len(results) - len(latencies),
+        "throughput_rps": round(len(results) / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+    }
+
+
+def build_timeline(results, memory, interval, services):
+    windows = {}
+    for entry in results:
+        windows.setdefault(int(entry[0] // interval), []).append(entry)
+    memory_by_window = {int(sample["t"] // interval): sample for sample in memory}
+    timeline = []
+    for window in sorted(set(windows) | set(memory_by_window)):
+        row = summarise("all", windows.get(window, []), interval)
+        del row["operation"]
+        sample = memory_by_window.get(window, {})
+        memory_mb = {name: sample.get(name) for name in services}
+        timeline.append({"t": round(window * interval, 1), **row, "rss_mb": memory_mb})
+    return timeline
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current, baseline, tolerance):
+    """Per-operation changes against a baseline results file; flags anything worse than ``tolerance``"""
+    before = {row["operation"]: row for row in baseline["summary"]}
+    rows = []
+    for row in current["summary"]:
+        old = before.get(row["operation"])
+        if old is None:
+            continue
+
+        def change(key):
+            return round((row[key] - old[key]) / old[key], 3) if old[key] else 0.0
+
+        deltas = {"throughput": change("throughput_rps"), "p95": change("p95_ms"), "p99": change("p99_ms")}
+        regressed = deltas["throughput"] < -tolerance or deltas["p95"] > tolerance or deltas["p99"] > tolerance
+        rows.append({"operation": row["operation"], "throughput_change": deltas["throughput"],
+                     "p95_change": deltas["p95"], "p99_change": deltas["p99"],
+                     "errors": f"{old['errors']} -> {row['errors']}", "regression": regressed})
+    for name, peak in current["peak_rss_mb"].items():
+        old = baseline.get("peak_rss_mb", {}).get(name)
+        if old:
+            growth = round((peak - old) / old, 3)
+            rows.append({"operation": f"{name} peak rss", "throughput_change": None, "p95_change": None,
+                         "p99_change": None, "errors": f"{old} -> {peak} MB", "regression": growth > tolerance})
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--services", nargs="+", default=list(SERVICES), choices=list(SERVICES))
+    parser.add_argument("--mix", nargs="+", default=DEFAULT_MIX, help="operation=weight pairs")
+    parser.add_argument("--clients", type=int, default=32, help="concurrent clients")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds of traffic")
+    parser.add_argument("--workers", type=int, default=1, help="gunicorn/uvicorn workers per service")
+    parser.add_argument("--webhook-mode", choices=["sync", "queue"], default="sync")
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="fake OpenAI latency in seconds")
+    parser.add_argument("--tts-latency", type=float, default=0.5, help="fake ElevenLabs latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.1, help="extra random upstream latency, seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of upstream calls answered 503")
+    parser.add_argument("--smtp-latency", type=float, default=0.005)
+    parser.add_argument("--smtp-fail-rate", type=float, default=0.0, help="fraction of MAIL FROM answered 451")
+    parser.add_argument("--sample-interval", type=float, default=1.0, help="seconds per timeline window")
+    parser.add_argument("--output", help="write the results JSON to this file")
+    parser.add_argument("--compare", help="baseline results JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="relative change counted as a regression")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+    mix = parse_mix(args.mix)
+
+    upstream = start_fake_upstreams(latency=args.llm_latency, jitter=args.jitter, error_rate=args.error_rate,
+                                    tts_latency=args.tts_latency)
+    upstream_url = f"http://127.0.0.1:{upstream.server_address[1]}"
+    smtp_port = free_port()
+    smtp = start_fake_smtp(smtp_port, args.smtp_latency, temp_fail_rate=args.smtp_fail_rate)
+    processes, status, base_urls = {}, {}, {}
+    results, memory = [], []
+    try:
+        with tempfile.TemporaryDirectory() as workdir:
+            for service in args.services:
+                command, health_path = SERVICES[service]
+                port = free_port()
+                try:
+                    processes[service] = start_service(service, command(port, args.workers), port,
+                                                       service_env(args, upstream_url, smtp_port, workdir, service),
+                                                       health_path=health_path, timeout=60)
+                except RuntimeError as e:
+                    status[service] = {"status": "failed", "error": str(e)[-500:]}
+                    continue
+                status[service] = {"status": "ok"}
+                base_urls[service] = f"http://127.0.0.1:{port}"
+
+            names = [name for name in mix if OPERATIONS[name][0] in base_urls]
+            if not names:
+                raise SystemExit(f"no service started: {json.dumps(status, indent=2)}")
+            weights = [mix[name] for name in names]
+
+            started = time.perf_counter()
+            deadline = started + args.duration
+            stop = threading.Event()
+            sampler = threading.Thread(target=sample_memory,
+                                       args=(processes, args.sample_interval, started, stop, memory), daemon=True)
+            sampler.start()
+            clients = [threading.Thread(target=run_client,
+                                        args=(i, base_urls, names, weights, started, deadline, results))
+                       for i in range(args.clients)]
+            for client in clients:
+                client.start()
+            for client in clients:
+                client.join()
+            elapsed = time.perf_counter() - started
+            stop.set()
+            sampler.join()
+            for process in processes.values():
+                stop_service(process)
+            processes.clear()
+    finally:
+        for process in processes.values():
+            stop_service(process)
+        upstream.shutdown()
+        smtp.shutdown()
+        smtp.server_close()
+
+    summary = [summarise(name, [r for r in results if r[1] == name], elapsed) for name in names]
+    summary.append(summarise("all", results, elapsed))
+    report = {
+        "commit": git_commit(),
+        "started_at": datetime.now().isoformat(timespec="seconds"),
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "compare", "json")},
+        "services": status,
+        "summary": summary,
+        "peak_rss_mb": {name: max(sample[name] for sample in memory) for name in base_urls} if memory else {},
+        "timeline": build_timeline(results, memory, args.sample_interval, list(base_urls)),
+        "upstream_calls": upstream.snapshot(),
+        "smtp": {"connections": smtp.connections, "delivered": smtp.delivered},
+    }
+    regressions = []
+    if args.compare:
+        report["comparison"] = compare(report, json.loads(Path(args.compare).read_text()), args.tolerance)
+        regressions = [row for row in report["comparison"] if row["regression"]]
+    if args.output:
+        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.output).write_text(json.dumps(report, indent=2))
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        for service, state in status.items():
+            if state["status"] != "ok":
+                print(f"{service} did not start: {state['error'].splitlines()[-1] if state['error'] else ''}")
+        print_table(f"Mixed load ({args.clients} clients, {args.duration:.0f}s, commit {report['commit']})", summary)
+        print_table("Over time", [{**{k: v for k, v in row.items() if k != "rss_mb"}, **row["rss_mb"]}
+                                  for row in report["timeline"]])
+        if args.compare:
+            print_table(f"Against {args.compare} (tolerance {args.tolerance:.0%})", report["comparison"])
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
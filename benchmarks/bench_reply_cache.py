@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Reply Cache Benchmark
+Hit rate, wrong-template hits and lookup cost of the email bot's ReplyCache on a synthetic support campaign.
+
+    python benchmarks/bench_reply_cache.py --emails 5000 --templates 20 --unique 0.3 --llm-latency 1.5
+"""
+
+import argparse
+import json
+import random
+import sys
+import time
+
+from common import PROJECTS_DIR, percentile, print_table
+
+sys.path.insert(0, str(PROJECTS_DIR / "email-automation-bot"))
+from reply_cache import ReplyCache  # noqa: E402
+
+SUBJECTS = ["order", "refund", "delivery", "invoice", "subscription", "password", "warranty", "coupon",
+            "account", "shipment"]
+PROBLEMS = ["has not arrived", "was charged twice", "shows the wrong address", "cannot be found",
+            "was cancelled without notice", "is missing an item"]
+GREETINGS = ["Hi", "Hello", "Dear support", "Hey team", "Good morning"]
+CLOSINGS = ["Thanks", "Regards", "Please help", "Thank you in advance", "Cheers"]
+FILLER = ["I really need this sorted this week.", "This is the second time I am writing.",
+          "My friend had the same issue.", "I have attached nothing, sorry.", "Let me know what you need from me."]
+
+
+def campaign(count, templates, unique_share, rng):
+    """(template id or None, email text) pairs; template emails differ in greeting, closing and identifiers"""
+    bodies = []
+    for t in range(templates):
+        subject, problem = SUBJECTS[t % len(SUBJECTS)], PROBLEMS[t % len(PROBLEMS)]
+        bodies.append(f"my {subject} {{ref}} {problem}. I placed it on {{date}} and tracking shows nothing new. "
+                      f"Could you look into {subject} {{ref}} and tell me when I can expect an update?")
+    emails = []
+    for i in range(count):
+        if rng.random() < unique_share:
+            words = rng.sample(FILLER + PROBLEMS + SUBJECTS, 8)
+            emails.append((None, f"{rng.choice(GREETINGS)}, {' '.join(words)} case {i}"))
+            continue
+        t = rng.randrange(templates)
+        body = bodies[t].format(ref=f"#{rng.randrange(10000, 99999)}", date=f"2024-0{rng.randrange(1, 9)}-1{i % 9}")
+        extra = f" {rng.choice(FILLER)}" if rng.random() < 0.3 else ""
+        emails.append((t, f"{rng.choice(GREETINGS)}, {body}{extra} {rng.choice(CLOSINGS)}"))
+    return emails
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--emails", type=int, default=5000)
+    parser.add_argument("--templates", type=int, default=20)
+    parser.add_argument("--unique", type=float, default=0.3, help="share of one-off emails")
+    parser.add_argument("--thresholds", type=float, nargs="+", default=[0.6, 0.7, 0.8, 0.9])
+    parser.add_argument("--llm-latency", type=float, default=1.5, help="seconds per generated reply")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    emails = campaign(args.emails, args.templates, args.unique, random.Random(3))
+    rows = []
+    for threshold in args.thresholds:
+        cache = ReplyCache(threshold=threshold)
+        owners = {}  # reply text -> template id that produced it
+        wrong = 0
+        latencies = []
+        for i, (template, content) in enumerate(emails):
+            started = time.perf_counter()
+            reply = cache.lookup("support", content)
+            latencies.append((time.perf_counter() - started) * 1000)
+            if reply is None:
+                reply = f"reply-{i}"
+                owners[reply] = template
+                cache.store("support", content, reply, args.llm_latency)
+            elif template is None or owners.get(reply) != template:
+                wrong += 1
+        stats = cache.stats()
+        rows.append({
+            "threshold": threshold,
+            "hit_rate": stats["hit_rate"],
+            "wrong_template_hits": wrong,
+            "rejected": stats["rejected_unadaptable"] + stats["rejected_personal"],
+            "lookup_p50_ms": round(percentile(latencies, 50), 3),
+            "lookup_p99_ms": round(percentile(latencies, 99), 3),
+            "llm_minutes_saved": round(stats["saved_llm_seconds"] / 60, 1),
+        })
+
+    if args.json:
+        print(json.dumps(rows, indent=2))
+    else:
+        print_table(f"Reply cache ({args.emails} emails, {args.templates} templates, {args.unique:.0%} unique)", rows)
+
+
+if __name__ == "__main__":
+    main()
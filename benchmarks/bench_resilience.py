@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+"""
+Resilience Benchmark
+Bare upstream calls vs the shared resilience layer against fault-injecting fakes: outages, slow tails and overload
+
+Client threads call the fake OpenAI endpoint, once with a plain HTTP call
+(one attempt, the old 30 s timeout) and once through resilience.Upstream,
+while the fake server, in its own process, injects each fault through POST
+/config. The last scenario runs the voice bot itself through an ElevenLabs
+outage.
+
+    python benchmarks/bench_resilience.py --clients 32 --duration 5
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import requests
+
+from common import PROJECTS_DIR, fake_upstream_env, free_port, percentile, print_table, start_service, \
+    stop_service, timed_request, uvicorn_command
+from fake_upstreams import FAKE_VOICES, start_fake_upstreams
+
+FAKE_UPSTREAMS = Path(__file__).resolve().parent / "fake_upstreams.py"
+
+sys.path.insert(0, str(PROJECTS_DIR / "elevenlabs-voice-bot"))
+from resilience import CircuitBreaker, Upstream, deadline  # noqa: E402
+
+CHAT_PATH = "/v1/chat/completions"
+PAYLOAD = {"model": "gpt-3.5-turbo", "messages": [{"role": "user", "content": "Where is my order?"}]}
+
+
+class UpstreamHTTPError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+_sessions = threading.local()
+
+
+def chat(url, timeout):
+    session = getattr(_sessions, "session", None)
+    if session is None:
+        session = _sessions.session = requests.Session()
+    response = session.post(url, json=PAYLOAD, timeout=timeout)
+    if response.status_code != 200:
+        raise UpstreamHTTPError(response.status_code)
+    return response.json()
+
+
+class FakeUpstreamProcess:
+    """fake_upstreams.py in a separate process, so the client threads here do not slow it down"""
+
+    def __init__(self, latency):
+        port = free_port()
+        self.url = f"http://127.0.0.1:{port}"
+        self.process = subprocess.Popen([sys.executable, str(FAKE_UPSTREAMS), "--port", str(port),
+                                         "--latency", str(latency)],
+                                        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        deadline_at = time.monotonic() + 10
+        while True:
+            try:
+                requests.get(f"{self.url}/stats", timeout=1)
+                return
+            except requests.ConnectionError:
+                if time.monotonic() > deadline_at:
+                    raise RuntimeError("fake upstreams did not start")
+                time.sleep(0.1)
+
+    def configure(self, **faults):
+        requests.post(f"{self.url}/config", json=faults, timeout=5).raise_for_status()
+
+    def calls(self):
+        return requests.get(f"{self.url}/stats", timeout=5).json().get(CHAT_PATH, 0)
+
+    def stop(self):
+        self.process.terminate()
+        self.process.wait()
+
+
+def run_clients(call, clients, duration, interval):
+    """Client threads each start a call at most every ``interval`` seconds; returns (latency, ok) per call"""
+    results = []
+    stop_at = time.perf_counter() + duration
+
+    def client():
+        while time.perf_counter() < stop_at:
+            started = time.perf_counter()
+            try:
+                call()
+                ok = True
+            except Exception:
+                ok = False
+            latency = time.perf_counter() - started
+            results.append((latency, ok))
+            time.sleep(max(0.0, interval - latency))
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def summarize(results, upstream_calls, duration):
+    latencies = [latency for latency, _ in results]
+    ok = sum(1 for _, success in results if success)
+    return {
+        "requests": len(results),
+        "ok_pct": round(100 * ok / max(1, len(results)), 1),
+        "goodput_rps": round(ok / duration, 1),
+        "upstream_calls": upstream_calls,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+    }
+
+
+def measure(fake, call, args):
+    before = fake.calls()
+    results = run_clients(call, args.clients, args.duration, args.interval)
+    return results, fake.calls() - before
+
+
+def make_call(url, mode, args, **upstream_settings):
+    """A zero-argument call for ``mode``: "bare" or an Upstream built from ``upstream_settings``"""
+    if mode == "bare":
+        return (lambda: chat(url, args.bare_timeout)), None
+    upstream = Upstream(f"bench-{mode}-{time.monotonic_ns()}", retry_base_delay=0.05, **upstream_settings)
+
+    def call():
+        with deadline(args.deadline):
+            return upstream.call(lambda timeout: chat(url, timeout))
+
+    return call, upstream
+
+
+def bench_outage(fake, url, args):
+    """Healthy, then every call fails with 503, then every call hangs, then healthy again"""
+    phases = (
+        ("healthy", {}),
+        ("503 outage", {"error_rate": 1.0}),
+        ("hung upstream", {"slow_rate": 1.0, "slow_latency": args.hang_latency}),
+        ("recovered", {}),
+    )
+    rows = []
+    for mode in ("bare", "resilient"):
+        breaker = CircuitBreaker(f"bench-outage-{mode}", open_seconds=args.open_seconds)
+        call, _ = make_call(url, mode, args, timeout=args.attempt_timeout, max_concurrency=args.clients,
+                            breaker=breaker)
+        for phase, faults in phases:
+            fake.configure(**{"error_rate": 0.0, "slow_rate": 0.0, **faults})
+            results, calls = measure(fake, call, args)
+            rows.append({"mode": mode, "phase": phase, **summarize(results, calls, args.duration)})
+        fake.configure(error_rate=0.0, slow_rate=0.0)
+    return rows
+
+
+def bench_recovery(fake, url, args):
+    """Seconds from the end of an outage until calls succeed again"""
+    rows = []
+    for mode in ("bare", "resilient"):
+        breaker = CircuitBreaker(f"bench-recovery-{mode}", open_seconds=args.open_seconds)
+        call, _ = make_call(url, mode, args, timeout=args.attempt_timeout, max_concurrency=args.clients,
+                            breaker=breaker)
+        fake.configure(error_rate=1.0)
+        run_clients(call, args.clients, args.duration, args.interval)
+        fake.configure(error_rate=0.0)
+        recovered_at = time.perf_counter()
+        first_ok = []
+
+        def probe():
+            call()
+            if not first_ok:
+                first_ok.append(time.perf_counter() - recovered_at)
+
+        run_clients(probe, args.clients, args.open_seconds + 2, args.interval)
+        rows.append({"mode": mode, "first_success_after_s": round(first_ok[0], 2) if first_ok else "-"})
+    return rows
+
+
+def bench_slow_tail(fake, url, args):
+    """A share of calls takes ``slow_latency`` instead of the usual latency"""
+    fake.configure(slow_rate=args.slow_rate, slow_latency=args.slow_latency)
+    rows = []
+    try:
+        modes = (
+            ("bare", {}),
+            ("timeout + retry", {"timeout": args.attempt_timeout}),
+            ("timeout + retry + hedge", {"timeout": args.attempt_timeout, "hedge_after": "auto"}),
+        )
+        for mode, settings in modes:
+            call, upstream = make_call(url, mode, args, max_concurrency=args.clients * 2, **settings)
+            # Fills the latency window the "auto" hedge delay is taken from
+            run_clients(call, args.clients, 1.0, args.interval)
+            results, calls = measure(fake, call, args)
+            row = {"mode": mode, **summarize(results, calls, args.duration),
+                   "calls_per_request": round(calls / max(1, len(results)), 2)}
+            row["hedges"] = upstream.hedges if upstream is not None else "-"
+            rows.append(row)
+    finally:
+        fake.configure(slow_rate=0.0)
+    return rows
+
+
+def bench_overload(fake, url, args):
+    """The upstream serves ``capacity`` calls at a time and answers 429 beyond that"""
+    fake.configure(capacity=args.capacity)
+    rows = []
+    try:
+        modes = (
+            ("bare", {}),
+            ("retry, fixed limit", {"max_concurrency": args.clients, "min_concurrency": args.clients}),
+            ("retry, adaptive limit", {"max_concurrency": args.clients}),
+        )
+        for mode, settings in modes:
+            call, upstream = make_call(url, mode, args, timeout=5, **settings)
+            # Long enough for the adaptive limit to settle before measuring
+            run_clients(call, args.clients, 1.0, args.interval)
+            results, calls = measure(fake, call, args)
+            row = {"mode": mode, **summarize(results, calls, args.duration),
+                   "rejected_429": calls - sum(1 for _, ok in results if ok)}
+            row["limit"] = round(upstream.limiter.limit, 1) if upstream is not None else "-"
+            rows.append(row)
+    finally:
+        fake.configure(capacity=0)
+    return rows
+
+
+def bench_voice_outage(args):
+    """/generate-voice while ElevenLabs answers every call with 503"""
+    upstream = start_fake_upstreams(latency=args.latency, tts_latency=args.tts_latency)
+    upstream_url = f"http://127.0.0.1:{upstream.server_address[1]}"
+    port = free_port()
+    with tempfile.TemporaryDirectory(prefix="resilience-bench-") as workdir:
+        env = dict(fake_upstream_env(upstream_url), REDIS_URL="", AUDIO_STORE="local",
+                   AUDIO_STORE_DIR=f"{workdir}/audio", AUDIO_METADATA_DB=f"{workdir}/audio.sqlite3",
+                   VOICE_CACHE_DIR=f"{workdir}/cache", TRANSLATION_CACHE_DB=f"{workdir}/translations.sqlite3",
+                   ELEVENLABS_BREAKER_OPEN_SECONDS=str(args.open_seconds))
+        process = start_service("elevenlabs-voice-bot", uvicorn_command(port), port, env, health_path="/ready")
+        try:
+            upstream.config["error_rate"] = 1.0
+            before = sum(count for path, count in upstream.snapshot().items() if "text-to-speech" in path)
+            voice_id = next(iter(FAKE_VOICES))
+            results = [timed_request(f"http://127.0.0.1:{port}/generate-voice",
+                                     {"text": f"Order {i} has shipped", "voice_id": voice_id})
+                       for i in range(args.voice_requests)]
+            calls = sum(count for path, count in upstream.snapshot().items() if "text-to-speech" in path) - before
+        finally:
+            stop_service(process)
+            upstream.shutdown()
+    statuses = {}
+    for _, status in results:
+        statuses[status] = statuses.get(status, 0) + 1
+    latencies = [latency for latency, _ in results]
+    return [{
+        "requests": len(results),
+        "statuses": " ".join(f"{status}x{count}" for status, count in sorted(statuses.items())),
+        "tts_calls": calls,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "max_ms": round(max(latencies) * 1000, 1),
+    }]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds per measured phase")
+    parser.add_argument("--interval", type=float, default=0.1, help="each client starts a call at most this often")
+    parser.add_argument("--latency", type=float, default=0.05, help="usual fake upstream latency in seconds")
+    parser.add_argument("--tts-latency", type=float, default=0.3, help="fake synthesis latency in seconds")
+    parser.add_argument("--bare-timeout", type=float, default=30.0, help="timeout of the single bare call")
+    parser.add_argument("--deadline", type=float, default=5.0, help="per-request deadline for resilient calls")
+    parser.add_argument("--attempt-timeout", type=float, default=0.5, help="per-attempt timeout in the slow tail")
+    parser.add_argument("--open-seconds", type=float, default=2.0, help="how long an open breaker fails fast")
+    parser.add_argument("--slow-rate", type=float, default=0.05, help="share of slow calls in the slow tail")
+    parser.add_argument("--slow-latency", type=float, default=3.0, help="latency of a slow call in seconds")
+    parser.add_argument("--hang-latency", type=float, default=10.0, help="latency of every call while it hangs")
+    parser.add_argument("--capacity", type=int, default=8, help="concurrent calls the overloaded upstream serves")
+    parser.add_argument("--voice-requests", type=int, default=30)
+    parser.add_argument("--skip-service", action="store_true", help="skip the voice bot outage run")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    fake = FakeUpstreamProcess(args.latency)
+    url = f"{fake.url}{CHAT_PATH}"
+    try:
+        results = {
+            "outage": bench_outage(fake, url, args),
+            "recovery": bench_recovery(fake, url, args),
+            "slow_tail": bench_slow_tail(fake, url, args),
+            "overload": bench_overload(fake, url, args),
+        }
+    finally:
+        fake.stop()
+    if not args.skip_service:
+        results["voice_outage"] = bench_voice_outage(args)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print_table(f"Outages: 503s, then calls hanging {args.hang_latency:.0f}s "
+                f"({args.clients} clients, {args.duration:.0f}s per phase)",
+                results["outage"])
+    print_table("Recovery after the outage ends", results["recovery"])
+    print_table(f"Slow tail: {args.slow_rate:.0%} of calls take {args.slow_latency:.1f}s "
+                f"(usual {args.latency * 1000:.0f} ms)", results["slow_tail"])
+    print_table(f"Overload: upstream serves {args.capacity} calls at a time, 429 beyond", results["overload"])
+    if "voice_outage" in results:
+        print_table("Voice bot /generate-voice during an ElevenLabs outage", results["voice_outage"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+SMTP Sender Benchmark
+Outbox drain rate of the email bot's MailSender against the fake SMTP server.
+
+    python benchmarks/bench_smtp_sender.py --messages 1000 --latency 0.005 --connect-latency 0.05
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+from common import PROJECTS_DIR, free_port, print_table
+from fake_smtp import start_fake_smtp
+
+sys.path.insert(0, str(PROJECTS_DIR / "email-automation-bot"))
+from smtp_sender import MailSender  # noqa: E402
+
+# (label, pool size, messages per connection)
+CONFIGS = [
+    ("connect-per-message", 1, 1),
+    ("persistent x1", 1, 100),
+    ("persistent x4", 4, 100),
+    ("persistent x16", 16, 100),
+]
+
+
+async def drain(sender, messages, domains):
+    for i in range(messages):
+        sender.outbox.enqueue(f"user{i}@domain{i % domains}.example", f"Subject {i}", f"Body of message {i}\n" * 20)
+    sender.start()
+    started = time.perf_counter()
+    while True:
+        counts = sender.outbox.counts()
+        if not counts.get("queued") and not counts.get("sending"):
+            break
+        await asyncio.sleep(0.02)
+    elapsed = time.perf_counter() - started
+    await sender.stop()
+    return elapsed, counts
+
+
+def run_config(label, pool_size, per_connection, args, port, workdir):
+    server = start_fake_smtp(port, args.latency, args.connect_latency, args.temp_fail_rate)
+    os.environ.update({
+        "EMAIL_SERVER": "127.0.0.1",
+        "EMAIL_PORT": str(port),
+        "EMAIL_USERNAME": "bench@example.com",
+        "EMAIL_PASSWORD": "fake",
+        "SMTP_USE_TLS": "false",
+        "SMTP_POOL_SIZE": str(pool_size),
+        "SMTP_MESSAGES_PER_CONNECTION": str(per_connection),
+        "SMTP_DOMAIN_CONCURRENCY": str(args.domain_concurrency),
+        "SMTP_DOMAIN_RATE": str(args.domain_rate),
+        "SMTP_RETRY_BASE_SECONDS": "0.05",
+        "OUTBOX_DB": os.path.join(workdir, f"outbox_{pool_size}_{per_connection}.sqlite3"),
+    })
+    sender = MailSender()
+    try:
+        elapsed, counts = asyncio.run(drain(sender, args.messages, args.domains))
+    finally:
+        server.shutdown()
+        server.server_close()
+    return {
+        "config": label,
+        "messages": args.messages,
+        "seconds": round(elapsed, 2),
+        "msgs_per_min": round(sender.sent / elapsed * 60),
+        "connections": server.connections,
+        "retries": sender.retried,
+        "failed": counts.get("failed", 0),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--messages", type=int, default=1000)
+    parser.add_argument("--domains", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.005, help="fake server delay per reply")
+    parser.add_argument("--connect-latency", type=float, default=0.05, help="fake server delay per new session")
+    parser.add_argument("--temp-fail-rate", type=float, default=0.0)
+    parser.add_argument("--domain-concurrency", type=int, default=4)
+    parser.add_argument("--domain-rate", type=float, default=1000)
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    rows = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for label, pool_size, per_connection in CONFIGS:
+            rows.append(run_config(label, pool_size, per_connection, args, free_port(), workdir))
+
+    if args.json:
+        print(json.dumps(rows, indent=2))
+    else:
+        print_table("SMTP sender", rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Startup Benchmark
+Cold-start time to a live /health and a ready /ready per bot, with an import-time profile of each
+
+Services start the way they are deployed, against the fake upstreams. The
+import profile (python -X importtime) lists the packages that cost the most
+to import, counting everything each one pulls in first.
+
+    python benchmarks/bench_startup.py --runs 5 --latency 0.5
+"""
+
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+from common import PROJECTS_DIR, fake_upstream_env, free_port, gunicorn_command, print_table, uvicorn_command
+from fake_upstreams import start_fake_upstreams
+
+WHATSAPP_GUNICORN = [sys.executable, "-m", "gunicorn", "app:app", "--config", "gunicorn.conf.py"]
+
+# (label, project, import statement, command for a port, liveness path, readiness path, extra environment)
+SERVICES = [
+    ("elevenlabs-voice-bot", "elevenlabs-voice-bot", "import main", uvicorn_command, "/health", "/ready", {}),
+    ("email-automation-bot", "email-automation-bot", "import main", uvicorn_command, "/health", "/ready", {}),
+    ("whatsapp (preload)", "whatsapp-automation-bot", "import app",
+     lambda port: WHATSAPP_GUNICORN + ["--bind", f"127.0.0.1:{port}"], "/health", "/ready", {}),
+    ("whatsapp (no preload)", "whatsapp-automation-bot", "import app",
+     lambda port: WHATSAPP_GUNICORN + ["--bind", f"127.0.0.1:{port}"], "/health", "/ready",
+     {"GUNICORN_PRELOAD": "false"}),
+    ("xera-business-bot", "xera-business-bot", "from xera_bot.wsgi import application; import xera_bot.urls",
+     lambda port: gunicorn_command(port, "xera_bot.wsgi:application", threads=4), "/health", "/ready",
+     {"DJANGO_SETTINGS_MODULE": "xera_bot.settings"}),
+]
+
+IMPORTTIME_RE = re.compile(r"^import time:\s+\d+\s+\|\s+(\d+)\s+\|\s*(\S+)$")
+MARKER = "-- service imports --"
+
+
+def service_env(upstream_url, workdir):
+    env = dict(fake_upstream_env(upstream_url))
+    env.update({
+        "EMAIL_SERVER": "127.0.0.1",
+        "EMAIL_USERNAME": "startup@example.com",
+        "EMAIL_PASSWORD": "fake",
+        "OUTBOX_DB": os.path.join(workdir, "outbox.sqlite3"),
+        "EMAIL_LOG_URL": "",
+        "EMAIL_LOG_DB": os.path.join(workdir, "email_log.sqlite3"),
+        "IMAP_SERVER": "",
+        "CLASSIFIER_MODEL_DIR": os.path.join(workdir, "classifier"),
+        "REDIS_URL": "",
+        "AUDIO_STORE": "local",
+        "AUDIO_STORE_DIR": os.path.join(workdir, "audio"),
+        "AUDIO_METADATA_DB": os.path.join(workdir, "audio.sqlite3"),
+        "VOICE_CACHE_DIR": os.path.join(workdir, "voice_cache"),
+        "TRANSLATION_CACHE_DB": os.path.join(workdir, "translations.sqlite3"),
+        "SQLITE_PATH": os.path.join(workdir, "xera.sqlite3"),
+    })
+    return env
+
+
+def import_profile(project, statement, env, top):
+    """Wall time of importing the service module and its most expensive top-level packages, in ms"""
+    # The marker separates the service's imports from the interpreter's own start-up imports
+    code = (f"import sys, time; sys.stderr.write('{MARKER}\\n'); started = time.perf_counter(); {statement}; "
+            f"print(time.perf_counter() - started)")
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=PROJECTS_DIR / project,
+                            env=dict(os.environ, **env), capture_output=True, text=True, timeout=120)
+    if result.returncode:
+        raise RuntimeError(f"{project}: {statement!r} failed:\n{result.stderr[-2000:]}")
+    packages = {}
+    for line in result.stderr.partition(MARKER)[2].splitlines():
+        match = IMPORTTIME_RE.match(line)
+        if not match:
+            continue
+        # Every module is imported once, so a package's outermost entry covers all of it
+        package = match.group(2).split(".")[0]
+        packages[package] = max(packages.get(package, 0), int(match.group(1)))
+    for own in ("main", "app", "xera_bot"):
+        packages.pop(own, None)
+    ranked = sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top]
+    total = float(result.stdout.strip().splitlines()[-1])
+    return round(total * 1000, 1), [(name, round(us / 1000, 1)) for name, us in ranked]
+
+
+def probe(url):
+    try:
+        with urllib.request.urlopen(url, timeout=1) as resp:
+            return resp.status
+    except urllib.error.HTTPError as e:
+        return e.code
+    except (urllib.error.URLError, OSError):
+        return 0
+
+
+def cold_start(project, command, env, live_path, ready_path, timeout):
+    """Seconds from spawning the service until liveness and readiness probes first answer 200"""
+    port = free_port()
+    log = tempfile.TemporaryFile()
+    started = time.perf_counter()
+    process = subprocess.Popen(command(port), cwd=PROJECTS_DIR / project, env=dict(os.environ, **env),
+                               stdout=subprocess.DEVNULL, stderr=log)
+    live = ready = None
+    try:
+        while ready is None and time.perf_counter() - started < timeout:
+            if process.poll() is not None:
+                log.seek(0)
+                raise RuntimeError(f"{project} exited: {log.read().decode(errors='replace')[-2000:]}")
+            if live is None and probe(f"http://127.0.0.1:{port}{live_path}") == 200:
+                live = time.perf_counter() - started
+            if live is not None and probe(f"http://127.0.0.1:{port}{ready_path}") == 200:
+                ready = time.perf_counter() - started
+            time.sleep(0.01)
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+    if ready is None:
+        raise RuntimeError(f"{project} was not ready within {timeout}s")
+    return live, ready
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--services", nargs="+", default=[s[0] for s in SERVICES],
+                        choices=[s[0] for s in SERVICES])
+    parser.add_argument("--runs", type=int, default=3, help="cold starts per service; the median is reported")
+    parser.add_argument("--latency", type=float, default=0.5, help="fake upstream latency in seconds")
+    parser.add_argument("--top", type=int, default=5, help="packages listed in the import profile")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    upstream = start_fake_upstreams(latency=args.latency)
+    upstream_url = f"http://127.0.0.1:{upstream.server_address[1]}"
+    rows, profiles = [], {}
+    try:
+        for label, project, statement, command, live_path, ready_path, extra in SERVICES:
+            if label not in args.services:
+                continue
+            with tempfile.TemporaryDirectory(prefix="startup-bench-") as workdir:
+                env = dict(service_env(upstream_url, workdir), **extra)
+                if project not in profiles:
+                    profiles[project] = import_profile(project, statement, env, args.top)
+                samples = [cold_start(project, command, env, live_path, ready_path, args.timeout)
+                           for _ in range(args.runs)]
+            rows.append({
+                "service": label,
+                "import_ms": profiles[project][0],
+                "live_ms": round(statistics.median(live for live, _ in samples) * 1000, 1),
+                "ready_ms": round(statistics.median(ready for _, ready in samples) * 1000, 1),
+            })
+    finally:
+        upstream.shutdown()
+
+    if args.json:
+        print(json.dumps({
+            "cold_start": rows,
+            "imports": {project: {"total_ms": total, "top_packages": dict(top)}
+                        for project, (total, top) in profiles.items()},
+        }, indent=2))
+        return
+    print_table(f"Cold start, median of {args.runs} (upstream latency {args.latency * 1000:.0f} ms)", rows)
+    for project, (total, top) in profiles.items():
+        print(f"\n{project}: imports take {total} ms")
+        for name, ms in top:
+            print(f"  {ms:>8} ms  {name}")
+
+
+if __name__ == "__main__":
+    main()
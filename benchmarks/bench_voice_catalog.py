@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Voice Catalog Benchmark
+voice_id validation cost, reads during refreshes and outages, and /voices and unknown-voice requests over HTTP
+
+    python benchmarks/bench_voice_catalog.py --voices 5000 --latency 0.3
+"""
+
+import argparse
+import json
+import statistics
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+from common import PROJECTS_DIR, fake_upstream_env, free_port, percentile, print_table, start_service, \
+    stop_service, timed_request, uvicorn_command
+from fake_upstreams import FAKE_VOICES, start_fake_upstreams
+
+sys.path.insert(0, str(PROJECTS_DIR / "elevenlabs-voice-bot"))
+from voice_catalog import VoiceCatalog  # noqa: E402
+
+
+def make_voices(count):
+    # Shaped like ElevenLabs ids: 20 alphanumeric characters
+    return {f"voice{i:015d}": f"Voice {i}" for i in range(count)}
+
+
+def time_per_call(fn, args_list):
+    started = time.perf_counter()
+    for args in args_list:
+        fn(*args)
+    return (time.perf_counter() - started) / len(args_list)
+
+
+def bench_lookups(voices, lookups):
+    catalog = VoiceCatalog(lambda: voices, ttl=3600)
+    catalog.refresh()
+    known = list(voices)
+    valid = [(known[i % len(known)],) for i in range(lookups)]
+    invalid = [(f"unknown-voice-{i}",) for i in range(lookups)]
+    return [
+        {"operation": "is_valid (known id)", "per_call_us": round(time_per_call(catalog.is_valid, valid) * 1e6, 3)},
+        {"operation": "is_valid (unknown id)",
+         "per_call_us": round(time_per_call(catalog.is_valid, invalid) * 1e6, 3)},
+        {"operation": "current() (voices + ETag)",
+         "per_call_us": round(time_per_call(catalog.current, [()] * lookups) * 1e6, 3)},
+    ]
+
+
+def bench_reads_during_refresh(voices, latency, duration, fail):
+    """Read latency while every snapshot is stale and each refresh takes ``latency`` (or, after the first, fails)"""
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        if len(calls) > 1:
+            time.sleep(latency)
+            if fail:
+                raise ConnectionError("upstream down")
+        return voices
+
+    catalog = VoiceCatalog(fetch, ttl=0.05, retry_interval=0.05)
+    catalog.refresh()
+    samples = []
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        current, _ = catalog.current()
+        samples.append(time.perf_counter() - started)
+        assert current
+        time.sleep(0.001)
+    return {
+        "scenario": f"refreshes {'failing' if fail else 'succeeding'} after {latency * 1000:.0f} ms",
+        "reads": len(samples),
+        "p50_us": round(percentile(samples, 50) * 1e6, 1),
+        "max_us": round(max(samples) * 1e6, 1),
+        "refreshes": catalog.refreshes,
+        "failures": catalog.failures,
+        "voices_served": len(catalog),
+    }
+
+
+def get_voices(url, etag=None):
+    req = urllib.request.Request(url, headers={"If-None-Match": etag} if etag else {})
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(req, timeout=30) as resp:
+            body = resp.read()
+            return time.perf_counter() - started, resp.status, len(body), resp.headers.get("ETag")
+    except urllib.error.HTTPError as e:
+        return time.perf_counter() - started, e.code, 0, e.headers.get("ETag")
+
+
+def bench_http(latency, tts_latency, requests):
+    upstream = start_fake_upstreams(latency=latency, tts_latency=tts_latency)
+    upstream_url = f"http://127.0.0.1:{upstream.server_address[1]}"
+    port = free_port()
+    rows = []
+    with tempfile.TemporaryDirectory(prefix="voice-catalog-bench-") as workdir:
+        env = dict(fake_upstream_env(upstream_url), REDIS_URL="", AUDIO_STORE="local",
+                   AUDIO_STORE_DIR=f"{workdir}/audio", AUDIO_METADATA_DB=f"{workdir}/audio.sqlite3",
+                   VOICE_CACHE_DIR=f"{workdir}/cache", TRANSLATION_CACHE_DB=f"{workdir}/translations.sqlite3")
+        process = start_service("elevenlabs-voice-bot", uvicorn_command(port), port, env, health_path="/ready")
+        try:
+            base = f"http://127.0.0.1:{port}"
+            for label, voice_id in (("unknown voice_id (id-shaped)", "Zz" * 10),
+                                    ("unknown voice_id (name)", "Nonexistent Voice"),
+                                    ("known voice_id", next(iter(FAKE_VOICES)))):
+                results = [timed_request(f"{base}/generate-voice", {"text": f"Hello number {i}", "voice_id": voice_id})
+                           for i in range(requests)]
+                latencies = [latency for latency, _ in results]
+                rows.append({"request": f"POST /generate-voice, {label}",
+                             "status": statistics.mode(status for _, status in results),
+                             "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+                             "p99_ms": round(percentile(latencies, 99) * 1000, 2), "bytes": "-"})
+            _, _, _, etag = get_voices(f"{base}/voices")
+            for label, header in (("GET /voices", None), ("GET /voices, If-None-Match", etag)):
+                results = [get_voices(f"{base}/voices", header) for _ in range(requests)]
+                latencies = [latency for latency, _, _, _ in results]
+                rows.append({"request": label, "status": results[-1][1],
+                             "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+                             "p99_ms": round(percentile(latencies, 99) * 1000, 2), "bytes": results[-1][2]})
+        finally:
+            stop_service(process)
+            upstream.shutdown()
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--voices", type=int, default=5000, help="catalog size for the in-process runs")
+    parser.add_argument("--lookups", type=int, default=200000)
+    parser.add_argument("--latency", type=float, default=0.3, help="voice list / API round trip in seconds")
+    parser.add_argument("--tts-latency", type=float, default=1.0, help="fake synthesis latency in seconds")
+    parser.add_argument("--duration", type=float, default=2.0, help="seconds of reads per refresh scenario")
+    parser.add_argument("--requests", type=int, default=20, help="HTTP requests per row")
+    parser.add_argument("--skip-http", action="store_true", help="only run the in-process measurements")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    voices = make_voices(args.voices)
+    results = {
+        "lookups": bench_lookups(voices, args.lookups),
+        "stale_reads": [bench_reads_during_refresh(voices, args.latency, args.duration, fail)
+                        for fail in (False, True)],
+    }
+    if not args.skip_http:
+        results["http"] = bench_http(args.latency, args.tts_latency, args.requests)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print_table(f"Catalog operations, {args.voices} voices", results["lookups"])
+    print_table("Reads while the snapshot is always stale", results["stale_reads"])
+    if "http" in results:
+        print_table(f"HTTP (API round trip {args.latency * 1000:.0f} ms, synthesis {args.tts_latency * 1000:.0f} ms)",
+                    results["http"])
+
+
+if __name__ == "__main__":
+    main()
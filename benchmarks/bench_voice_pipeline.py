@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Voice Pipeline Benchmark
+Compares sequential translate-then-synthesize with sentence-level pipelining.
+
+Translation and synthesis are replaced by stubs whose latency grows with the
+amount of text, the way gpt-3.5-turbo and ElevenLabs behave, so the numbers
+isolate the scheduling gain from any network noise.
+
+    python benchmarks/bench_voice_pipeline.py --sentences 2 4 8 16
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+
+from common import PROJECTS_DIR, print_table
+
+sys.path.insert(0, str(PROJECTS_DIR / "elevenlabs-voice-bot"))
+from pipeline import run_pipeline, split_sentences  # noqa: E402
+
+SENTENCE = "Thank you for calling, your request has been registered with our support team."
+
+
+class StubUpstreams:
+    def __init__(self, base, per_sentence_translate, per_sentence_synth):
+        self.base = base
+        self.per_sentence_translate = per_sentence_translate
+        self.per_sentence_synth = per_sentence_synth
+
+    @staticmethod
+    def _units(text):
+        return max(1, text.count("."))
+
+    async def translate(self, text):
+        await asyncio.sleep(self.base + self.per_sentence_translate * self._units(text))
+        return text
+
+    def _synthesize_blocking(self, text):
+        time.sleep(self.base + self.per_sentence_synth * self._units(text))
+        return b"\x00" * len(text)
+
+    async def synthesize(self, text):
+        return await asyncio.to_thread(self._synthesize_blocking, text)
+
+
+async def sequential(text, stubs):
+    started = time.perf_counter()
+    translated = await stubs.translate(text)
+    audio = await stubs.synthesize(translated)
+    elapsed = time.perf_counter() - started
+    return elapsed, elapsed, len(audio)
+
+
+async def pipelined(text, stubs, max_parallel):
+    started = time.perf_counter()
+    first_chunk = None
+    size = 0
+    async for _, audio in run_pipeline(split_sentences(text), stubs.translate, stubs.synthesize, max_parallel):
+        if first_chunk is None:
+            first_chunk = time.perf_counter() - started
+        size += len(audio)
+    return time.perf_counter() - started, first_chunk, size
+
+
+async def run(args):
+    stubs = StubUpstreams(args.base_latency, args.translate_latency, args.synth_latency)
+    rows = []
+    for count in args.sentences:
+        text = " ".join([SENTENCE] * count)
+        seq_total, seq_first, _ = await sequential(text, stubs)
+        pipe_total, pipe_first, _ = await pipelined(text, stubs, args.max_parallel)
+        rows.append({
+            "sentences": count,
+            "sequential_ms": round(seq_total * 1000),
+            "pipelined_ms": round(pipe_total * 1000),
+            "speedup": round(seq_total / pipe_total, 2),
+            "seq_first_audio_ms": round(seq_first * 1000),
+            "pipe_first_audio_ms": round(pipe_first * 1000),
+        })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sentences", type=int, nargs="+", default=[2, 4, 8, 16])
+    parser.add_argument("--base-latency", type=float, default=0.05, help="fixed cost per upstream call, seconds")
+    parser.add_argument("--translate-latency", type=float, default=0.08, help="translation cost per sentence")
+    parser.add_argument("--synth-latency", type=float, default=0.12, help="synthesis cost per sentence")
+    parser.add_argument("--max-parallel", type=int, default=4, help="concurrent syntheses")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    rows = asyncio.run(run(args))
+    if args.json:
+        print(json.dumps(rows, indent=2))
+    else:
+        print_table(f"Sequential vs pipelined synthesis (max_parallel={args.max_parallel})", rows)
+
+
+if __name__ == "__main__":
+    main()
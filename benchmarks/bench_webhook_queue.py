@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Webhook Queue Benchmark
+Compares WhatsApp webhook latency in sync mode and enqueue-and-ack mode.
+
+In sync mode every webhook waits for a full OpenAI round trip; in queue mode
+the webhook only records the job and replies are sent by background workers.
+
+    python benchmarks/bench_webhook_queue.py --latency 0.5 --concurrency 16
+"""
+
+import argparse
+import itertools
+import json
+import time
+
+from common import (fake_upstream_env, free_port, gunicorn_command, print_table, run_load,
+                    start_service, stop_service)
+from fake_upstreams import start_fake_upstreams
+
+_ids = itertools.count()
+
+
+def webhook_payload(i):
+    return {"message": {
+        "id": f"wamid.bench-{next(_ids)}",
+        "from": f"92300{i % 500:07d}",
+        "text": {"body": "Hi, what are your business hours?"},
+    }}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--latency", type=float, default=0.5, help="fake OpenAI latency in seconds")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    upstream = start_fake_upstreams(latency=args.latency)
+    upstream_url = f"http://127.0.0.1:{upstream.server_address[1]}"
+    rows = []
+    try:
+        for mode in ("sync", "queue"):
+            port = free_port()
+            env = dict(fake_upstream_env(upstream_url), WEBHOOK_MODE=mode, REDIS_URL="")
+            process = start_service("whatsapp-automation-bot", gunicorn_command(port), port, env)
+            try:
+                row = run_load(f"http://127.0.0.1:{port}/webhook", webhook_payload,
+                               args.concurrency, args.requests)
+                if mode == "queue":
+                    # Let the workers drain so the reply throughput is visible too
+                    deadline = time.time() + 120
+                    while time.time() < deadline:
+                        sent = upstream.snapshot().get("/{phone}/messages", 0)
+                        if sent >= args.requests:
+                            break
+                        time.sleep(0.2)
+                rows.append({"mode": mode, **row})
+            finally:
+                stop_service(process)
+    finally:
+        upstream.shutdown()
+
+    if args.json:
+        print(json.dumps(rows, indent=2))
+    else:
+        print_table(f"/webhook latency (OpenAI latency {args.latency * 1000:.0f} ms)", rows)
+
+
+if __name__ == "__main__":
+    main()
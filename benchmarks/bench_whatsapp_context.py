@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+WhatsApp Context Benchmark
+Prompt-building cost per message and prompt size: the joined last-five-turns string vs the token-budgeted ContextBuilder
+
+Each simulated user sends a stream of messages; the bot's reply and the
+summarizer are stubs, so only prompt assembly and history bookkeeping are
+timed. Prompt sizes are counted with the builder's TokenCounter (tiktoken
+when its encoding is available, otherwise the estimate).
+
+    python benchmarks/bench_whatsapp_context.py --users 200 --messages 40
+"""
+
+import argparse
+import json
+import random
+import sys
+import time
+
+from common import PROJECTS_DIR, percentile, print_table
+
+sys.path.insert(0, str(PROJECTS_DIR / "whatsapp-automation-bot"))
+from context_builder import MESSAGE_OVERHEAD, REPLY_OVERHEAD, ContextBuilder, TokenCounter  # noqa: E402
+from conversation_store import MemoryConversationStore  # noqa: E402
+
+SYSTEM_PROMPT = "You are a helpful business assistant. Be professional, friendly, and concise."
+WORDS = ("order delivery refund invoice tracking number address account payment shipping status product "
+         "warranty return exchange price discount subscription appointment booking schedule").split()
+REPLY = ("Thanks for reaching out! I've checked your order and it is on its way. You should receive it within "
+         "two business days. Is there anything else I can help you with today?")
+SUMMARY = " ".join(["The customer asked about order 1042, its delivery date and a refund for a damaged item."] * 4)
+
+# Words per message: (probability, low, high)
+PROFILES = {
+    "short": [(1.0, 5, 25)],
+    "chatty": [(1.0, 40, 120)],
+    "pastes": [(0.9, 5, 25), (0.1, 800, 2000)],
+}
+
+
+def make_message(rng, profile):
+    roll = rng.random()
+    for probability, low, high in PROFILES[profile]:
+        if roll < probability:
+            break
+        roll -= probability
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(low, high))) + "?"
+
+
+def legacy_context(store, user_id, current_message):
+    """The pre-ContextBuilder WhatsAppBot.get_conversation_context"""
+    recent_messages = store.recent(user_id, 5)
+    if recent_messages:
+        context = "\n".join([f"User: {msg['user']}\nBot: {msg['bot']}" for msg in recent_messages])
+        return f"{context}\nUser: {current_message}"
+    return f"User: {current_message}"
+
+
+def prompt_tokens(counter, messages):
+    return sum(counter.count(message["content"]) + MESSAGE_OVERHEAD for message in messages) + REPLY_OVERHEAD
+
+
+class RecountingBuilder(ContextBuilder):
+    """ContextBuilder that ignores the stored counts and re-tokenizes every turn on each build"""
+
+    def turn_tokens(self, turn):
+        return super().turn_tokens(dict(turn, tokens=None))
+
+
+def run_legacy(counter, conversations, max_turns):
+    store = MemoryConversationStore(max_turns, max_users=len(conversations), ttl=3600)
+    elapsed, sizes = 0.0, []
+    for step in range(len(conversations[0])):
+        for user, messages in enumerate(conversations):
+            started = time.perf_counter()
+            context = legacy_context(store, str(user), messages[step])
+            store.append(str(user), {"user": messages[step], "bot": REPLY, "timestamp": time.time()})
+            elapsed += time.perf_counter() - started
+            sizes.append(prompt_tokens(counter, [{"content": SYSTEM_PROMPT}, {"content": context}]))
+    return elapsed, sizes, None
+
+
+def run_builder(builder_class, counter, conversations, max_turns, budget, summary_latency):
+    def summarize(summary, turns, max_tokens):
+        time.sleep(summary_latency)
+        return SUMMARY
+
+    store = MemoryConversationStore(max_turns, max_users=len(conversations), ttl=3600)
+    builder = builder_class(store, SYSTEM_PROMPT, summarize, counter=counter, token_budget=budget)
+    elapsed, sizes = 0.0, []
+    for step in range(len(conversations[0])):
+        for user, messages in enumerate(conversations):
+            started = time.perf_counter()
+            prompt = builder.build(str(user), messages[step])
+            builder.record(str(user), prompt.message, REPLY, prompt.message_tokens)
+            elapsed += time.perf_counter() - started
+            sizes.append(prompt.tokens)
+    if builder._executor is not None:
+        builder._executor.shutdown(wait=True)
+    # The builder's own total must agree with an independent count of what it sent
+    assert prompt_tokens(counter, prompt.messages) <= prompt.tokens
+    return elapsed, sizes, builder.stats()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--messages", type=int, default=40, help="messages per user")
+    parser.add_argument("--profiles", nargs="+", default=list(PROFILES), choices=list(PROFILES))
+    parser.add_argument("--budget", type=int, default=1200, help="CONTEXT_TOKEN_BUDGET")
+    parser.add_argument("--max-turns", type=int, default=10, help="CONVERSATION_MAX_TURNS")
+    parser.add_argument("--summary-latency", type=float, default=0.0, help="seconds per stubbed summary call")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    counter = TokenCounter()
+    counter.load()
+    rows = []
+    for profile in args.profiles:
+        rng = random.Random(args.seed)
+        conversations = [[make_message(rng, profile) for _ in range(args.messages)] for _ in range(args.users)]
+        for label, run in (
+            ("legacy joined string", lambda: run_legacy(counter, conversations, args.max_turns)),
+            ("ContextBuilder, recounting", lambda: run_builder(RecountingBuilder, counter, conversations,
+                                                               args.max_turns, args.budget, args.summary_latency)),
+            ("ContextBuilder", lambda: run_builder(ContextBuilder, counter, conversations, args.max_turns,
+                                                   args.budget, args.summary_latency)),
+        ):
+            elapsed, sizes, stats = run()
+            rows.append({
+                "profile": profile,
+                "context": label,
+                "per_message_us": round(elapsed / len(sizes) * 1e6, 1),
+                "p50_tokens": round(percentile(sizes, 50)),
+                "p99_tokens": round(percentile(sizes, 99)),
+                "max_tokens": max(sizes),
+                "summaries": stats["summaries"] if stats else "-",
+            })
+
+    if args.json:
+        print(json.dumps({"tokenizer": counter.name, "results": rows}, indent=2))
+        return
+    print_table(f"{args.users} users x {args.messages} messages, budget {args.budget} tokens "
+                f"(token counts: {counter.name})", rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+WhatsApp Serving Benchmark
+Concurrent sync-mode /webhook throughput on the Flask dev server vs gunicorn with gunicorn.conf.py.
+
+Every webhook waits on a fake OpenAI call, so throughput is bounded by how
+many requests each setup keeps in flight rather than by CPU.
+
+    python benchmarks/bench_whatsapp_serving.py --latency 0.3 --concurrency 64 --requests 640
+"""
+
+import argparse
+import json
+import sys
+
+from common import fake_upstream_env, free_port, print_table, run_load, start_service, stop_service
+from fake_upstreams import start_fake_upstreams
+
+GUNICORN = [sys.executable, "-m", "gunicorn", "app:app", "--config", "gunicorn.conf.py"]
+
+# (label, command for a port, extra environment)
+CONFIGS = [
+    # What `python app.py` ran: debugger on; the reloader is left out so the benchmark can stop it
+    ("flask dev server (debug)",
+     lambda port: [sys.executable, "-c",
+                   f"from app import app; app.run(host='127.0.0.1', port={port}, debug=True, use_reloader=False)"],
+     {}),
+    ("gunicorn sync x1 (old CMD)",
+     lambda port: GUNICORN + ["--bind", f"127.0.0.1:{port}", "--worker-class", "sync", "--threads", "1",
+                              "--workers", "1"],
+     {}),
+    ("gunicorn.conf.py (gthread x1)", lambda port: GUNICORN + ["--bind", f"127.0.0.1:{port}"], {}),
+    ("gunicorn.conf.py (gthread x4)", lambda port: GUNICORN + ["--bind", f"127.0.0.1:{port}"],
+     {"GUNICORN_WORKERS": "4"}),
+]
+
+
+def webhook_payload(i):
+    # Not an FAQ, so every webhook waits on OpenAI
+    return {"message": {
+        "id": f"wamid.serving-{i}",
+        "from": f"92300{i % 500:07d}",
+        "text": {"body": f"Can I change the delivery address on order {i}?"},
+    }}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--latency", type=float, default=0.3, help="fake OpenAI latency in seconds")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--requests", type=int, default=640)
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    upstream = start_fake_upstreams(latency=args.latency)
+    upstream_url = f"http://127.0.0.1:{upstream.server_address[1]}"
+    rows = []
+    try:
+        for label, command, extra in CONFIGS:
+            port = free_port()
+            env = dict(fake_upstream_env(upstream_url), WEBHOOK_MODE="sync", REDIS_URL="", **extra)
+            process = start_service("whatsapp-automation-bot", command(port), port, env)
+            try:
+                row = run_load(f"http://127.0.0.1:{port}/webhook", webhook_payload, args.concurrency, args.requests)
+                rows.append({"server": label, **row})
+            finally:
+                stop_service(process)
+    finally:
+        upstream.shutdown()
+
+    if args.json:
+        print(json.dumps(rows, indent=2))
+    else:
+        print_table(f"Sync /webhook (OpenAI latency {args.latency * 1000:.0f} ms)", rows)
+
+
+if __name__ == "__main__":
+    main()
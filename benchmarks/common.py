@@ -0,0 +1,139 @@
+"""
+Benchmark helpers
+Start bot services as subprocesses and drive HTTP load against them
+"""
+
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+PROJECTS_DIR = REPO_ROOT / "projects"
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def fake_upstream_env(upstream_url):
+    """Environment that points every bot at the fake upstream server"""
+    return {
+        "OPENAI_API_KEY": "sk-fake",
+        "OPENAI_BASE_URL": f"{upstream_url}/v1",
+        "ELEVENLABS_API_KEY": "fake",
+        "ELEVEN_BASE_URL": f"{upstream_url}/v1",
+        "WHATSAPP_API_URL": upstream_url,
+        "WHATSAPP_PHONE_NUMBER": "15550000000",
+        "WHATSAPP_API_KEY": "fake",
+    }
+
+
+def start_service(project, command, port, env=None, health_path="/health", timeout=30):
+    """Launch a service from its project directory and wait until it is healthy"""
+    full_env = dict(os.environ)
+    full_env.update(env or {})
+    # A file rather than a pipe: nobody reads the logs under load, and a full pipe blocks the service
+    log = tempfile.TemporaryFile()
+    process = subprocess.Popen(
+        command,
+        cwd=PROJECTS_DIR / project,
+        env=full_env,
+        stdout=subprocess.DEVNULL,
+        stderr=log,
+    )
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            log.seek(0)
+            raise RuntimeError(f"{project} exited: {log.read().decode(errors='replace')}")
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}{health_path}", timeout=1):
+                return process
+        except (urllib.error.URLError, ConnectionError, OSError):
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f"{project} did not become healthy within {timeout}s")
+
+
+def uvicorn_command(port, workers=1):
+    return [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1",
+            "--port", str(port), "--workers", str(workers), "--log-level", "warning"]
+
+
+def gunicorn_command(port, module="app:app", workers=1, threads=16):
+    return [sys.executable, "-m", "gunicorn", module, "--bind", f"127.0.0.1:{port}",
+            "--workers", str(workers), "--threads", str(threads), "--log-level", "warning"]
+
+
+def stop_service(process):
+    process.terminate()
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+def timed_request(url, payload=None, method=None, timeout=60):
+    """Issue one request and return (latency_seconds, status_code)"""
+    data = json.dumps(payload).encode() if payload is not None else None
+    req = urllib.request.Request(url, data=data, method=method or ("POST" if data else "GET"))
+    if data is not None:
+        req.add_header("Content-Type", "application/json")
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            resp.read()
+            status = resp.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    except (urllib.error.URLError, OSError):
+        status = 0
+    return time.perf_counter() - start, status
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def run_load(url, payload_factory, concurrency, total):
+    """Send ``total`` requests with ``concurrency`` in flight and summarise them"""
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(lambda i: timed_request(url, payload_factory(i)), range(total)))
+    elapsed = time.perf_counter() - start
+    latencies = [latency for latency, status in results if 200 <= status < 300]
+    return {
+        "concurrency": concurrency,
+        "requests": total,
+        "errors": total - len(latencies),
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(total / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+    }
+
+
+def print_table(title, rows):
+    print(f"\n{title}")
+    if not rows:
+        return
+    headers = list(rows[0].keys())
+    widths = {h: max(len(h), *(len(str(r[h])) for r in rows)) for h in headers}
+    print("  ".join(h.rjust(widths[h]) for h in headers))
+    for row in rows:
+        print("  ".join(str(row[h]).rjust(widths[h]) for h in headers))
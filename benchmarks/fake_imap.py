@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+Fake IMAP Server
+Local stand-in for an IMAP mailbox with UID FETCH, partial body fetch and IDLE
+"""
+
+import argparse
+import re
+import select
+import socketserver
+import threading
+import time
+
+UIDVALIDITY = 1
+
+
+class FakeIMAPHandler(socketserver.StreamRequestHandler):
+    """Speaks enough IMAP4rev1 for imaplib against a single read-only INBOX"""
+
+    disable_nagle_algorithm = True
+
+    def send(self, data):
+        self.wfile.write(data if isinstance(data, bytes) else f"{data}\r\n".encode())
+
+    def handle(self):
+        server = self.server
+        self.known = 0
+        self.send("* OK [CAPABILITY IMAP4rev1 IDLE AUTH=PLAIN] fake-imap ready")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            time.sleep(server.latency)
+            parts = line.decode(errors="replace").strip().split(" ", 2)
+            if len(parts) < 2:
+                continue
+            tag, command = parts[0], parts[1].upper()
+            args = parts[2] if len(parts) > 2 else ""
+            if command == "CAPABILITY":
+                self.send("* CAPABILITY IMAP4rev1 IDLE AUTH=PLAIN")
+                self.send(f"{tag} OK CAPABILITY completed")
+            elif command == "LOGIN":
+                self.send(f"{tag} OK LOGIN completed")
+            elif command in ("SELECT", "EXAMINE"):
+                count, uidnext = server.snapshot()
+                self.known = count
+                self.send(f"* {count} EXISTS")
+                self.send(f"* OK [UIDVALIDITY {UIDVALIDITY}] UIDs valid")
+                self.send(f"* OK [UIDNEXT {uidnext}] Predicted next UID")
+                self.send(f"{tag} OK [READ-ONLY] {command} completed")
+            elif command == "UID":
+                self.uid_command(tag, args)
+            elif command == "IDLE":
+                self.idle(tag)
+            elif command == "NOOP":
+                self.send(f"{tag} OK NOOP completed")
+            elif command == "LOGOUT":
+                self.send("* BYE fake-imap logging out")
+                self.send(f"{tag} OK LOGOUT completed")
+                return
+            else:
+                self.send(f"{tag} BAD unknown command")
+
+    def uid_command(self, tag, args):
+        server = self.server
+        sub, _, rest = args.partition(" ")
+        sub = sub.upper()
+        if sub == "SEARCH":
+            match = re.search(r"UID (\d+):\*", rest)
+            low = int(match.group(1)) if match else 1
+            uids = server.uids()
+            # "n:*" always includes the highest UID, even when it is below n
+            found = [uid for uid in uids if uid >= low] or uids[-1:]
+            self.send(f"* SEARCH {' '.join(map(str, found))}".rstrip())
+            self.send(f"{tag} OK SEARCH completed")
+        elif sub == "FETCH":
+            uid_set, _, items = rest.partition(" ")
+            for seq, uid, raw in server.select_uids(uid_set):
+                self.send_fetch(seq, uid, raw, items.upper())
+            self.send(f"{tag} OK FETCH completed")
+        else:
+            self.send(f"{tag} BAD unsupported UID command")
+
+    def send_fetch(self, seq, uid, raw, items):
+        fields = [f"UID {uid}"]
+        if "RFC822.SIZE" in items:
+            fields.append(f"RFC822.SIZE {len(raw)}")
+        literal = None
+        header_match = re.search(r"BODY\.PEEK\[HEADER\.FIELDS \(([^)]*)\)\]", items)
+        partial_match = re.search(r"BODY\.PEEK\[\]<(\d+)\.(\d+)>", items)
+        if header_match:
+            wanted = set(header_match.group(1).split())
+            header_block = raw.split(b"\r\n\r\n", 1)[0]
+            lines = [h for h in header_block.split(b"\r\n") if h.split(b":", 1)[0].decode().upper() in wanted]
+            literal = (b"\r\n".join(lines) + b"\r\n\r\n", f"BODY[HEADER.FIELDS ({header_match.group(1)})]")
+        elif partial_match:
+            offset, length = int(partial_match.group(1)), int(partial_match.group(2))
+            literal = (raw[offset:offset + length], f"BODY[]<{offset}>")
+        elif "BODY.PEEK[]" in items or "RFC822" in items.split():
+            literal = (raw, "BODY[]")
+        if literal is None:
+            self.send(f"* {seq} FETCH ({' '.join(fields)})")
+            return
+        data, name = literal
+        self.send(f"* {seq} FETCH ({' '.join(fields)} {name} {{{len(data)}}}\r\n".encode() + data + b")\r\n")
+
+    def idle(self, tag):
+        self.send("+ idling")
+        while True:
+            count, _ = self.server.snapshot()
+            if count > self.known:
+                self.known = count
+                self.send(f"* {count} EXISTS")
+            readable, _, _ = select.select([self.connection], [], [], 0.02)
+            if readable:
+                self.rfile.readline()  # DONE
+                self.send(f"{tag} OK IDLE terminated")
+                return
+
+
+class FakeIMAPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, latency=0.0):
+        super().__init__(address, FakeIMAPHandler)
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.messages = []  # (uid, raw bytes)
+
+    def add_message(self, raw):
+        with self.lock:
+            uid = self.messages[-1][0] + 1 if self.messages else 1
+            self.messages.append((uid, raw))
+            return uid
+
+    def snapshot(self):
+        with self.lock:
+            return len(self.messages), (self.messages[-1][0] + 1 if self.messages else 1)
+
+    def uids(self):
+        with self.lock:
+            return [uid for uid, _ in self.messages]
+
+    def select_uids(self, uid_set):
+        wanted = set()
+        for piece in uid_set.split(","):
+            low, _, high = piece.partition(":")
+            if high == "*":
+                high = str(1 << 31)
+            wanted.update(range(int(low), int(high or low) + 1) if high else [int(low)])
+        with self.lock:
+            return [(seq, uid, raw) for seq, (uid, raw) in enumerate(self.messages, 1) if uid in wanted]
+
+
+def make_message(index, body="", attachment_bytes=0, attachment_first=False, subject=None):
+    """Raw RFC 5322 message, multipart when an attachment is requested"""
+    subject = subject or f"Support request {index}"
+    headers = (f"From: Customer {index} <customer{index}@example.com>\r\nTo: support@example.com\r\n"
+               f"Subject: {subject}\r\nMessage-ID: <{index}@fake-imap>\r\n"
+               f"Date: Mon, 01 Jan 2024 00:00:00 +0000\r\nMIME-Version: 1.0\r\n")
+    body = body or f"Hello, I need help with order {index}. It has not arrived yet.\r\n"
+    if not attachment_bytes:
+        return (headers + "Content-Type: text/plain; charset=utf-8\r\n\r\n" + body).encode()
+    text_part = f"--b1\r\nContent-Type: text/plain; charset=utf-8\r\n\r\n{body}\r\n"
+    line = "QUJDREVGR0hJSktMTU5PUFFSU1RVVldYWVphYmNkZWZnaGlqa2xtbm9wcXJzdHV2d3h5ejAxMjM0NTY3\r\n"
+    attachment = ("--b1\r\nContent-Type: application/pdf\r\nContent-Transfer-Encoding: base64\r\n"
+                  "Content-Disposition: attachment; filename=\"invoice.pdf\"\r\n\r\n"
+                  + line * max(1, attachment_bytes // len(line)))
+    parts = [attachment, text_part] if attachment_first else [text_part, attachment]
+    return (headers + "Content-Type: multipart/mixed; boundary=\"b1\"\r\n\r\n"
+            + "".join(parts) + "--b1--\r\n").encode()
+
+
+def start_fake_imap(port, latency=0.0):
+    """Run the fake server on a daemon thread and return it"""
+    server = FakeIMAPServer(("127.0.0.1", port), latency)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--port", type=int, default=1143)
+    parser.add_argument("--latency", type=float, default=0.002, help="seconds added to every command")
+    parser.add_argument("--messages", type=int, default=100, help="messages preloaded into INBOX")
+    parser.add_argument("--rate", type=float, default=0.0, help="new messages per second after start")
+    args = parser.parse_args()
+    server = FakeIMAPServer(("127.0.0.1", args.port), args.latency)
+    for i in range(args.messages):
+        server.add_message(make_message(i))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"Fake IMAP server on 127.0.0.1:{args.port} with {args.messages} messages")
+    index = args.messages
+    while True:
+        if args.rate:
+            time.sleep(1 / args.rate)
+            server.add_message(make_message(index))
+            index += 1
+        else:
+            time.sleep(3600)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Fake S3 Server
+Local MinIO-like stand-in for an S3-compatible bucket: path-style PUT, ranged GET and DELETE of objects
+"""
+
+import argparse
+import hashlib
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote, urlsplit
+
+RANGE_RE = re.compile(r"bytes=(\d+)-(\d*)$")
+
+
+class FakeS3Handler(BaseHTTPRequestHandler):
+    """Speaks enough of the S3 REST API for boto3's put_object, get_object and delete_object"""
+
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _key(self):
+        return unquote(urlsplit(self.path).path).lstrip("/")
+
+    def _send(self, status, body=b"", headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if body and self.command != "HEAD":
+            self.wfile.write(body)
+
+    def _error(self, status, code):
+        body = f'<?xml version="1.0" encoding="UTF-8"?><Error><Code>{code}</Code></Error>'.encode()
+        self._send(status, body, {"Content-Type": "application/xml"})
+
+    def do_PUT(self):
+        time.sleep(self.server.latency)
+        data = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        with self.server.lock:
+            self.server.objects[self._key()] = (data, self.headers.get("Content-Type", "binary/octet-stream"))
+        self._send(200, headers={"ETag": f'"{hashlib.md5(data).hexdigest()}"'})
+
+    def do_GET(self):
+        time.sleep(self.server.latency)
+        with self.server.lock:
+            obj = self.server.objects.get(self._key())
+        if obj is None:
+            self._error(404, "NoSuchKey")
+            return
+        data, content_type = obj
+        match = RANGE_RE.match(self.headers.get("Range", ""))
+        if not match:
+            self._send(200, data, {"Content-Type": content_type})
+            return
+        start = int(match.group(1))
+        end = min(int(match.group(2)) if match.group(2) else len(data) - 1, len(data) - 1)
+        if start >= len(data):
+            self._error(416, "InvalidRange")
+            return
+        self._send(206, data[start:end + 1], {"Content-Type": content_type,
+                                              "Content-Range": f"bytes {start}-{end}/{len(data)}"})
+
+    do_HEAD = do_GET
+
+    def do_DELETE(self):
+        time.sleep(self.server.latency)
+        key = self._key()
+        if key in self.server.deny_delete:
+            self._error(403, "AccessDenied")
+            return
+        with self.server.lock:
+            self.server.objects.pop(key, None)
+        # S3 answers 204 whether or not the object existed
+        self._send(204)
+
+
+class FakeS3Server(ThreadingHTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, latency=0.0):
+        super().__init__(address, FakeS3Handler)
+        self.latency = latency
+        self.lock = threading.Lock()
+        # "bucket/key" -> (bytes, content type)
+        self.objects = {}
+        # "bucket/key" paths whose DELETE is refused, to exercise failed deletes
+        self.deny_delete = set()
+
+
+def start_fake_s3(port, latency=0.0):
+    """Run the fake server on a daemon thread and return it"""
+    server = FakeS3Server(("127.0.0.1", port), latency)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every request")
+    args = parser.parse_args()
+    server = FakeS3Server(("127.0.0.1", args.port), args.latency)
+    print(f"Fake S3 server on 127.0.0.1:{args.port}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
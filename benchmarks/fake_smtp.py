@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Fake SMTP Server
+Local stand-in for an SMTP relay with configurable round-trip and handshake latency
+"""
+
+import argparse
+import random
+import socketserver
+import threading
+import time
+
+
+class FakeSMTPHandler(socketserver.StreamRequestHandler):
+    """Speaks enough ESMTP for smtplib: EHLO, AUTH, MAIL, RCPT, DATA, RSET, NOOP, QUIT"""
+
+    def reply(self, line):
+        time.sleep(self.server.latency)
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self):
+        server = self.server
+        # Stands in for the TCP + TLS + AUTH cost a pooled session only pays once
+        time.sleep(server.connect_latency)
+        with server.lock:
+            server.connections += 1
+        self.reply("220 fake-smtp ESMTP ready")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode(errors="replace").strip()
+            verb = command.split(" ", 1)[0].upper()
+            if verb in ("EHLO", "HELO"):
+                time.sleep(server.latency)
+                self.wfile.write(b"250-fake-smtp\r\n250-AUTH PLAIN LOGIN\r\n250 8BITMIME\r\n")
+            elif verb == "AUTH":
+                self.reply("235 2.7.0 Authentication successful")
+            elif verb == "MAIL":
+                if random.random() < server.temp_fail_rate:
+                    self.reply("451 4.7.1 Try again later")
+                else:
+                    self.reply("250 OK")
+            elif verb in ("RCPT", "RSET", "NOOP"):
+                self.reply("250 OK")
+            elif verb == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                while self.rfile.readline() not in (b".\r\n", b".\n", b""):
+                    pass
+                with server.lock:
+                    server.delivered += 1
+                self.reply("250 OK queued")
+            elif verb == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("502 Command not implemented")
+
+
+class FakeSMTPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, latency=0.0, connect_latency=0.0, temp_fail_rate=0.0):
+        super().__init__(address, FakeSMTPHandler)
+        self.latency = latency
+        self.connect_latency = connect_latency
+        self.temp_fail_rate = temp_fail_rate
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.delivered = 0
+
+
+def start_fake_smtp(port, latency=0.0, connect_latency=0.0, temp_fail_rate=0.0):
+    """Run the fake server on a daemon thread and return it"""
+    server = FakeSMTPServer(("127.0.0.1", port), latency, connect_latency, temp_fail_rate)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--port", type=int, default=2525)
+    parser.add_argument("--latency", type=float, default=0.005, help="seconds added to every reply")
+    parser.add_argument("--connect-latency", type=float, default=0.05, help="seconds added per new session")
+    parser.add_argument("--temp-fail-rate", type=float, default=0.0, help="fraction of MAIL FROM answered 451")
+    args = parser.parse_args()
+    server = FakeSMTPServer(("127.0.0.1", args.port), args.latency, args.connect_latency, args.temp_fail_rate)
+    print(f"Fake SMTP server on 127.0.0.1:{args.port}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+Fake Upstream Server
+Local stand-in for the OpenAI, ElevenLabs and WhatsApp HTTP APIs used by the benchmarks
+"""
+
+import argparse
+import json
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+FAKE_VOICES = {
+    "21m00Tcm4TlvDq8ikWAM": "Rachel",
+    "AZnzlk1XvdvUeBnXmlld": "Domi",
+    "EXAVITQu4vr4xnSDxMaL": "Bella",
+}
+
+
+class FakeUpstreamHandler(BaseHTTPRequestHandler):
+    """Answers just enough of each API for the bots to run end to end"""
+
+    protocol_version = "HTTP/1.1"
+    server_version = "FakeUpstream/1.0"
+    # Headers and body go out in separate writes; with Nagle on, the body waits for a delayed ACK (~40 ms)
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        try:
+            return json.loads(body or b"{}")
+        except ValueError:
+            return {}
+
+    def _send_json(self, payload, status=200):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _maybe_fail(self, latency=None):
+        """Inject latency, slow calls, rate limiting and errors according to the server settings"""
+        config = self.server.config
+        self.server.record(self.path)
+        if not self.server.enter():
+            # Over capacity: rejected at once, like a rate-limited API
+            self._send_json({"error": {"message": "injected rate limit", "type": "rate_limit_exceeded"}}, status=429)
+            return True
+        try:
+            delay = config["latency"] if latency is None else latency
+            if random.random() < config["slow_rate"]:
+                delay = config["slow_latency"]
+            time.sleep(delay + random.uniform(0, config["jitter"]))
+        finally:
+            self.server.leave()
+        if random.random() < config["error_rate"]:
+            self._send_json({"error": {"message": "injected failure"}}, status=503)
+            return True
+        return False
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/voices"):
+            if self._maybe_fail():
+                return
+            voices = [{"voice_id": vid, "name": name} for vid, name in FAKE_VOICES.items()]
+            self._send_json({"voices": voices})
+        elif self.path == "/stats":
+            self._send_json(self.server.snapshot())
+        else:
+            self._send_json({"error": "not found"}, status=404)
+
+    def do_POST(self):
+        payload = self._read_json()
+        if self.path == "/config":
+            # Change injected faults while running, e.g. {"error_rate": 1.0} to start an outage
+            self.server.config.update({key: value for key, value in payload.items() if key in self.server.config})
+            self._send_json(self.server.config)
+        elif self.path.endswith("/chat/completions"):
+            if self._maybe_fail():
+                return
+            self._send_json(self._chat_completion(payload))
+        elif re.search(r"/text-to-speech/[^/]+", self.path):
+            voice_id = re.search(r"/text-to-speech/([^/?]+)", self.path).group(1)
+            if voice_id not in FAKE_VOICES:
+                # Like ElevenLabs: rejected after a round trip, without synthesizing anything
+                if not self._maybe_fail():
+                    self._send_json({"detail": {"status": "voice_not_found",
+                                                "message": f"A voice with voice_id {voice_id} was not found."}},
+                                    status=400)
+                return
+            if self._maybe_fail(self.server.config["tts_latency"]):
+                return
+            self._send_audio(payload, stream=self.path.endswith("/stream"))
+        elif self.path.endswith("/messages"):
+            # WhatsApp Business API send-message call
+            self.server.record("/{phone}/messages")
+            self._send_json({"messaging_product": "whatsapp",
+                             "messages": [{"id": f"wamid.{uuid.uuid4().hex}"}]})
+        else:
+            self._send_json({"error": "not found"}, status=404)
+
+    def _chat_completion(self, payload):
+        messages = payload.get("messages") or [{"content": ""}]
+        prompt = messages[-1].get("content", "")
+        categories = ["support", "sales", "billing", "general"]
+        if "JSON array" in prompt:
+            count = len(re.findall(r"^Email \d+:", prompt, re.MULTILINE))
+            content = json.dumps([{"id": i, "category": random.choice(categories)} for i in range(1, count + 1)])
+        elif "Return only the category name" in prompt or "category" in prompt.lower():
+            content = random.choice(categories)
+        else:
+            content = f"[fake] {prompt[-200:]}"
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": payload.get("model", "gpt-3.5-turbo"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+            "usage": {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(content) // 4,
+                      "total_tokens": (len(prompt) + len(content)) // 4},
+        }
+
+    def _send_audio(self, payload, stream=False):
+        """Return pseudo-mp3 bytes sized by text length, chunked when streaming"""
+        config = self.server.config
+        size = max(1024, len(payload.get("text", "")) * config["bytes_per_char"])
+        self.send_response(200)
+        self.send_header("Content-Type", "audio/mpeg")
+        if not stream:
+            self.send_header("Content-Length", str(size))
+            self.end_headers()
+            self.wfile.write(b"\xff\xfb" + b"\x00" * (size - 2))
+            return
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        chunk_size = 4096
+        sent = 0
+        while sent < size:
+            chunk = b"\x00" * min(chunk_size, size - sent)
+            self.wfile.write(f"{len(chunk):X}\r\n".encode() + chunk + b"\r\n")
+            self.wfile.flush()
+            sent += len(chunk)
+            time.sleep(config["chunk_interval"])
+        self.wfile.write(b"0\r\n\r\n")
+
+
+class FakeUpstreamServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # The default backlog of 5 drops connects from bursts of clients, which then wait ~1 s to retry the SYN
+    request_queue_size = 128
+
+    def __init__(self, address, config):
+        super().__init__(address, FakeUpstreamHandler)
+        self.config = config
+        self._lock = threading.Lock()
+        self._counts = {}
+        self._in_flight = 0
+
+    def enter(self):
+        """Count a call in flight; False when that would exceed the configured capacity (0 is unlimited)"""
+        with self._lock:
+            if self.config["capacity"] and self._in_flight >= self.config["capacity"]:
+                return False
+            self._in_flight += 1
+            return True
+
+    def leave(self):
+        with self._lock:
+            self._in_flight -= 1
+
+    def handle_error(self, request, client_address):
+        # Clients that time out and hang up are part of the fault scenarios, not server errors
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+    def record(self, path):
+        key = re.sub(r"/text-to-speech/[^/]+", "/text-to-speech/{voice_id}", path)
+        with self._lock:
+            self._counts[key] = self._counts.get(key, 0) + 1
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._counts)
+
+
+def start_fake_upstreams(host="127.0.0.1", port=0, latency=0.2, jitter=0.0, error_rate=0.0,
+                         bytes_per_char=200, chunk_interval=0.01, tts_latency=None, slow_rate=0.0,
+                         slow_latency=10.0, capacity=0):
+    """Start the fake server on a background thread and return it; ``tts_latency`` defaults to ``latency``.
+
+    Faults can be changed while it runs, through ``server.config`` or POST
+    /config: ``error_rate`` answers that share of calls with 503, ``slow_rate``
+    delays that share by ``slow_latency`` instead of the usual latency, and
+    ``capacity`` answers 429 to calls beyond that many in flight.
+    """
+    config = {
+        "latency": latency,
+        "tts_latency": tts_latency,
+        "jitter": jitter,
+        "error_rate": error_rate,
+        "slow_rate": slow_rate,
+        "slow_latency": slow_latency,
+        "capacity": capacity,
+        "bytes_per_char": bytes_per_char,
+        "chunk_interval": chunk_interval,
+    }
+    server = FakeUpstreamServer((host, port), config)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run fake OpenAI/ElevenLabs upstreams")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds added to every call")
+    parser.add_argument("--jitter", type=float, default=0.0, help="extra random latency, seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of calls answered with 503")
+    parser.add_argument("--tts-latency", type=float, default=None, help="text-to-speech latency if not --latency")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="fraction of calls delayed by --slow-latency")
+    parser.add_argument("--slow-latency", type=float, default=10.0, help="latency of slow calls, seconds")
+    parser.add_argument("--capacity", type=int, default=0, help="calls in flight before answering 429 (0: no limit)")
+    args = parser.parse_args()
+
+    server = start_fake_upstreams(args.host, args.port, args.latency, args.jitter, args.error_rate,
+                                  tts_latency=args.tts_latency, slow_rate=args.slow_rate,
+                                  slow_latency=args.slow_latency, capacity=args.capacity)
+    print(f"Fake upstreams listening on http://{args.host}:{server.server_address[1]}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
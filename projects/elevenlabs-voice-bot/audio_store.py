@@ -0,0 +1,194 @@
+"""
+Audio Store
+Pluggable blob storage for generated audio plus a persistent metadata index
+"""
+
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from typing import Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+READ_CHUNK_SIZE = 64 * 1024
+
+
+class LocalBlobStore:
+    """Audio blobs on a local or shared volume, sharded two levels deep by key"""
+
+    name = "local"
+
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], key[2:4], key)
+
+    def put(self, key: str, data: bytes, content_type: str = "audio/mpeg"):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            # A full disk or a cancelled write must not leave partial files behind
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+
+    def read(self, key: str, start: int = 0, end: Optional[int] = None) -> Iterator[bytes]:
+        """Yield the inclusive byte range [start, end] in chunks"""
+        with open(self._path(key), 'rb') as f:
+            f.seek(start)
+            remaining = None if end is None else end - start + 1
+            while remaining is None or remaining > 0:
+                chunk = f.read(READ_CHUNK_SIZE if remaining is None else min(READ_CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                if remaining is not None:
+                    remaining -= len(chunk)
+                yield chunk
+
+    def delete(self, key: str):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+
+class S3BlobStore:
+    """Audio blobs in an S3-compatible bucket (AWS S3, MinIO, ...)"""
+
+    name = "s3"
+
+    def __init__(self, bucket: str, endpoint_url: Optional[str] = None, prefix: str = "voice/"):
+        import boto3
+
+        self.bucket = bucket
+        self.prefix = prefix
+        self._s3 = boto3.client(
+            's3',
+            endpoint_url=endpoint_url or None,
+            region_name=os.getenv('AWS_REGION', 'us-east-1'),
+        )
+
+    def put(self, key: str, data: bytes, content_type: str = "audio/mpeg"):
+        self._s3.put_object(Bucket=self.bucket, Key=self.prefix + key, Body=data, ContentType=content_type)
+
+    def read(self, key: str, start: int = 0, end: Optional[int] = None) -> Iterator[bytes]:
+        byte_range = f"bytes={start}-{'' if end is None else end}"
+        response = self._s3.get_object(Bucket=self.bucket, Key=self.prefix + key, Range=byte_range)
+        body = response['Body']
+        try:
+            for chunk in body.iter_chunks(READ_CHUNK_SIZE):
+                yield chunk
+        finally:
+            body.close()
+
+    def delete(self, key: str):
+        self._s3.delete_object(Bucket=self.bucket, Key=self.prefix + key)
+
+
+def create_blob_store():
+    """Build the backend selected by AUDIO_STORE (local or s3)"""
+    backend = os.getenv('AUDIO_STORE', 'local').lower()
+    if backend == 's3':
+        return S3BlobStore(
+            bucket=os.environ['AUDIO_S3_BUCKET'],
+            endpoint_url=os.getenv('AUDIO_S3_ENDPOINT_URL'),
+        )
+    return LocalBlobStore(os.getenv('AUDIO_STORE_DIR', '/tmp/voice_audio'))
+
+
+class AudioMetadata:
+    """sqlite index of stored audio, shared by every worker that mounts the same file"""
+
+    COLUMNS = ("audio_id", "size", "content_type", "text", "voice_id",
+               "language", "speed", "emotion", "created_at")
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or os.getenv('AUDIO_METADATA_DB', '/tmp/voice_audio.sqlite3')
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS audio ("
+            "audio_id TEXT PRIMARY KEY, size INTEGER NOT NULL, content_type TEXT NOT NULL, "
+            "text TEXT, voice_id TEXT, language TEXT, speed REAL, emotion TEXT, "
+            "created_at REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_audio_created_at ON audio(created_at)")
+        conn.commit()
+
+    def _conn(self) -> sqlite3.Connection:
+        """One connection per thread; sqlite connections are not shareable across threads"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            self._local.conn = conn
+        return conn
+
+    def add(self, audio_id: str, size: int, record: dict, content_type: str = "audio/mpeg"):
+        conn = self._conn()
+        conn.execute(
+            f"INSERT OR REPLACE INTO audio ({', '.join(self.COLUMNS)}) VALUES ({', '.join('?' * len(self.COLUMNS))})",
+            (audio_id, size, content_type, record.get("text"), record.get("voice_id"),
+             record.get("language"), record.get("speed"), record.get("emotion"),
+             record["timestamp"].timestamp())
+        )
+        conn.commit()
+
+    def get(self, audio_id: str) -> Optional[dict]:
+        row = self._conn().execute(
+            f"SELECT {', '.join(self.COLUMNS)} FROM audio WHERE audio_id = ?", (audio_id,)
+        ).fetchone()
+        return dict(zip(self.COLUMNS, row)) if row else None
+
+    def expired(self, max_age_seconds: float, limit: int = 500) -> List[str]:
+        cutoff = time.time() - max_age_seconds
+        rows = self._conn().execute(
+            "SELECT audio_id FROM audio WHERE created_at < ? ORDER BY created_at LIMIT ?", (cutoff, limit)
+        ).fetchall()
+        return [row[0] for row in rows]
+
+    def delete(self, audio_ids: List[str]):
+        conn = self._conn()
+        conn.executemany("DELETE FROM audio WHERE audio_id = ?", [(audio_id,) for audio_id in audio_ids])
+        conn.commit()
+
+
+def compact(store, metadata: AudioMetadata, max_age_seconds: float, batch_size: int = 500) -> int:
+    """Delete expired blobs and their metadata in batches; returns the number removed
+
+    Metadata is only dropped for blobs that were actually deleted, so a blob whose
+    delete failed keeps its row and is retried by the next compaction.
+    """
+    removed = 0
+    failed = set()
+    while True:
+        # Failed ids stay expired, so look past them instead of fetching them again
+        audio_ids = [audio_id for audio_id in metadata.expired(max_age_seconds, batch_size + len(failed))
+                     if audio_id not in failed]
+        if not audio_ids:
+            return removed
+        deleted = []
+        for audio_id in audio_ids[:batch_size]:
+            try:
+                store.delete(audio_id)
+            except Exception as e:
+                logger.error(f"Error deleting audio {audio_id}: {e}")
+                failed.add(audio_id)
+            else:
+                deleted.append(audio_id)
+        metadata.delete(deleted)
+        removed += len(deleted)
+        if len(audio_ids) < batch_size:
+            return removed
@@ -0,0 +1,124 @@
+"""
+Voice History Store
+Bounded, time-ordered generation history with incrementally maintained stats
+"""
+
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Optional
+
+HOUR = 3600
+WINDOW_HOURS = 24
+
+
+class VoiceHistory:
+    """Generation records indexed by audio id and ordered by creation time.
+
+    Records arrive in time order, so the insertion order of the OrderedDict
+    doubles as the time index: expiry and cap eviction only ever look at the
+    oldest end. Language/voice distributions are counters updated on insert
+    and removal, and ``last_24h`` is read from a ring of hourly buckets, so
+    every stat is O(1) no matter how many records are held.
+    """
+
+    def __init__(
+        self,
+        max_entries: Optional[int] = None,
+        max_age: timedelta = timedelta(days=1),
+        on_evict: Optional[Callable[[dict], None]] = None,
+    ):
+        self.max_entries = max_entries or int(os.getenv('VOICE_HISTORY_MAX_ENTRIES', '100000'))
+        self.max_age = max_age
+        self.on_evict = on_evict
+        self._records: "OrderedDict[str, dict]" = OrderedDict()
+        self.language_counts: Dict[str, int] = {}
+        self.voice_counts: Dict[str, int] = {}
+        self._hour_buckets = [0] * WINDOW_HOURS
+        self._bucket_hours = [-1] * WINDOW_HOURS
+        self.total_added = 0
+        self.total_evicted = 0
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def __contains__(self, audio_id: str) -> bool:
+        return audio_id in self._records
+
+    def __getitem__(self, audio_id: str) -> dict:
+        return self._records[audio_id]
+
+    def get(self, audio_id: str) -> Optional[dict]:
+        return self._records.get(audio_id)
+
+    @staticmethod
+    def _bump(counts: Dict[str, int], key: str, delta: int):
+        value = counts.get(key, 0) + delta
+        if value > 0:
+            counts[key] = value
+        else:
+            counts.pop(key, None)
+
+    def add(self, audio_id: str, record: dict):
+        """Insert a record, then expire or evict from the oldest end as needed"""
+        if audio_id in self._records:
+            self._remove(audio_id)
+        self._records[audio_id] = record
+        self._bump(self.language_counts, record["language"], 1)
+        self._bump(self.voice_counts, record["voice_id"], 1)
+        self._count_hour(record["timestamp"].timestamp())
+        self.total_added += 1
+
+        self.expire()
+        while len(self._records) > self.max_entries:
+            self._evict_oldest()
+
+    def expire(self, now: Optional[datetime] = None) -> int:
+        """Drop records older than max_age; O(1) when nothing is due"""
+        cutoff = (now or datetime.now()) - self.max_age
+        expired = 0
+        while self._records:
+            oldest = next(iter(self._records.values()))
+            if oldest["timestamp"] >= cutoff:
+                break
+            self._evict_oldest()
+            expired += 1
+        return expired
+
+    def _evict_oldest(self):
+        audio_id = next(iter(self._records))
+        record = self._remove(audio_id)
+        self.total_evicted += 1
+        if self.on_evict is not None:
+            self.on_evict(record)
+
+    def _remove(self, audio_id: str) -> dict:
+        record = self._records.pop(audio_id)
+        self._bump(self.language_counts, record["language"], -1)
+        self._bump(self.voice_counts, record["voice_id"], -1)
+        return record
+
+    def _count_hour(self, timestamp: float):
+        hour = int(timestamp // HOUR)
+        slot = hour % WINDOW_HOURS
+        if self._bucket_hours[slot] != hour:
+            self._bucket_hours[slot] = hour
+            self._hour_buckets[slot] = 0
+        self._hour_buckets[slot] += 1
+
+    def last_24h(self, now: Optional[float] = None) -> int:
+        """Generations in the current and previous 23 hourly buckets"""
+        current_hour = int((now or time.time()) // HOUR)
+        return sum(
+            count for hour, count in zip(self._bucket_hours, self._hour_buckets)
+            if current_hour - WINDOW_HOURS < hour <= current_hour
+        )
+
+    def stats(self) -> dict:
+        return {
+            "total_generations": len(self._records),
+            "language_distribution": dict(self.language_counts),
+            "voice_distribution": dict(self.voice_counts),
+            "last_24h": self.last_24h(),
+        }
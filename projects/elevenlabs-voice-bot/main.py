@@ -4,21 +4,33 @@ ElevenLabs Voice Bot
 Advanced voice-enabled bot for customer engagement
 """
 
-from fastapi import FastAPI, HTTPException, BackgroundTasks, File, UploadFile
+from fastapi import FastAPI, HTTPException, File, UploadFile, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
-import elevenlabs
-import openai
+from starlette.concurrency import iterate_in_threadpool
 import os
 from dotenv import load_dotenv
 import json
 import logging
-from datetime import datetime, timedelta
+from datetime import datetime
+from collections import deque
+from typing import AsyncIterator, Iterator, Optional, Tuple
 import asyncio
 import tempfile
+import time
 import uuid
 
+from audio_cache import AudioCache
+from audio_store import AudioMetadata, compact, create_blob_store
+from history_store import VoiceHistory
+from llm_client import LLMClient
+from metrics import instrument_fastapi, stage
+from pipeline import run_pipeline, split_sentences
+from resilience import UpstreamUnavailable, deadline, get_upstream, is_timeout, is_transient, upstream_stats
+from translation_cache import TranslationCache
+from voice_catalog import VoiceCatalog
+
 # Load environment variables
 load_dotenv()
 
@@ -40,10 +52,78 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+instrument_fastapi(app)
 
 # Configure APIs
-elevenlabs.set_api_key(os.getenv('ELEVENLABS_API_KEY'))
-openai.api_key = os.getenv('OPENAI_API_KEY')
+llm = LLMClient()
+
+TTS_MODEL = "eleven_monolingual_v1"
+TRANSLATION_MODEL = "gpt-3.5-turbo"
+# Bump whenever the translation prompt changes so stale cache entries are ignored
+TRANSLATION_PROMPT_VERSION = "v1"
+STREAM_CHUNK_SIZE = 4096
+PIPELINE_CONCURRENCY = int(os.getenv('VOICE_PIPELINE_CONCURRENCY', '4'))
+AUDIO_MAX_AGE = int(os.getenv('AUDIO_MAX_AGE', str(24 * 3600)))
+AUDIO_COMPACTION_INTERVAL = int(os.getenv('AUDIO_COMPACTION_INTERVAL', '300'))
+# Upper bound on upstream time per voice request, shared by translation and synthesis
+REQUEST_DEADLINE = float(os.getenv('VOICE_REQUEST_DEADLINE', '60'))
+ELEVENLABS_API_URL = os.getenv('ELEVEN_BASE_URL', 'https://api.elevenlabs.io/v1')
+# Served until the ElevenLabs voice list has been loaded, and if loading it fails
+DEFAULT_VOICES = {
+    "21m00Tcm4TlvDq8ikWAM": "Rachel",
+    "AZnzlk1XvdvUeBnXmlld": "Domi",
+    "EXAVITQu4vr4xnSDxMaL": "Bella"
+}
+
+tts_upstream = get_upstream('elevenlabs')
+_tts_session = None
+
+class TTSError(Exception):
+    """ElevenLabs answered with an error status"""
+
+    def __init__(self, status_code: int, message: str):
+        super().__init__(f"ElevenLabs returned {status_code}: {message}")
+        self.status_code = status_code
+
+def tts_session():
+    """Pooled HTTP session for ElevenLabs, created on first use rather than at start-up.
+
+    The API is called directly rather than through the elevenlabs SDK, which
+    opens a new connection per call and has no timeout, so a hung call would
+    hold its worker thread indefinitely.
+    """
+    global _tts_session
+    if _tts_session is None:
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        session = requests.Session()
+        session.headers["xi-api-key"] = os.getenv('ELEVENLABS_API_KEY', '')
+        pool_size = int(tts_upstream.limiter.max_limit) * 2
+        session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=pool_size))
+        session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=pool_size))
+        _tts_session = session
+    return _tts_session
+
+def request_tts(text: str, voice_id: str, timeout: float, stream: bool = False):
+    """POST one text-to-speech request; ``timeout`` bounds connecting and each read"""
+    url = f"{ELEVENLABS_API_URL}/text-to-speech/{voice_id}" + ("/stream" if stream else "")
+    response = tts_session().post(url, json={"text": text, "model_id": TTS_MODEL}, timeout=timeout, stream=stream)
+    if response.status_code != 200:
+        message = response.text[:200]
+        response.close()
+        raise TTSError(response.status_code, message)
+    return response
+
+def upstream_http_error(exc: Exception) -> HTTPException:
+    """504 when time ran out, 503 with Retry-After while an upstream is down or saturated, otherwise 500"""
+    if is_timeout(exc):
+        return HTTPException(status_code=504, detail="Upstream timed out")
+    if isinstance(exc, UpstreamUnavailable) or is_transient(exc):
+        retry_after = max(1, round(getattr(exc, 'retry_after', None) or 1))
+        return HTTPException(status_code=503, detail="Voice service temporarily unavailable",
+                             headers={"Retry-After": str(retry_after)})
+    return HTTPException(status_code=500, detail="Voice generation failed")
 
 class VoiceRequest(BaseModel):
     text: str
@@ -51,6 +131,7 @@ class VoiceRequest(BaseModel):
     language: str = "en"
     speed: float = 1.0
     emotion: str = "neutral"
+    pipeline: bool = False  # Translate and synthesize sentence by sentence
 
 class VoiceResponse(BaseModel):
     audio_url: str
@@ -59,10 +140,47 @@ class VoiceResponse(BaseModel):
     voice_id: str
     timestamp: datetime
 
+class StreamMetrics:
+    """Rolling time-to-first-chunk samples for /stream-voice"""
+
+    def __init__(self, window: int = 1000):
+        self.total_streams = 0
+        self.first_chunk_ms = deque(maxlen=window)
+        self.upstream_first_chunk_ms = deque(maxlen=window)
+
+    def record(self, first_chunk_ms: float, upstream_first_chunk_ms: float):
+        self.total_streams += 1
+        self.first_chunk_ms.append(first_chunk_ms)
+        self.upstream_first_chunk_ms.append(upstream_first_chunk_ms)
+
+    @staticmethod
+    def _summary(samples) -> dict:
+        if not samples:
+            return {"avg": 0.0, "p50": 0.0, "p95": 0.0}
+        ordered = sorted(samples)
+        return {
+            "avg": round(sum(ordered) / len(ordered), 1),
+            "p50": round(ordered[len(ordered) // 2], 1),
+            "p95": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 1)
+        }
+
+    def stats(self) -> dict:
+        return {
+            "total_streams": self.total_streams,
+            "time_to_first_chunk_ms": self._summary(self.first_chunk_ms),
+            "upstream_time_to_first_chunk_ms": self._summary(self.upstream_first_chunk_ms)
+        }
+
 class VoiceBot:
     def __init__(self):
-        self.voice_history = {}
-        self.available_voices = self.load_voices()
+        self.voice_history = VoiceHistory()
+        self.audio_store = create_blob_store()
+        self.audio_metadata = AudioMetadata()
+        self.audio_cache = AudioCache()
+        self.translation_cache = TranslationCache()
+        self.stream_metrics = StreamMetrics()
+        # Loaded by warm_up() after start-up; a network call here would delay the first health check
+        self.voice_catalog = VoiceCatalog(self.load_voices, DEFAULT_VOICES)
         self.language_support = {
             "en": "English",
             "es": "Spanish", 
@@ -76,49 +194,128 @@ class VoiceBot:
         }
     
     def load_voices(self):
-        """Load available voices from ElevenLabs"""
-        try:
-            voices = elevenlabs.voices()
-            return {voice.voice_id: voice.name for voice in voices}
-        except Exception as e:
-            logger.error(f"Error loading voices: {e}")
-            return {
-                "21m00Tcm4TlvDq8ikWAM": "Rachel",
-                "AZnzlk1XvdvUeBnXmlld": "Domi",
-                "EXAVITQu4vr4xnSDxMaL": "Bella"
-            }
+        """Load available voices from ElevenLabs; the catalog keeps the previous list if this fails"""
+        def fetch(timeout: float) -> dict:
+            response = tts_session().get(f"{ELEVENLABS_API_URL}/voices", timeout=timeout)
+            if response.status_code != 200:
+                raise TTSError(response.status_code, response.text[:200])
+            return response.json()
+        
+        # The catalog times the refresh itself, so the call adds no stage of its own
+        voices = tts_upstream.call(fetch)["voices"]
+        return {voice["voice_id"]: voice["name"] for voice in voices}
+    
+    def warm_up(self):
+        """Blocking start-up work, run in a thread once the server is accepting connections"""
+        # refresh() keeps the defaults on failure; raise so the service is not reported ready without the catalog
+        if not self.voice_catalog.refresh() and not self.voice_catalog.loaded:
+            raise RuntimeError("Voice catalog did not load")
+    
+    def check_voice(self, voice_id: str):
+        """Reject a voice_id missing from the catalog before any upstream call is made"""
+        if not self.voice_catalog.is_valid(voice_id):
+            raise HTTPException(status_code=422, detail=f"Unknown voice_id: {voice_id}")
     
     def generate_voice(self, text: str, voice_id: str, speed: float = 1.0) -> bytes:
-        """Generate voice using ElevenLabs"""
+        """Generate voice using ElevenLabs, serving repeated prompts from cache"""
+        cache_key = self.audio_cache.make_key(text, voice_id, TTS_MODEL, speed)
+        with stage('audio_cache_read'):
+            cached = self.audio_cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
         try:
-            audio = elevenlabs.generate(
-                text=text,
-                voice=voice_id,
-                model="eleven_monolingual_v1"
-            )
-            return audio
+            audio = tts_upstream.call(lambda timeout: request_tts(text, voice_id, timeout).content, stage_name='tts')
         except Exception as e:
             logger.error(f"Error generating voice: {e}")
-            raise HTTPException(status_code=500, detail="Voice generation failed")
+            raise
+        
+        with stage('audio_cache_write'):
+            self.audio_cache.put(cache_key, audio)
+        return audio
+    
+    def stream_voice(self, text: str, voice_id: str, speed: float = 1.0) -> Iterator[bytes]:
+        """Yield audio chunks as ElevenLabs produces them, teeing them into the cache"""
+        cache_key = self.audio_cache.make_key(text, voice_id, TTS_MODEL, speed)
+        cached = self.audio_cache.get(cache_key)
+        if cached is not None:
+            for start in range(0, len(cached), STREAM_CHUNK_SIZE):
+                yield cached[start:start + STREAM_CHUNK_SIZE]
+            return
+        
+        # Retries and hedging only cover opening the stream; once audio flows it cannot be replayed
+        response = tts_upstream.call(lambda timeout: request_tts(text, voice_id, timeout, stream=True),
+                                     stage_name='tts_stream_open')
+        chunks = []
+        abandoned = False
+        # Covers the whole stream, including time the client takes to read it
+        with response, stage('tts_stream', upstream='elevenlabs'):
+            for chunk in response.iter_content(STREAM_CHUNK_SIZE):
+                chunks.append(chunk)
+                try:
+                    yield chunk
+                except GeneratorExit:
+                    # The client went away: close the upstream response without counting an upstream error
+                    abandoned = True
+                    break
+        
+        # Abandoned streams are never cached
+        if abandoned:
+            return
+        with stage('audio_cache_write'):
+            self.audio_cache.put(cache_key, b"".join(chunks))
     
-    def process_text(self, text: str, language: str) -> str:
+    async def synthesize_pipelined(self, text: str, language: str, voice_id: str,
+                                   speed: float = 1.0) -> AsyncIterator[Tuple[str, bytes]]:
+        """Yield (translated sentence, audio) pairs in order, overlapping translation and synthesis"""
+        async def synthesize(sentence: str) -> bytes:
+            return await asyncio.to_thread(self.generate_voice, sentence, voice_id, speed)
+        
+        async for segment in run_pipeline(
+            split_sentences(text),
+            lambda sentence: self.process_text(sentence, language),
+            synthesize,
+            max_parallel=PIPELINE_CONCURRENCY
+        ):
+            yield segment
+    
+    async def save_audio(self, audio_id: str, audio_data: bytes, record: dict):
+        """Persist audio and its metadata so any worker can serve /audio/{audio_id}"""
+        def persist():
+            self.audio_store.put(audio_id, audio_data)
+            self.audio_metadata.add(audio_id, len(audio_data), record)
+        
+        async with stage('audio_store_write'):
+            await asyncio.to_thread(persist)
+        self.voice_history.add(audio_id, record)
+    
+    async def process_text(self, text: str, language: str) -> str:
         """Process text for voice generation"""
         try:
             # Use OpenAI to improve text for voice
             if language != "en":
-                prompt = f"Translate this text to {self.language_support.get(language, 'English')} and make it natural for voice synthesis: {text}"
-                
-                response = openai.ChatCompletion.create(
-                    model="gpt-3.5-turbo",
-                    messages=[
-                        {"role": "system", "content": "You are a language expert. Translate and optimize text for natural voice synthesis."},
-                        {"role": "user", "content": prompt}
-                    ],
-                    max_tokens=200,
-                    temperature=0.7
+                cache_key = self.translation_cache.make_key(
+                    text, language, TRANSLATION_MODEL, TRANSLATION_PROMPT_VERSION
                 )
+                async with stage('translation_cache_read'):
+                    cached = await self.translation_cache.get(cache_key)
+                if cached is not None:
+                    return cached
+                
+                prompt = f"Translate this text to {self.language_support.get(language, 'English')} and make it natural for voice synthesis: {text}"
                 
-                return response.choices[0].message.content
+                async with stage('translation'):
+                    translated = await llm.chat(
+                        messages=[
+                            {"role": "system", "content": "You are a language expert. Translate and optimize text for natural voice synthesis."},
+                            {"role": "user", "content": prompt}
+                        ],
+                        model=TRANSLATION_MODEL,
+                        max_tokens=200,
+                        temperature=0.7
+                    )
+                await self.translation_cache.set(cache_key, translated)
+                return translated
             return text
             
         except Exception as e:
@@ -129,35 +326,23 @@ class VoiceBot:
 bot = VoiceBot()
 
 @app.post("/generate-voice", response_model=VoiceResponse)
-async def generate_voice(request: VoiceRequest, background_tasks: BackgroundTasks):
+async def generate_voice(request: VoiceRequest):
     """Generate voice from text"""
+    bot.check_voice(request.voice_id)
     try:
-        # Process text
-        processed_text = bot.process_text(request.text, request.language)
+        with deadline(REQUEST_DEADLINE):
+            audio_data, processed_text = await synthesize_request(request)
         
-        # Generate voice
-        audio_data = bot.generate_voice(processed_text, request.voice_id, request.speed)
-        
-        # Save audio file
+        # Save audio and record it in history
         audio_id = str(uuid.uuid4())
-        audio_path = f"/tmp/voice_{audio_id}.mp3"
-        
-        with open(audio_path, "wb") as f:
-            f.write(audio_data)
-        
-        # Store in history
-        bot.voice_history[audio_id] = {
+        await bot.save_audio(audio_id, audio_data, {
             "text": processed_text,
             "voice_id": request.voice_id,
             "language": request.language,
             "speed": request.speed,
             "emotion": request.emotion,
-            "timestamp": datetime.now(),
-            "file_path": audio_path
-        }
-        
-        # Clean up old files in background
-        background_tasks.add_task(cleanup_old_files)
+            "timestamp": datetime.now()
+        })
         
         return VoiceResponse(
             audio_url=f"/audio/{audio_id}",
@@ -169,79 +354,230 @@ async def generate_voice(request: VoiceRequest, background_tasks: BackgroundTask
         
     except Exception as e:
         logger.error(f"Error generating voice: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
+        raise upstream_http_error(e)
 
-@app.get("/audio/{audio_id}")
-async def get_audio(audio_id: str):
-    """Get generated audio file"""
-    if audio_id not in bot.voice_history:
-        raise HTTPException(status_code=404, detail="Audio not found")
+async def synthesize_request(request: VoiceRequest) -> Tuple[bytes, str]:
+    """Audio and the text it was generated from, pipelined by sentence when the request asks for it"""
+    if request.pipeline:
+        # mp3 frames are self-contained, so per-sentence audio concatenates cleanly
+        segments = [segment async for segment in bot.synthesize_pipelined(
+            request.text, request.language, request.voice_id, request.speed
+        )]
+        return b"".join(audio for _, audio in segments), " ".join(text for text, _ in segments)
     
-    audio_info = bot.voice_history[audio_id]
-    return FileResponse(
-        audio_info["file_path"],
+    # Process text
+    processed_text = await bot.process_text(request.text, request.language)
+    
+    # Generate voice off the event loop; the ElevenLabs client is blocking
+    audio_data = await asyncio.to_thread(bot.generate_voice, processed_text, request.voice_id, request.speed)
+    return audio_data, processed_text
+
+@app.post("/stream-voice")
+async def stream_voice(request: VoiceRequest, save: bool = False):
+    """Stream synthesized audio to the client while it is being generated"""
+    started = time.perf_counter()
+    bot.check_voice(request.voice_id)
+    record = {
+        "text": request.text,
+        "voice_id": request.voice_id,
+        "language": request.language,
+        "speed": request.speed,
+        "emotion": request.emotion
+    }
+    
+    try:
+        # The deadline covers getting the first chunk; the rest streams at the client's pace
+        with deadline(REQUEST_DEADLINE):
+            if request.pipeline:
+                synthesis_started = started
+                chunks = pipelined_chunks(request, record)
+            else:
+                record["text"] = await bot.process_text(request.text, request.language)
+                synthesis_started = time.perf_counter()
+                chunks = iterate_in_threadpool(bot.stream_voice(record["text"], request.voice_id, request.speed))
+            # Pull the first chunk before answering so upstream failures still map to an error status
+            first_chunk = await chunks.__anext__()
+    except StopAsyncIteration:
+        first_chunk = b""
+    except Exception as e:
+        logger.error(f"Error streaming voice: {e}")
+        raise upstream_http_error(e)
+    
+    first_chunk_at = time.perf_counter()
+    bot.stream_metrics.record(
+        first_chunk_ms=(first_chunk_at - started) * 1000,
+        upstream_first_chunk_ms=(first_chunk_at - synthesis_started) * 1000
+    )
+    
+    headers = {"X-Time-To-First-Chunk-Ms": f"{(first_chunk_at - started) * 1000:.1f}"}
+    audio_id = None
+    if save:
+        audio_id = str(uuid.uuid4())
+        headers["X-Audio-Id"] = audio_id
+    
+    return StreamingResponse(
+        relay_audio(first_chunk, chunks, audio_id, record),
         media_type="audio/mpeg",
-        filename=f"voice_{audio_id}.mp3"
+        headers=headers
     )
 
+async def pipelined_chunks(request: VoiceRequest, record: dict) -> AsyncIterator[bytes]:
+    """Stream sentence audio in order, filling in the translated text once all sentences are done"""
+    translated = []
+    async for text, audio in bot.synthesize_pipelined(
+        request.text, request.language, request.voice_id, request.speed
+    ):
+        translated.append(text)
+        yield audio
+    record["text"] = " ".join(translated)
+
+async def relay_audio(first_chunk: bytes, chunks: AsyncIterator[bytes],
+                      audio_id: Optional[str] = None, record: Optional[dict] = None) -> AsyncIterator[bytes]:
+    """Pass chunks through to the client, optionally saving them for /audio/{audio_id}"""
+    if audio_id is None:
+        yield first_chunk
+        async for chunk in chunks:
+            yield chunk
+        return
+    
+    saved = [first_chunk]
+    yield first_chunk
+    async for chunk in chunks:
+        saved.append(chunk)
+        yield chunk
+    
+    # Save only once the stream is complete so /audio never serves partial audio
+    await bot.save_audio(audio_id, b"".join(saved), dict(record, timestamp=datetime.now()))
+
+def parse_range(header: str, size: int) -> Tuple[int, int]:
+    """Parse a single 'bytes=start-end' Range header into an inclusive byte range"""
+    try:
+        unit, _, spec = header.partition("=")
+        start_text, _, end_text = spec.strip().partition("-")
+        if unit.strip() != "bytes" or "," in spec:
+            raise ValueError(header)
+        if start_text:
+            start = int(start_text)
+            end = min(int(end_text), size - 1) if end_text else size - 1
+        else:
+            # Suffix range: the last N bytes
+            start = max(size - int(end_text), 0)
+            end = size - 1
+    except ValueError:
+        raise HTTPException(status_code=416, detail="Invalid range",
+                            headers={"Content-Range": f"bytes */{size}"})
+    if start > end or start >= size:
+        raise HTTPException(status_code=416, detail="Range not satisfiable",
+                            headers={"Content-Range": f"bytes */{size}"})
+    return start, end
+
+@app.get("/audio/{audio_id}")
+async def get_audio(audio_id: str, request: Request):
+    """Get generated audio file, honouring HTTP Range requests"""
+    audio_info = await asyncio.to_thread(bot.audio_metadata.get, audio_id)
+    if audio_info is None:
+        raise HTTPException(status_code=404, detail="Audio not found")
+    
+    size = audio_info["size"]
+    headers = {
+        "Accept-Ranges": "bytes",
+        "Content-Disposition": f'attachment; filename="voice_{audio_id}.mp3"'
+    }
+    range_header = request.headers.get("range")
+    if not range_header:
+        headers["Content-Length"] = str(size)
+        return StreamingResponse(bot.audio_store.read(audio_id), media_type=audio_info["content_type"],
+                                 headers=headers)
+    
+    start, end = parse_range(range_header, size)
+    headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    headers["Content-Length"] = str(end - start + 1)
+    return StreamingResponse(bot.audio_store.read(audio_id, start, end), status_code=206,
+                             media_type=audio_info["content_type"], headers=headers)
+
 @app.get("/voices")
-async def get_available_voices():
-    """Get available voices"""
-    return {
-        "voices": bot.available_voices,
+async def get_available_voices(request: Request):
+    """Get available voices; 304 when the client's If-None-Match still matches the catalog"""
+    voices, etag = bot.voice_catalog.current()
+    etag = f'"{etag}"'
+    headers = {"ETag": etag, "Cache-Control": f"max-age={bot.voice_catalog.fresh_for()}"}
+    if_none_match = request.headers.get("if-none-match", "")
+    if if_none_match.strip() == "*" or etag in (tag.strip().removeprefix("W/") for tag in if_none_match.split(",")):
+        return Response(status_code=304, headers=headers)
+    return JSONResponse({
+        "voices": voices,
         "languages": bot.language_support,
-        "total_voices": len(bot.available_voices)
-    }
+        "total_voices": len(voices)
+    }, headers=headers)
 
 @app.get("/voice-stats")
 async def get_voice_stats():
     """Get voice generation statistics"""
-    total_generations = len(bot.voice_history)
-    language_counts = {}
-    voice_counts = {}
-    
-    for generation in bot.voice_history.values():
-        lang = generation["language"]
-        voice = generation["voice_id"]
-        language_counts[lang] = language_counts.get(lang, 0) + 1
-        voice_counts[voice] = voice_counts.get(voice, 0) + 1
-    
     return {
-        "total_generations": total_generations,
-        "language_distribution": language_counts,
-        "voice_distribution": voice_counts,
-        "last_24h": len([g for g in bot.voice_history.values() 
-                         if g["timestamp"] > datetime.now() - timedelta(days=1)])
+        **bot.voice_history.stats(),
+        "audio_cache": bot.audio_cache.stats(),
+        "streaming": bot.stream_metrics.stats(),
+        "translation_cache": bot.translation_cache.stats(),
+        "voice_catalog": bot.voice_catalog.stats(),
+        "upstreams": upstream_stats()
     }
 
-async def cleanup_old_files():
-    """Clean up old audio files"""
-    try:
-        current_time = datetime.now()
-        to_delete = []
-        
-        for audio_id, info in bot.voice_history.items():
-            if (current_time - info["timestamp"]).days > 1:  # Keep for 1 day
-                to_delete.append(audio_id)
-        
-        for audio_id in to_delete:
-            try:
-                os.remove(bot.voice_history[audio_id]["file_path"])
-                del bot.voice_history[audio_id]
-            except:
-                pass
-                
-    except Exception as e:
-        logger.error(f"Error cleaning up files: {e}")
+async def compact_audio_store():
+    """Periodically delete audio older than AUDIO_MAX_AGE from the blob store"""
+    while True:
+        try:
+            removed = await asyncio.to_thread(compact, bot.audio_store, bot.audio_metadata, AUDIO_MAX_AGE)
+            if removed:
+                logger.info(f"Compacted {removed} expired audio files")
+        except Exception as e:
+            logger.error(f"Error compacting audio store: {e}")
+        await asyncio.sleep(AUDIO_COMPACTION_INTERVAL)
+
+async def warm_up():
+    """Load the voice list and import the SDKs in the background, retrying until they load, then report ready"""
+    while True:
+        try:
+            await asyncio.gather(asyncio.to_thread(bot.warm_up), asyncio.to_thread(llm.warm_up))
+            break
+        except Exception as e:
+            logger.error(f"Error warming up, retrying in {bot.voice_catalog.retry_interval:.0f}s: {e}")
+        await asyncio.sleep(bot.voice_catalog.retry_interval)
+    app.state.ready = True
+
+@app.on_event("startup")
+async def start_background_jobs():
+    """Start warm-up and periodic maintenance jobs"""
+    app.state.ready = False
+    app.state.warm_up_task = asyncio.create_task(warm_up())
+    app.state.compaction_task = asyncio.create_task(compact_audio_store())
+
+@app.on_event("shutdown")
+async def close_clients():
+    """Stop background jobs and release pooled OpenAI and cache connections"""
+    app.state.warm_up_task.cancel()
+    app.state.compaction_task.cancel()
+    await llm.aclose()
+    await bot.translation_cache.close()
 
 @app.get("/health")
 async def health_check():
-    """Health check endpoint"""
+    """Liveness probe: answers as soon as the server is up, without touching upstreams"""
     return {
         "status": "healthy",
         "timestamp": datetime.now().isoformat(),
         "service": "ElevenLabs Voice Bot",
-        "voices_available": len(bot.available_voices)
+        "voices_available": len(bot.voice_catalog)
+    }
+
+@app.get("/ready")
+async def readiness_check(response: Response):
+    """Readiness probe: 503 until the start-up warm-up has finished and the voice catalog has loaded"""
+    ready = app.state.ready and bot.voice_catalog.loaded
+    if not ready:
+        response.status_code = 503
+    return {
+        "status": "ready" if ready else "warming_up",
+        "voices_loaded": bot.voice_catalog.loaded
     }
 
 if __name__ == "__main__":
@@ -0,0 +1,67 @@
+"""
+Voice Pipeline
+Sentence-level pipelining of translation and speech synthesis
+"""
+
+import asyncio
+import re
+from typing import AsyncIterator, Awaitable, Callable, List, Tuple
+
+SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?;:。！？])\s+')
+MIN_SEGMENT_CHARS = 40
+MAX_SEGMENT_CHARS = 400
+
+
+def split_sentences(text: str, min_chars: int = MIN_SEGMENT_CHARS,
+                    max_chars: int = MAX_SEGMENT_CHARS) -> List[str]:
+    """Split text into sentence segments suitable for independent synthesis.
+
+    Very short sentences are merged into their neighbour so greetings like
+    "Hi." do not pay a full upstream round trip on their own, and overlong
+    ones are cut on whitespace so no single segment dominates the latency.
+    """
+    segments: List[str] = []
+    for sentence in SENTENCE_BOUNDARY.split(text.strip()):
+        sentence = sentence.strip()
+        if not sentence:
+            continue
+        while len(sentence) > max_chars:
+            cut = sentence.rfind(' ', 0, max_chars)
+            cut = cut if cut > 0 else max_chars
+            segments.append(sentence[:cut].strip())
+            sentence = sentence[cut:].strip()
+        if segments and len(segments[-1]) < min_chars:
+            segments[-1] = f"{segments[-1]} {sentence}"
+        else:
+            segments.append(sentence)
+    return segments
+
+
+async def run_pipeline(
+    segments: List[str],
+    translate: Callable[[str], Awaitable[str]],
+    synthesize: Callable[[str], Awaitable[bytes]],
+    max_parallel: int = 4,
+) -> AsyncIterator[Tuple[str, bytes]]:
+    """Translate and synthesize segments concurrently, yielding results in order.
+
+    Every segment starts translating immediately; each one moves on to
+    synthesis as soon as its own translation lands, with at most
+    ``max_parallel`` syntheses in flight. Results are yielded in input order,
+    so the first segment can be played while later ones are still running.
+    """
+    synthesis_slots = asyncio.Semaphore(max_parallel)
+
+    async def process(segment: str) -> Tuple[str, bytes]:
+        translated = await translate(segment)
+        async with synthesis_slots:
+            return translated, await synthesize(translated)
+
+    tasks = [asyncio.ensure_future(process(segment)) for segment in segments]
+    try:
+        for task in tasks:
+            yield await task
+    finally:
+        # Consumer went away or a stage failed: stop paying for the remaining segments
+        for task in tasks:
+            task.cancel()
@@ -0,0 +1,269 @@
+"""
+Translation Cache
+Two-tier memo cache for LLM translations: in-process LRU in front of Redis or sqlite
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:  # pragma: no cover - redis is optional for local runs
+    aioredis = None
+
+
+class SqliteTranslationStore:
+    """Durable fallback tier used when Redis is not configured or unreachable"""
+
+    name = "sqlite"
+
+    def __init__(self, path: str, max_entries: int):
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS translations ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+            "expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_translations_accessed ON translations(accessed_at)")
+        self._conn.commit()
+
+    def _get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM translations WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] < now:
+                self._conn.execute("DELETE FROM translations WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            self._conn.execute("UPDATE translations SET accessed_at = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            return row[0]
+
+    def _set(self, key: str, value: str, ttl: int):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO translations (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, value, now + ttl, now)
+            )
+            self._writes += 1
+            if self._writes % 100 == 0:
+                self._trim(now)
+            self._conn.commit()
+
+    def _trim(self, now: float):
+        """Drop expired rows, then the least recently used ones above the cap"""
+        self._conn.execute("DELETE FROM translations WHERE expires_at < ?", (now,))
+        self._conn.execute(
+            "DELETE FROM translations WHERE key IN ("
+            "SELECT key FROM translations ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,)
+        )
+
+    async def get(self, key: str) -> Optional[str]:
+        return await asyncio.to_thread(self._get, key)
+
+    async def set(self, key: str, value: str, ttl: int):
+        await asyncio.to_thread(self._set, key, value, ttl)
+
+    async def close(self):
+        self._conn.close()
+
+
+class RedisTranslationStore:
+    """Shared tier; eviction beyond the TTL relies on Redis' maxmemory-policy (allkeys-lru)"""
+
+    name = "redis"
+
+    def __init__(self, url: str, prefix: str = "voicebot:translation:"):
+        self.prefix = prefix
+        self._redis = aioredis.from_url(url, decode_responses=True, socket_timeout=0.5)
+
+    async def ping(self):
+        await self._redis.ping()
+
+    async def get(self, key: str) -> Optional[str]:
+        return await self._redis.get(self.prefix + key)
+
+    async def set(self, key: str, value: str, ttl: int):
+        await self._redis.set(self.prefix + key, value, ex=ttl)
+
+    async def close(self):
+        await self._redis.close()
+
+
+class TranslationCache:
+    """Memoizes translations keyed by (normalized text, language, model, prompt version).
+
+    Lookups hit a bounded in-process LRU first, then the shared backend. The
+    backend is Redis when REDIS_URL is set and reachable, otherwise a local
+    sqlite file, so cached translations survive restarts either way. A Redis
+    error moves the cache to sqlite, and Redis is tried again every
+    ``redis_retry_interval`` seconds until it answers.
+    """
+
+    def __init__(
+        self,
+        redis_url: Optional[str] = None,
+        sqlite_path: Optional[str] = None,
+        ttl: Optional[int] = None,
+        max_entries: Optional[int] = None,
+        redis_retry_interval: Optional[float] = None,
+    ):
+        self.redis_url = redis_url if redis_url is not None else os.getenv('REDIS_URL', '')
+        self.sqlite_path = sqlite_path or os.getenv('TRANSLATION_CACHE_DB', '/tmp/voice_translations.sqlite3')
+        self.ttl = ttl or int(os.getenv('TRANSLATION_CACHE_TTL', str(30 * 24 * 3600)))
+        self.max_entries = max_entries or int(os.getenv('TRANSLATION_CACHE_MAX_ENTRIES', '10000'))
+        self.redis_retry_interval = redis_retry_interval or float(os.getenv('TRANSLATION_CACHE_REDIS_RETRY_SECONDS', '30'))
+        self._memory: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._backend = None
+        self._sqlite = None
+        self._redis_retry_at = 0.0
+        self._backend_lock: Optional[asyncio.Lock] = None
+        self.memory_hits = 0
+        self.backend_hits = 0
+        self.misses = 0
+        self.backend_errors = 0
+        self.redis_fallbacks = 0
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """Collapse whitespace so trivially different prompts share an entry"""
+        return " ".join(text.split())
+
+    @classmethod
+    def make_key(cls, text: str, language: str, model: str, prompt_version: str) -> str:
+        payload = json.dumps([cls.normalize(text), language, model, prompt_version], ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _redis_due(self) -> bool:
+        return bool(self.redis_url) and aioredis is not None and time.monotonic() >= self._redis_retry_at
+
+    async def _sqlite_store(self) -> SqliteTranslationStore:
+        if self._sqlite is None:
+            self._sqlite = await asyncio.to_thread(SqliteTranslationStore, self.sqlite_path, self.max_entries)
+        return self._sqlite
+
+    async def _get_backend(self):
+        """Redis when configured and reachable, otherwise sqlite until the next Redis retry is due"""
+        backend = self._backend
+        if backend is not None and (backend.name == "redis" or not self._redis_due()):
+            return backend
+        if self._backend_lock is None:
+            self._backend_lock = asyncio.Lock()
+        async with self._backend_lock:
+            if self._backend is None or (self._backend.name != "redis" and self._redis_due()):
+                if self._redis_due():
+                    store = RedisTranslationStore(self.redis_url)
+                    try:
+                        await store.ping()
+                        if self._backend is not None:
+                            logger.info("Redis is back, translation cache leaves sqlite")
+                        self._backend = store
+                    except Exception as e:
+                        logger.warning(f"Redis unavailable for translation cache, using sqlite: {e}")
+                        self._redis_retry_at = time.monotonic() + self.redis_retry_interval
+                        await store.close()
+                if self._backend is None:
+                    self._backend = await self._sqlite_store()
+        return self._backend
+
+    async def _backend_failed(self, backend):
+        """After a Redis error, serve from sqlite until the next retry is due"""
+        if backend.name != "redis":
+            return
+        async with self._backend_lock:
+            if self._backend is not backend:
+                return
+            self._backend = await self._sqlite_store()
+            self._redis_retry_at = time.monotonic() + self.redis_retry_interval
+            self.redis_fallbacks += 1
+        try:
+            await backend.close()
+        except Exception:
+            pass
+
+    def _remember(self, key: str, value: str):
+        self._memory[key] = (time.monotonic() + self.ttl, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    async def get(self, key: str) -> Optional[str]:
+        entry = self._memory.get(key)
+        if entry is not None:
+            if entry[0] > time.monotonic():
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return entry[1]
+            del self._memory[key]
+
+        backend = None
+        try:
+            backend = await self._get_backend()
+            value = await backend.get(key)
+        except Exception as e:
+            logger.error(f"Error reading translation cache: {e}")
+            self.backend_errors += 1
+            value = None
+            if backend is not None:
+                await self._backend_failed(backend)
+
+        if value is None:
+            self.misses += 1
+            return None
+        self.backend_hits += 1
+        self._remember(key, value)
+        return value
+
+    async def set(self, key: str, value: str):
+        self._remember(key, value)
+        backend = None
+        try:
+            backend = await self._get_backend()
+            await backend.set(key, value, self.ttl)
+        except Exception as e:
+            logger.error(f"Error writing translation cache: {e}")
+            self.backend_errors += 1
+            if backend is not None:
+                await self._backend_failed(backend)
+
+    def stats(self) -> dict:
+        lookups = self.memory_hits + self.backend_hits + self.misses
+        return {
+            "backend": self._backend.name if self._backend is not None else None,
+            "memory_entries": len(self._memory),
+            "memory_hits": self.memory_hits,
+            "backend_hits": self.backend_hits,
+            "misses": self.misses,
+            "backend_errors": self.backend_errors,
+            "redis_fallbacks": self.redis_fallbacks,
+            "hit_rate": round((self.memory_hits + self.backend_hits) / lookups, 4) if lookups else 0.0,
+        }
+
+    async def close(self):
+        if self._backend is not None and self._backend is not self._sqlite:
+            await self._backend.close()
+        if self._sqlite is not None:
+            await self._sqlite.close()
+        self._backend = None
+        self._sqlite = None
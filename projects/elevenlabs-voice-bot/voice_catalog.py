@@ -0,0 +1,151 @@
+"""
+Voice Catalog
+ElevenLabs voice list with a TTL, stale-while-revalidate refresh and O(1) voice_id validation
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+from metrics import stage
+
+logger = logging.getLogger(__name__)
+
+
+class VoiceCatalog:
+    """The account's voices, refreshed in the background.
+
+    Reads never wait on ElevenLabs: they get the current snapshot. A snapshot
+    older than ``ttl`` is still served while a single background thread
+    fetches a new one. If that fetch fails, the stale snapshot is kept and the
+    fetch is retried after ``retry_interval``.
+
+    Each snapshot is an immutable ``(voices, ids, etag)`` tuple swapped in
+    whole, so ``is_valid`` is one frozenset lookup without a lock. Until the
+    first successful fetch only ``defaults`` are known. During that time every
+    ``voice_id`` is accepted, because the real catalog cannot be checked yet.
+    """
+
+    def __init__(
+        self,
+        fetch: Callable[[], Dict[str, str]],
+        defaults: Optional[Dict[str, str]] = None,
+        ttl: Optional[float] = None,
+        retry_interval: Optional[float] = None,
+        miss_refresh_interval: Optional[float] = None,
+    ):
+        self.fetch = fetch
+        self.ttl = ttl or float(os.getenv('VOICE_CATALOG_TTL', '3600'))
+        self.retry_interval = retry_interval or float(os.getenv('VOICE_CATALOG_RETRY_INTERVAL', '30'))
+        # An unknown voice_id may be a voice added since the last fetch; refresh early, at most this often
+        self.miss_refresh_interval = miss_refresh_interval or float(
+            os.getenv('VOICE_CATALOG_MISS_REFRESH_INTERVAL', '60')
+        )
+        self._snapshot = self._make_snapshot(dict(defaults or {}))
+        self.fetched_at: Optional[float] = None
+        self._next_refresh = 0.0
+        self._last_attempt = float('-inf')
+        self._refreshing = False
+        self._lock = threading.Lock()
+        self.refreshes = 0
+        self.failures = 0
+        self.rejected = 0
+
+    @staticmethod
+    def _make_snapshot(voices: Dict[str, str]) -> tuple:
+        body = json.dumps(sorted(voices.items()), ensure_ascii=False).encode('utf-8')
+        return voices, frozenset(voices), hashlib.sha256(body).hexdigest()[:16]
+
+    @property
+    def loaded(self) -> bool:
+        return self.fetched_at is not None
+
+    def __len__(self) -> int:
+        return len(self._snapshot[0])
+
+    def current(self) -> Tuple[Dict[str, str], str]:
+        """Voices and their ETag (which changes with any voice or name), refreshing in the background if stale"""
+        self.maybe_refresh()
+        voices, _, etag = self._snapshot
+        return voices, etag
+
+    def age(self) -> Optional[float]:
+        return None if self.fetched_at is None else time.time() - self.fetched_at
+
+    def fresh_for(self) -> int:
+        """Seconds until the snapshot goes stale, for Cache-Control"""
+        if self.fetched_at is None:
+            return 0
+        return max(0, int(self.fetched_at + self.ttl - time.time()))
+
+    def is_valid(self, voice_id: str) -> bool:
+        if self.fetched_at is None or voice_id in self._snapshot[1]:
+            return True
+        self.rejected += 1
+        self.maybe_refresh(early=True)
+        return False
+
+    def refresh(self) -> bool:
+        """Fetch the catalog now (blocking) unless a refresh is already running; False if it did not update"""
+        with self._lock:
+            if self._refreshing:
+                return False
+            self._refreshing = True
+            self._last_attempt = time.monotonic()
+        try:
+            return self._fetch()
+        finally:
+            self._refreshing = False
+
+    def maybe_refresh(self, early: bool = False):
+        """Start a background refresh if the snapshot is stale (or ``early`` allows it) and none is running"""
+        now = time.monotonic()
+        if now < self._next_refresh and not (early and now - self._last_attempt >= self.miss_refresh_interval):
+            return
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+            self._last_attempt = now
+            # Claimed now so concurrent readers do not queue more refreshes behind this one
+            self._next_refresh = now + self.retry_interval
+        threading.Thread(target=self._background_refresh, name='voice-catalog-refresh', daemon=True).start()
+
+    def _background_refresh(self):
+        try:
+            self._fetch()
+        finally:
+            self._refreshing = False
+
+    def _fetch(self) -> bool:
+        try:
+            with stage('voice_catalog_refresh', upstream='elevenlabs'):
+                voices = self.fetch()
+            if not voices:
+                raise ValueError("ElevenLabs returned no voices")
+        except Exception as e:
+            self.failures += 1
+            self._next_refresh = time.monotonic() + self.retry_interval
+            logger.error(f"Error refreshing voice catalog (serving {len(self._snapshot[0])} cached voices): {e}")
+            return False
+        self._snapshot = self._make_snapshot(dict(voices))
+        self.fetched_at = time.time()
+        self._next_refresh = time.monotonic() + self.ttl
+        self.refreshes += 1
+        return True
+
+    def stats(self) -> dict:
+        age = self.age()
+        return {
+            "voices": len(self._snapshot[0]),
+            "loaded": self.loaded,
+            "age_seconds": None if age is None else round(age, 1),
+            "ttl_seconds": self.ttl,
+            "refreshes": self.refreshes,
+            "refresh_failures": self.failures,
+            "rejected_voice_ids": self.rejected,
+        }
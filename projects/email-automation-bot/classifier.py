@@ -0,0 +1,215 @@
+"""
+Local Email Classifier
+scikit-learn categorization tier that answers confident cases before the LLM
+"""
+
+import asyncio
+import glob
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+from typing import TYPE_CHECKING, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    from sklearn.pipeline import Pipeline
+
+logger = logging.getLogger(__name__)
+
+
+class LocalCategorizer:
+    """TF-IDF + logistic regression model retrained in the background from labelled emails.
+
+    Labels come from the LLM (weak labels) and from callers that supply an
+    explicit category. Each retrain produces a new numbered model file; the
+    newest one is loaded on startup together with the examples it was
+    trained on, so learning carries across restarts.
+
+    scikit-learn and the saved model are loaded by ``warm_up()``, off the
+    start-up path; until then every email is escalated to the LLM.
+    """
+
+    def __init__(
+        self,
+        categories: List[str],
+        model_dir: Optional[str] = None,
+        threshold: Optional[float] = None,
+        min_examples: Optional[int] = None,
+        retrain_every: Optional[int] = None,
+        audit_rate: Optional[float] = None,
+        max_examples: int = 20000,
+        keep_versions: int = 3,
+    ):
+        self.categories = categories
+        self.model_dir = model_dir or os.getenv('CLASSIFIER_MODEL_DIR', '/tmp/email_classifier')
+        self.threshold = threshold or float(os.getenv('CLASSIFIER_CONFIDENCE', '0.85'))
+        self.min_examples = min_examples or int(os.getenv('CLASSIFIER_MIN_EXAMPLES', '100'))
+        self.retrain_every = retrain_every or int(os.getenv('CLASSIFIER_RETRAIN_EVERY', '200'))
+        self.audit_rate = audit_rate if audit_rate is not None else float(os.getenv('CLASSIFIER_AUDIT_RATE', '0.05'))
+        self.keep_versions = keep_versions
+        self.examples = deque(maxlen=max_examples)
+        self.model: Optional["Pipeline"] = None
+        self.version = 0
+        self.holdout_accuracy: Optional[float] = None
+        self.trained_at: Optional[float] = None
+        self._labels_since_train = 0
+        self._training = False
+        self._train_task = None
+        self._lock = threading.Lock()
+        self.local_hits = 0
+        self.escalations = 0
+        self.audits = 0
+        self.audit_agreements = 0
+        self.escalated_with_guess = 0
+        self.escalated_agreements = 0
+        self.loaded = False
+        os.makedirs(self.model_dir, exist_ok=True)
+
+    def warm_up(self):
+        """Import scikit-learn and load the newest saved model; blocking, so run it in a thread"""
+        import sklearn.linear_model  # noqa: F401
+        self._load_latest()
+        self.loaded = True
+
+    @staticmethod
+    def text_for(subject: str, content: str) -> str:
+        return f"{subject}\n{content[:500]}"
+
+    def _model_path(self, version: int) -> str:
+        return os.path.join(self.model_dir, f"categorizer_v{version:05d}.joblib")
+
+    def _load_latest(self):
+        paths = sorted(glob.glob(os.path.join(self.model_dir, "categorizer_v*.joblib")))
+        if not paths:
+            return
+        try:
+            import joblib
+            saved = joblib.load(paths[-1])
+            self.model = saved["model"]
+            self.version = saved["version"]
+            self.holdout_accuracy = saved.get("holdout_accuracy")
+            self.trained_at = saved.get("trained_at")
+            self.examples.extend(saved.get("examples", []))
+            logger.info(f"Loaded email classifier v{self.version} ({len(self.examples)} examples)")
+        except Exception as e:
+            logger.error(f"Error loading email classifier {paths[-1]}: {e}")
+
+    def predict(self, text: str) -> Optional[Tuple[str, float]]:
+        """Top category and its probability, or None before the first model exists"""
+        model = self.model
+        if model is None:
+            return None
+        probabilities = model.predict_proba([text])[0]
+        best = probabilities.argmax()
+        return str(model.classes_[best]), float(probabilities[best])
+
+    def is_confident(self, guess: Optional[Tuple[str, float]]) -> bool:
+        return guess is not None and guess[1] >= self.threshold and guess[0] in self.categories
+
+    def should_audit(self) -> bool:
+        """Sample confident answers for a shadow LLM check"""
+        return random.random() < self.audit_rate
+
+    def record_label(self, text: str, category: str, guess: Optional[Tuple[str, float]] = None):
+        """Add a labelled example and track how often the local guess agreed"""
+        if category not in self.categories:
+            return
+        with self._lock:
+            self.examples.append((text, category))
+            self._labels_since_train += 1
+            if guess is not None:
+                self.escalated_with_guess += 1
+                self.escalated_agreements += guess[0] == category
+
+    def record_audit(self, local_category: str, llm_category: str):
+        with self._lock:
+            self.audits += 1
+            self.audit_agreements += local_category == llm_category
+
+    def schedule_retrain(self):
+        """Retrain on a worker thread once enough new labels have arrived"""
+        with self._lock:
+            # Before warm_up() the saved examples and version are not loaded yet
+            due = (self.loaded and not self._training and len(self.examples) >= self.min_examples
+                   and (self.model is None or self._labels_since_train >= self.retrain_every))
+            if due:
+                self._training = True
+        if due:
+            self._train_task = asyncio.ensure_future(asyncio.to_thread(self._train))
+
+    def _train(self):
+        try:
+            with self._lock:
+                examples = list(self.examples)
+                self._labels_since_train = 0
+            labels = [category for _, category in examples]
+            if len(set(labels)) < 2:
+                return
+
+            started = time.perf_counter()
+            shuffled = random.Random(len(examples)).sample(examples, len(examples))
+            split = int(len(shuffled) * 0.8) if len(shuffled) >= 200 else len(shuffled)
+            model = self._build_model()
+            model.fit([text for text, _ in shuffled[:split]], [category for _, category in shuffled[:split]])
+            holdout = shuffled[split:]
+            accuracy = None
+            if holdout:
+                predictions = model.predict([text for text, _ in holdout])
+                accuracy = round(sum(p == c for p, (_, c) in zip(predictions, holdout)) / len(holdout), 4)
+                # Final model uses every example; the holdout score describes this configuration
+                model = self._build_model().fit([text for text, _ in examples], labels)
+
+            import joblib
+            version = self.version + 1
+            joblib.dump({
+                "model": model,
+                "version": version,
+                "holdout_accuracy": accuracy,
+                "trained_at": time.time(),
+                "examples": examples,
+            }, self._model_path(version))
+            self.model, self.version, self.holdout_accuracy, self.trained_at = model, version, accuracy, time.time()
+            self._prune_versions()
+            logger.info(f"Trained email classifier v{version} on {len(examples)} examples "
+                        f"in {time.perf_counter() - started:.2f}s (holdout accuracy {accuracy})")
+        except Exception as e:
+            logger.error(f"Error training email classifier: {e}")
+        finally:
+            self._training = False
+
+    @staticmethod
+    def _build_model() -> "Pipeline":
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        from sklearn.linear_model import LogisticRegression
+        from sklearn.pipeline import Pipeline
+
+        return Pipeline([
+            ("tfidf", TfidfVectorizer(ngram_range=(1, 2), sublinear_tf=True, max_features=50000)),
+            ("clf", LogisticRegression(max_iter=1000)),
+        ])
+
+    def _prune_versions(self):
+        paths = sorted(glob.glob(os.path.join(self.model_dir, "categorizer_v*.joblib")))
+        for path in paths[:-self.keep_versions]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def stats(self) -> dict:
+        handled = self.local_hits + self.escalations
+        return {
+            "model_version": self.version,
+            "examples": len(self.examples),
+            "trained_at": self.trained_at,
+            "holdout_accuracy": self.holdout_accuracy,
+            "confidence_threshold": self.threshold,
+            "local_hits": self.local_hits,
+            "escalations": self.escalations,
+            "local_rate": round(self.local_hits / handled, 4) if handled else 0.0,
+            "audit_agreement": round(self.audit_agreements / self.audits, 4) if self.audits else None,
+            "escalated_agreement": (round(self.escalated_agreements / self.escalated_with_guess, 4)
+                                    if self.escalated_with_guess else None),
+        }
@@ -0,0 +1,435 @@
+"""
+Email Log
+Persistent email history with unique IDs, write-behind batching and pre-aggregated rollups
+"""
+
+import asyncio
+import logging
+import os
+import secrets
+import socket
+import sqlite3
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Dict, List, Optional
+
+from metrics import stage
+
+try:
+    import psycopg2
+except ImportError:  # pragma: no cover - Postgres is optional for local runs
+    psycopg2 = None
+
+logger = logging.getLogger(__name__)
+
+# Errors caused by the rows themselves rather than the database being unavailable
+DATA_ERRORS = (sqlite3.IntegrityError, sqlite3.DataError, sqlite3.InterfaceError)
+if psycopg2 is not None:
+    DATA_ERRORS += (psycopg2.IntegrityError, psycopg2.DataError)
+
+SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS email_log ("
+    "id BIGINT PRIMARY KEY, direction TEXT NOT NULL, address TEXT, subject TEXT, content TEXT, "
+    "category TEXT NOT NULL, priority TEXT, ai_generated INTEGER NOT NULL, created_at DOUBLE PRECISION NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS idx_email_log_created ON email_log (created_at)",
+    "CREATE INDEX IF NOT EXISTS idx_email_log_category ON email_log (category, created_at)",
+    "CREATE TABLE IF NOT EXISTS email_rollup_hourly ("
+    "hour BIGINT NOT NULL, category TEXT NOT NULL, total BIGINT NOT NULL, ai_generated BIGINT NOT NULL, "
+    "PRIMARY KEY (hour, category))",
+    "CREATE TABLE IF NOT EXISTS email_rollup_total ("
+    "category TEXT PRIMARY KEY, total BIGINT NOT NULL, ai_generated BIGINT NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS email_worker_lease ("
+    "worker_id INTEGER PRIMARY KEY, owner TEXT NOT NULL, expires_at DOUBLE PRECISION NOT NULL)",
+]
+WORKER_IDS = 1024
+
+
+class WorkerIdUnavailable(RuntimeError):
+    """No worker number is leased, so no message id can be issued safely"""
+
+
+class MessageIdGenerator:
+    """Snowflake-style IDs: milliseconds since 2024, a 10-bit worker number and a 12-bit sequence.
+
+    IDs strictly increase within a process, even if the wall clock steps
+    back, and cannot collide between processes with different worker numbers.
+    Worker numbers come from ``EMAIL_WORKER_ID`` or a lease in the log
+    database (see ``EmailLog``).
+    """
+
+    EPOCH_MS = 1704067200000
+
+    def __init__(self, worker_id: int):
+        self.worker_id = worker_id & 0x3FF
+        self._lock = threading.Lock()
+        self._last_ms = 0
+        self._sequence = 0
+
+    def next_id(self) -> int:
+        with self._lock:
+            now = max(int(time.time() * 1000), self._last_ms)
+            if now == self._last_ms:
+                self._sequence = (self._sequence + 1) & 0xFFF
+                if self._sequence == 0:
+                    # 4096 IDs already issued this millisecond: borrow the next one
+                    now += 1
+            else:
+                self._sequence = 0
+            self._last_ms = now
+            return ((now - self.EPOCH_MS) << 22) | (self.worker_id << 12) | self._sequence
+
+
+class SqliteDatabase:
+    placeholder = "?"
+
+    def __init__(self, path: str):
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self.lock = threading.Lock()
+
+    def run(self, statements: List[tuple]):
+        """Execute (sql, rows) pairs in one transaction; rows is a list for executemany or a tuple"""
+        with self.lock:
+            try:
+                for sql, params in statements:
+                    if isinstance(params, list):
+                        self._conn.executemany(sql, params)
+                    else:
+                        self._conn.execute(sql, params)
+                self._conn.commit()
+            except Exception:
+                self._conn.rollback()
+                raise
+
+    def query(self, sql: str, params: tuple = ()) -> list:
+        with self.lock:
+            return self._conn.execute(sql, params).fetchall()
+
+
+class PostgresDatabase:
+    placeholder = "%s"
+
+    def __init__(self, url: str):
+        self.url = url
+        self.lock = threading.Lock()
+        self._conn = None
+
+    def _connection(self):
+        if self._conn is None or self._conn.closed:
+            self._conn = psycopg2.connect(self.url)
+        return self._conn
+
+    def run(self, statements: List[tuple]):
+        with self.lock:
+            conn = self._connection()
+            try:
+                with conn.cursor() as cursor:
+                    for sql, params in statements:
+                        if isinstance(params, list):
+                            cursor.executemany(sql, params)
+                        else:
+                            cursor.execute(sql, params)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+    def query(self, sql: str, params: tuple = ()) -> list:
+        with self.lock:
+            conn = self._connection()
+            try:
+                with conn.cursor() as cursor:
+                    cursor.execute(sql, params)
+                    rows = cursor.fetchall()
+                conn.commit()
+                return rows
+            except Exception:
+                conn.rollback()
+                raise
+
+
+class EmailLog:
+    """Sent and received email records, written behind in batches.
+
+    ``record`` only appends to an in-memory buffer; a background task writes
+    the buffer in one transaction once it holds ``batch_size`` rows or
+    ``flush_interval_ms`` has passed. The same transaction updates hourly
+    and all-time per-category rollups, so ``stats`` reads a few dozen rollup
+    rows no matter how many emails are stored. If the database is
+    unavailable the rows are kept and retried on the next flush, up to
+    ``max_buffer`` rows. A batch rejected because of its own data is split
+    in half until the offending rows are isolated; those are moved to
+    ``quarantine`` so the rest of the log keeps flowing.
+
+    Without ``EMAIL_WORKER_ID`` the worker number is leased from the
+    ``email_worker_lease`` table, so replicas sharing a log never hold the
+    same one. The lease is renewed by the flush loop; ``new_message_id``
+    raises ``WorkerIdUnavailable`` until one is held, or once it is about
+    to lapse because the database could not be reached to renew it.
+    """
+
+    def __init__(self, url: Optional[str] = None, batch_size: Optional[int] = None,
+                 flush_interval_ms: Optional[float] = None, worker_id: Optional[int] = None,
+                 max_buffer: int = 100000, lease_seconds: Optional[float] = None):
+        url = url if url is not None else os.getenv('EMAIL_LOG_URL', '')
+        if url.startswith(('postgres://', 'postgresql://')):
+            if psycopg2 is None:
+                raise RuntimeError("psycopg2 is required for a Postgres EMAIL_LOG_URL")
+            self._db = PostgresDatabase(url)
+            self.backend = "postgres"
+        else:
+            path = (url[len('sqlite:///'):] if url.startswith('sqlite:///')
+                    else os.getenv('EMAIL_LOG_DB', '/tmp/email_log.sqlite3'))
+            self._db = SqliteDatabase(path)
+            self.backend = "sqlite"
+        self._schema_ready = False
+        self.batch_size = batch_size or int(os.getenv('EMAIL_LOG_BATCH_SIZE', '500'))
+        self.flush_interval = (flush_interval_ms or float(os.getenv('EMAIL_LOG_FLUSH_MS', '200'))) / 1000
+        self.max_buffer = max_buffer
+        if worker_id is None and os.getenv('EMAIL_WORKER_ID'):
+            worker_id = int(os.getenv('EMAIL_WORKER_ID'))
+        self.ids = MessageIdGenerator(worker_id) if worker_id is not None else None
+        self.leased = worker_id is None
+        self.lease_seconds = lease_seconds or float(os.getenv('EMAIL_WORKER_LEASE_SECONDS', '60'))
+        self._lease_owner = f"{socket.gethostname()}:{os.getpid()}:{secrets.token_hex(8)}"
+        self._lease_expires = 0.0
+        self._buffer: List[tuple] = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+        self.flushes = 0
+        self.rows_written = 0
+        self.dropped = 0
+        self.write_errors = 0
+        self.quarantine = deque(maxlen=1000)  # rows the database rejected, most recent last
+        self.quarantined = 0
+
+    def _ensure_schema(self):
+        # Deferred to first use so the app can start before the database accepts connections
+        if not self._schema_ready:
+            p = self._db.placeholder
+            self._db.run([(sql, ()) for sql in SCHEMA] + [(
+                f"INSERT INTO email_worker_lease (worker_id, owner, expires_at) VALUES ({p}, '', 0) "
+                "ON CONFLICT (worker_id) DO NOTHING",
+                [(worker_id,) for worker_id in range(WORKER_IDS)]
+            )])
+            self._schema_ready = True
+
+    @property
+    def ready(self) -> bool:
+        """Whether message ids can be issued"""
+        if self.ids is None:
+            return False
+        # Stop a few seconds early: another process may take the number as soon as the lease lapses
+        return not self.leased or time.time() < self._lease_expires - min(5.0, self.lease_seconds / 4)
+
+    def new_message_id(self) -> str:
+        ids = self.ids
+        if ids is None or not self.ready:
+            raise WorkerIdUnavailable("Email log has no worker id lease")
+        return f"msg_{ids.next_id()}"
+
+    def ensure_worker_id(self):
+        """Lease a worker number, or renew the current lease once a third of it has passed"""
+        if not self.leased or self._lease_expires - time.time() > self.lease_seconds * 2 / 3:
+            return
+        self._ensure_schema()
+        p = self._db.placeholder
+        now = time.time()
+        expires = now + self.lease_seconds
+        if self.ids is not None:
+            self._db.run([(f"UPDATE email_worker_lease SET expires_at = {p} WHERE worker_id = {p} AND owner = {p}",
+                           (expires, self.ids.worker_id, self._lease_owner))])
+        else:
+            # A free number is one whose lease ran out; concurrent claims of the same row are settled
+            # by the expires_at check, and the loser finds no row with its owner and tries again later
+            self._db.run([(
+                f"UPDATE email_worker_lease SET owner = {p}, expires_at = {p} WHERE worker_id = ("
+                f"SELECT worker_id FROM email_worker_lease WHERE expires_at < {p} ORDER BY expires_at LIMIT 1"
+                f") AND expires_at < {p}",
+                (self._lease_owner, expires, now, now)
+            )])
+        rows = self._db.query(f"SELECT worker_id FROM email_worker_lease WHERE owner = {p}", (self._lease_owner,))
+        if not rows:
+            if self.ids is not None:
+                logger.error(f"Lost the lease on email log worker id {self.ids.worker_id}")
+            else:
+                logger.error("No free email log worker id to lease")
+            self.ids = None
+            self._lease_expires = 0.0
+            return
+        if self.ids is None:
+            self.ids = MessageIdGenerator(int(rows[0][0]))
+            logger.info(f"Leased email log worker id {self.ids.worker_id}")
+        self._lease_expires = expires
+
+    def _release_worker_id(self):
+        if self.leased and self.ids is not None:
+            p = self._db.placeholder
+            self._db.run([(f"UPDATE email_worker_lease SET expires_at = 0 WHERE worker_id = {p} AND owner = {p}",
+                           (self.ids.worker_id, self._lease_owner))])
+            self.ids = None
+            self._lease_expires = 0.0
+
+    def record(self, message_id: str, direction: str, address: str, subject: str, content: str,
+               category: str, priority: str, ai_generated: bool):
+        row = (int(message_id.rsplit('_', 1)[-1]), direction, address, subject, content,
+               category, priority, int(ai_generated), time.time())
+        with self._lock:
+            self._buffer.append(row)
+            full = len(self._buffer) >= self.batch_size
+        if full and self._wake is not None:
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        self._task = asyncio.ensure_future(self._flush_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+        await asyncio.to_thread(self.flush)
+        try:
+            await asyncio.to_thread(self._release_worker_id)
+        except Exception as e:
+            logger.error(f"Error releasing email log worker id: {e}")
+
+    async def _flush_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await asyncio.to_thread(self.ensure_worker_id)
+            except Exception as e:
+                logger.error(f"Error leasing email log worker id: {e}")
+            await asyncio.to_thread(self.flush)
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                rows, self._buffer = self._buffer, []
+            if not rows:
+                return
+            try:
+                self._ensure_schema()
+            except Exception as e:
+                self.write_errors += 1
+                logger.error(f"Error preparing email log schema: {e}")
+                self._requeue(rows)
+                return
+            with stage('db_write'):
+                failed = self._write_batch(rows)
+            if failed:
+                self._requeue(failed)
+
+    def _requeue(self, rows: List[tuple]):
+        with self._lock:
+            self._buffer = rows + self._buffer
+            overflow = len(self._buffer) - self.max_buffer
+            if overflow > 0:
+                del self._buffer[:overflow]
+                self.dropped += overflow
+
+    def _write_batch(self, rows: List[tuple]) -> List[tuple]:
+        """Write rows, bisecting on data errors; returns the rows to retry because the database failed"""
+        try:
+            self._write(rows)
+        except DATA_ERRORS as e:
+            if len(rows) == 1 and self._already_written(rows[0]):
+                # A retry of a batch whose commit succeeded although the client saw an error
+                return []
+            self.write_errors += 1
+            if len(rows) == 1:
+                self.quarantined += 1
+                self.quarantine.append(rows[0])
+                logger.error(f"Quarantined email log row {rows[0][0]}: {e}")
+                return []
+            middle = len(rows) // 2
+            return self._write_batch(rows[:middle]) + self._write_batch(rows[middle:])
+        except Exception as e:
+            self.write_errors += 1
+            logger.error(f"Error writing email log batch of {len(rows)}: {e}")
+            return rows
+        self.flushes += 1
+        self.rows_written += len(rows)
+        return []
+
+    def _already_written(self, row: tuple) -> bool:
+        p = self._db.placeholder
+        try:
+            stored = self._db.query(f"SELECT direction, created_at FROM email_log WHERE id = {p}", (row[0],))
+        except Exception:
+            return False
+        return bool(stored) and stored[0][0] == row[1] and stored[0][1] == row[8]
+
+    def _write(self, rows: List[tuple]):
+        hourly: Dict[tuple, list] = defaultdict(lambda: [0, 0])
+        totals: Dict[str, list] = defaultdict(lambda: [0, 0])
+        for row in rows:
+            for bucket in (hourly[(int(row[8] // 3600), row[5])], totals[row[5]]):
+                bucket[0] += 1
+                bucket[1] += row[7]
+        p = self._db.placeholder
+        self._db.run([
+            (f"INSERT INTO email_log (id, direction, address, subject, content, category, priority, "
+             f"ai_generated, created_at) VALUES ({', '.join([p] * 9)})", rows),
+            (f"INSERT INTO email_rollup_hourly (hour, category, total, ai_generated) "
+             f"VALUES ({p}, {p}, {p}, {p}) "
+             "ON CONFLICT (hour, category) DO UPDATE SET total = email_rollup_hourly.total + excluded.total, "
+             "ai_generated = email_rollup_hourly.ai_generated + excluded.ai_generated",
+             [(hour, category, total, ai) for (hour, category), (total, ai) in hourly.items()]),
+            (f"INSERT INTO email_rollup_total (category, total, ai_generated) VALUES ({p}, {p}, {p}) "
+             "ON CONFLICT (category) DO UPDATE SET total = email_rollup_total.total + excluded.total, "
+             "ai_generated = email_rollup_total.ai_generated + excluded.ai_generated",
+             [(category, total, ai) for category, (total, ai) in totals.items()]),
+        ])
+
+    def stats(self) -> dict:
+        """Totals, AI-generated count, category distribution and the last 24 hourly buckets"""
+        with self._flush_lock:
+            return self._stats()
+
+    def _stats(self) -> dict:
+        self._ensure_schema()
+        p = self._db.placeholder
+        current_hour = int(time.time() // 3600)
+        category_counts: Dict[str, int] = {}
+        ai_generated = 0
+        for category, total, ai in self._db.query("SELECT category, total, ai_generated FROM email_rollup_total"):
+            category_counts[category] = int(total)
+            ai_generated += int(ai)
+        last_24h = self._db.query(
+            f"SELECT COALESCE(SUM(total), 0) FROM email_rollup_hourly WHERE hour > {p}", (current_hour - 24,)
+        )[0][0]
+        last_24h = int(last_24h)
+        # Rows not yet flushed; at most about one batch, and none are mid-write while the flush lock is held
+        with self._lock:
+            unflushed = list(self._buffer)
+        for row in unflushed:
+            category_counts[row[5]] = category_counts.get(row[5], 0) + 1
+            ai_generated += row[7]
+            last_24h += 1
+        return {
+            "total_emails": sum(category_counts.values()),
+            "ai_generated": ai_generated,
+            "category_distribution": category_counts,
+            "last_24h": last_24h,
+            "log": {
+                "backend": self.backend,
+                "worker_id": self.ids.worker_id if self.ids is not None else None,
+                "unflushed": len(unflushed),
+                "flushes": self.flushes,
+                "rows_written": self.rows_written,
+                "write_errors": self.write_errors,
+                "dropped": self.dropped,
+                "quarantined": self.quarantined,
+            },
+        }
@@ -0,0 +1,503 @@
+"""
+IMAP Ingestion
+Incremental UID sync with IDLE, header-first fetch and streaming text extraction
+"""
+
+import asyncio
+import binascii
+import imaplib
+import json
+import logging
+import os
+import quopri
+import re
+import select
+import threading
+import time
+from collections import deque
+from email import policy
+from email.parser import BytesHeaderParser
+from email.utils import parseaddr
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from metrics import stage
+
+logger = logging.getLogger(__name__)
+
+HEADER_FIELDS = "FROM SUBJECT MESSAGE-ID DATE REFERENCES AUTO-SUBMITTED PRECEDENCE LIST-ID"
+# Bounce, list-robot and no-reply senders (RFC 3834 section 2)
+NO_REPLY_SENDER_RE = re.compile(
+    r"^(?:mailer-daemon|postmaster|listserv|majordomo|owner-[^@]*|[^@]*-request|no-?reply|do-?not-?reply)@",
+    re.IGNORECASE,
+)
+
+
+def is_automated(headers, sender: str) -> bool:
+    """Mail that must not get an automatic reply: auto-generated, bulk or list traffic, bounces or no sender"""
+    if not sender or NO_REPLY_SENDER_RE.match(sender):
+        return True
+    if str(headers.get('Auto-Submitted') or 'no').strip().lower() != 'no':
+        return True
+    if str(headers.get('Precedence') or '').strip().lower() in ('bulk', 'list', 'junk'):
+        return True
+    return headers.get('List-Id') is not None
+
+
+class TextPartExtractor:
+    """Line-oriented MIME scanner that keeps the first text/plain part.
+
+    Bytes are fed in as they arrive. Attachments and other parts are skipped
+    line by line and never buffered, and scanning stops once the text part
+    is complete or ``max_bytes`` of it have been kept.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.done = False
+        self._partial = b''
+        self._boundaries: List[bytes] = []
+        self._in_headers = True
+        self._header_lines: List[bytes] = []
+        self._capturing = False
+        self._encoding = '7bit'
+        self._charset = 'utf-8'
+        self._text = bytearray()
+
+    def feed(self, data: bytes):
+        if self.done:
+            return
+        lines = (self._partial + data).split(b'\n')
+        self._partial = lines.pop()
+        for line in lines:
+            self._line(line + b'\n')
+            if self.done:
+                return
+
+    def close(self):
+        if self._partial and not self.done:
+            self._line(self._partial)
+        self._partial = b''
+        self.done = True
+
+    def _line(self, line: bytes):
+        if self._in_headers:
+            if line.strip():
+                if len(self._header_lines) < 200:
+                    self._header_lines.append(line)
+                return
+            self._start_part(BytesHeaderParser().parsebytes(b''.join(self._header_lines)))
+            self._header_lines = []
+            self._in_headers = False
+            return
+        stripped = line.rstrip(b'\r\n')
+        if self._boundaries and stripped.startswith(b'--'):
+            for depth in range(len(self._boundaries) - 1, -1, -1):
+                boundary = self._boundaries[depth]
+                if stripped not in (b'--' + boundary, b'--' + boundary + b'--'):
+                    continue
+                if self._capturing:
+                    self.done = True
+                    return
+                del self._boundaries[depth + 1:]
+                if stripped.endswith(boundary + b'--'):
+                    self._boundaries.pop()
+                else:
+                    self._in_headers = True
+                return
+        if self._capturing:
+            self._text += line
+            if len(self._text) >= self.max_bytes:
+                del self._text[self.max_bytes:]
+                self.done = True
+
+    def _start_part(self, headers):
+        if headers.get_content_maintype() == 'multipart':
+            boundary = headers.get_param('boundary')
+            if boundary:
+                self._boundaries.append(str(boundary).encode())
+            return
+        if headers.get_content_type() == 'text/plain':
+            self._capturing = True
+            self._encoding = str(headers.get('Content-Transfer-Encoding') or '7bit').strip().lower()
+            self._charset = headers.get_content_charset() or 'utf-8'
+
+    def text(self) -> str:
+        raw = bytes(self._text)
+        if self._encoding == 'base64':
+            compact = b''.join(raw.split())
+            try:
+                raw = binascii.a2b_base64(compact[:len(compact) // 4 * 4])
+            except binascii.Error:
+                raw = b''
+        elif self._encoding == 'quoted-printable':
+            raw = quopri.decodestring(raw)
+        try:
+            return raw.decode(self._charset, errors='replace').strip()
+        except LookupError:
+            return raw.decode('utf-8', errors='replace').strip()
+
+
+class UIDState:
+    """Last processed UID and UIDs awaiting retry per mailbox, replaced atomically so restarts resume"""
+
+    def __init__(self, path: str):
+        self.path = path
+        try:
+            with open(path) as f:
+                self._state = json.load(f)
+        except (OSError, ValueError):
+            self._state = {}
+
+    def get(self, mailbox: str) -> tuple:
+        entry = self._state.get(mailbox) or {}
+        return entry.get('uidvalidity'), entry.get('last_uid', 0)
+
+    def get_failed(self, mailbox: str) -> Dict[int, int]:
+        """UIDs at or below the last processed one whose handler failed, with their attempt counts"""
+        entry = self._state.get(mailbox) or {}
+        return {int(uid): attempts for uid, attempts in (entry.get('failed') or {}).items()}
+
+    def set(self, mailbox: str, uidvalidity: int, last_uid: int, failed: Optional[Dict[int, int]] = None):
+        self._state[mailbox] = {'uidvalidity': uidvalidity, 'last_uid': last_uid, 'failed': failed or {}}
+        tmp = f"{self.path}.tmp"
+        with open(tmp, 'w') as f:
+            json.dump(self._state, f)
+        os.replace(tmp, self.path)
+
+
+class IMAPIngestor:
+    """Follows a mailbox on a background thread and hands new mail to an async handler.
+
+    New UIDs are found with UID SEARCH, their headers fetched in batches, and
+    auto-submitted mail is dropped before any body is downloaded. Bodies are
+    fetched in partial ranges through ``TextPartExtractor``. At most
+    ``concurrency`` messages are in the handler at once; the fetch thread
+    waits when all slots are taken. The stored UID only advances past
+    messages whose handler has finished, so a crash re-delivers rather than
+    loses mail. A message whose handler failed is saved with the UID and
+    fetched again with exponential backoff, including after a restart,
+    until it succeeds or has failed ``max_attempts`` times.
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[dict], Awaitable[None]],
+        host: Optional[str] = None,
+        port: Optional[int] = None,
+        username: Optional[str] = None,
+        password: Optional[str] = None,
+        use_ssl: Optional[bool] = None,
+        mailbox: Optional[str] = None,
+        state_file: Optional[str] = None,
+        concurrency: Optional[int] = None,
+        start_from: Optional[str] = None,
+    ):
+        self.handler = handler
+        self.host = host or os.getenv('IMAP_SERVER', '')
+        self.port = port or int(os.getenv('IMAP_PORT', '993'))
+        self.username = username or os.getenv('IMAP_USERNAME') or os.getenv('EMAIL_USERNAME')
+        self.password = password or os.getenv('IMAP_PASSWORD') or os.getenv('EMAIL_PASSWORD')
+        self.use_ssl = use_ssl if use_ssl is not None else os.getenv('IMAP_SSL', 'true').lower() == 'true'
+        self.mailbox = mailbox or os.getenv('IMAP_MAILBOX', 'INBOX')
+        self.concurrency = concurrency or int(os.getenv('IMAP_CONCURRENCY', '8'))
+        self.start_from = start_from or os.getenv('IMAP_START_FROM', 'new')
+        self.fetch_batch = int(os.getenv('IMAP_FETCH_BATCH', '100'))
+        self.body_chunk = int(os.getenv('IMAP_BODY_CHUNK', '65536'))
+        self.max_body_bytes = int(os.getenv('IMAP_MAX_BODY_BYTES', '65536'))
+        self.idle_timeout = float(os.getenv('IMAP_IDLE_TIMEOUT', '600'))
+        self.poll_interval = float(os.getenv('IMAP_POLL_INTERVAL', '30'))
+        self.max_attempts = int(os.getenv('IMAP_MAX_ATTEMPTS', '5'))
+        self.retry_base = float(os.getenv('IMAP_RETRY_BASE_SECONDS', '30'))
+        self.state = UIDState(state_file or os.getenv('IMAP_STATE_FILE', '/tmp/email_imap_state.json'))
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._slots = threading.BoundedSemaphore(self.concurrency)
+        self._lock = threading.Lock()
+        self._pending = set()
+        self._failed: Dict[int, list] = {}  # uid -> [attempts, retry_at]
+        self._uidvalidity = None
+        self._dispatched_uid = 0
+        self._committed_uid = 0
+        self._last_save = 0.0
+        self._latencies = deque(maxlen=1000)
+        self._started_at = None
+        self.fetched = 0
+        self.processed = 0
+        self.failed = 0
+        self.retried = 0
+        self.abandoned = 0
+        self.skipped = 0
+        self.bytes_fetched = 0
+        self.backlog = 0
+        self.errors = 0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.host)
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._started_at = time.time()
+        self._thread = threading.Thread(target=self._run, name='imap-ingest', daemon=True)
+        self._thread.start()
+
+    async def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            await asyncio.to_thread(self._thread.join, 5)
+        with self._lock:
+            self._save(force=True)
+
+    def _run(self):
+        backoff = 1
+        while not self._stop.is_set():
+            try:
+                imap = self._connect()
+                backoff = 1
+                try:
+                    self._follow(imap)
+                finally:
+                    try:
+                        imap.logout()
+                    except (imaplib.IMAP4.error, OSError):
+                        pass
+            except Exception as e:
+                # Anything else (a malformed server reply, a parse error) must not end the thread either
+                self.errors += 1
+                expected = isinstance(e, (imaplib.IMAP4.error, OSError))
+                logger.error(f"Error in IMAP ingestion: {e}", exc_info=not expected)
+                self._stop.wait(backoff)
+                backoff = min(backoff * 2, 60)
+
+    def _connect(self) -> imaplib.IMAP4:
+        imap = imaplib.IMAP4_SSL(self.host, self.port) if self.use_ssl else imaplib.IMAP4(self.host, self.port)
+        imap.login(self.username, self.password or '')
+        typ, _ = imap.select(self.mailbox, readonly=True)
+        if typ != 'OK':
+            raise imaplib.IMAP4.error(f"Cannot select {self.mailbox}")
+        uidvalidity = int(imap.response('UIDVALIDITY')[1][0])
+        uidnext = imap.response('UIDNEXT')[1][0]
+        stored_validity, last_uid = self.state.get(self.mailbox)
+        with self._lock:
+            if stored_validity != uidvalidity:
+                # New mailbox or UIDs were renumbered: stored positions no longer mean anything
+                last_uid = int(uidnext) - 1 if uidnext and self.start_from == 'new' else 0
+                self._uidvalidity = uidvalidity
+                self._committed_uid = self._dispatched_uid = last_uid
+                self._failed = {}
+                self._save(force=True)
+            elif self._uidvalidity is None:
+                # First connection of this process: retry what failed before the restart right away
+                self._failed = {uid: [attempts, 0.0] for uid, attempts in self.state.get_failed(self.mailbox).items()}
+            self._uidvalidity = uidvalidity
+            self._committed_uid = max(self._committed_uid, last_uid)
+            self._dispatched_uid = max(self._dispatched_uid, self._committed_uid)
+        return imap
+
+    def _follow(self, imap: imaplib.IMAP4):
+        can_idle = 'IDLE' in imap.capabilities
+        while not self._stop.is_set():
+            self._sync(imap)
+            if can_idle:
+                self._idle(imap)
+            else:
+                self._stop.wait(self.poll_interval)
+                imap.noop()
+
+    def _sync(self, imap: imaplib.IMAP4):
+        self._retry_failed(imap)
+        typ, data = imap.uid('SEARCH', None, f'UID {self._dispatched_uid + 1}:*')
+        uids = sorted(int(uid) for uid in (data[0] or b'').split() if int(uid) > self._dispatched_uid)
+        self.backlog = len(uids)
+        for start in range(0, len(uids), self.fetch_batch):
+            with stage('imap_fetch_headers', upstream='imap'):
+                items = self._fetch_headers(imap, uids[start:start + self.fetch_batch])
+            for item in items:
+                if self._stop.is_set():
+                    return
+                if item['automated']:
+                    self.skipped += 1
+                else:
+                    with stage('imap_fetch_body', upstream='imap'):
+                        item['body'] = self._fetch_text(imap, item['uid'], item['size'])
+                self._dispatch(item)
+                self.backlog -= 1
+
+    def _retry_failed(self, imap: imaplib.IMAP4):
+        now = time.time()
+        with self._lock:
+            due = sorted(uid for uid, (_, retry_at) in self._failed.items()
+                         if retry_at <= now and uid not in self._pending)
+        for start in range(0, len(due), self.fetch_batch):
+            batch = due[start:start + self.fetch_batch]
+            items = self._fetch_headers(imap, batch)
+            found = {item['uid'] for item in items}
+            with self._lock:
+                for uid in batch:
+                    if uid not in found:
+                        # Deleted from the mailbox since it failed
+                        self._failed.pop(uid, None)
+            for item in items:
+                if self._stop.is_set():
+                    return
+                if not item['automated']:
+                    item['body'] = self._fetch_text(imap, item['uid'], item['size'])
+                self.retried += 1
+                self._dispatch(item)
+
+    def _fetch_headers(self, imap: imaplib.IMAP4, uids: List[int]) -> List[dict]:
+        typ, data = imap.uid(
+            'FETCH', ','.join(map(str, uids)), f'(UID RFC822.SIZE BODY.PEEK[HEADER.FIELDS ({HEADER_FIELDS})])'
+        )
+        items = []
+        parser = BytesHeaderParser(policy=policy.default)
+        now = time.time()
+        for part in data:
+            if not isinstance(part, tuple):
+                continue
+            meta, raw = part
+            uid = re.search(rb'UID (\d+)', meta)
+            size = re.search(rb'RFC822\.SIZE (\d+)', meta)
+            if not uid:
+                continue
+            headers = parser.parsebytes(raw)
+            sender_name, sender = parseaddr(str(headers.get('From') or ''))
+            items.append({
+                'uid': int(uid.group(1)),
+                'size': int(size.group(1)) if size else 0,
+                'from': sender,
+                'from_name': sender_name,
+                'subject': str(headers.get('Subject') or ''),
+                'message_id': str(headers.get('Message-ID') or '').strip(),
+                'references': ' '.join(str(headers.get('References') or '').split()),
+                'date': str(headers.get('Date') or ''),
+                'automated': is_automated(headers, sender),
+                'discovered_at': now,
+            })
+        self.fetched += len(items)
+        return sorted(items, key=lambda item: item['uid'])
+
+    def _fetch_text(self, imap: imaplib.IMAP4, uid: int, size: int) -> str:
+        extractor = TextPartExtractor(self.max_body_bytes)
+        offset = 0
+        while not extractor.done and (offset < size or not size):
+            typ, data = imap.uid('FETCH', str(uid), f'(BODY.PEEK[]<{offset}.{self.body_chunk}>)')
+            piece = next((part[1] for part in data if isinstance(part, tuple)), b'')
+            if not piece:
+                break
+            extractor.feed(piece)
+            offset += len(piece)
+            self.bytes_fetched += len(piece)
+            if len(piece) < self.body_chunk:
+                break
+        extractor.close()
+        return extractor.text()
+
+    def _idle(self, imap: imaplib.IMAP4):
+        """Wait in IDLE until the server reports new mail, the timeout passes or we are stopped"""
+        tag = imap._new_tag()
+        imap.send(tag + b' IDLE\r\n')
+        if not imap.readline().startswith(b'+'):
+            raise imaplib.IMAP4.error("IDLE rejected by server")
+        with self._lock:
+            # Come out of IDLE in time for the next failed message's retry
+            retry_at = min((retry_at for _, retry_at in self._failed.values()), default=float('inf'))
+        deadline = time.monotonic() + max(0.0, min(self.idle_timeout, retry_at - time.time()))
+        while not self._stop.is_set() and time.monotonic() < deadline:
+            pending = getattr(imap.sock, 'pending', lambda: 0)()
+            if not pending and not select.select([imap.sock], [], [], 1.0)[0]:
+                continue
+            line = imap.readline()
+            if not line:
+                raise imaplib.IMAP4.abort("connection closed during IDLE")
+            if b'EXISTS' in line:
+                break
+        imap.send(b'DONE\r\n')
+        while True:
+            line = imap.readline()
+            if not line:
+                raise imaplib.IMAP4.abort("connection closed leaving IDLE")
+            if line.startswith(tag):
+                return
+
+    def _dispatch(self, item: dict):
+        while not self._slots.acquire(timeout=1):
+            if self._stop.is_set():
+                return
+        uid = item['uid']
+        with self._lock:
+            self._pending.add(uid)
+            self._dispatched_uid = max(self._dispatched_uid, uid)
+        if item['automated']:
+            self._finish(uid, item, None)
+            return
+        future = asyncio.run_coroutine_threadsafe(self.handler(item), self._loop)
+        future.add_done_callback(lambda f: self._finish(uid, item, f.exception()))
+
+    def _finish(self, uid: int, item: dict, error: Optional[BaseException]):
+        if error is None and not item['automated']:
+            self.processed += 1
+            self._latencies.append(time.time() - item['discovered_at'])
+        with self._lock:
+            failed_before = uid in self._failed
+            if error is not None:
+                self.failed += 1
+                attempts = self._failed.get(uid, [0])[0] + 1
+                if attempts >= self.max_attempts:
+                    self._failed.pop(uid, None)
+                    self.abandoned += 1
+                    logger.error(f"Giving up on inbound email UID {uid} after {attempts} attempts: {error}")
+                else:
+                    # Recorded before the committed UID can move past it, and saved in the same write
+                    delay = min(self.retry_base * 2 ** (attempts - 1), 3600)
+                    self._failed[uid] = [attempts, time.time() + delay]
+                    logger.error(f"Error processing inbound email UID {uid}, retrying in {delay:.0f}s: {error}")
+            else:
+                self._failed.pop(uid, None)
+            self._pending.discard(uid)
+            committed = min(self._pending) - 1 if self._pending else self._dispatched_uid
+            if committed > self._committed_uid:
+                self._committed_uid = committed
+                self._save()
+            elif error is not None or failed_before:
+                self._save(force=True)
+        self._slots.release()
+
+    def _save(self, force: bool = False):
+        now = time.monotonic()
+        if self._uidvalidity is None or (not force and now - self._last_save < 1.0):
+            return
+        self._last_save = now
+        try:
+            self.state.set(self.mailbox, self._uidvalidity, self._committed_uid,
+                           {uid: attempts for uid, (attempts, _) in self._failed.items()})
+        except OSError as e:
+            logger.error(f"Error saving IMAP state: {e}")
+
+    def stats(self) -> dict:
+        latencies = sorted(self._latencies)
+
+        def pct(p):
+            return round(latencies[min(len(latencies) - 1, int(len(latencies) * p / 100))], 3) if latencies else None
+
+        elapsed = time.time() - self._started_at if self._started_at else 0
+        return {
+            "enabled": self.enabled,
+            "mailbox": self.mailbox,
+            "committed_uid": self._committed_uid,
+            "fetched": self.fetched,
+            "processed": self.processed,
+            "skipped_automated": self.skipped,
+            "failed": self.failed,
+            "retried": self.retried,
+            "awaiting_retry": len(self._failed),
+            "abandoned": self.abandoned,
+            "in_flight": len(self._pending),
+            "backlog": self.backlog,
+            "lag_p50_s": pct(50),
+            "lag_p95_s": pct(95),
+            "throughput_per_s": round(self.processed / elapsed, 2) if elapsed else 0.0,
+            "bytes_fetched": self.bytes_fetched,
+            "connection_errors": self.errors,
+        }
@@ -0,0 +1,102 @@
+"""
+Async LLM Client
+Pooled, non-blocking OpenAI access through the shared resilient "openai" upstream
+"""
+
+import logging
+import os
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+from resilience import get_upstream
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL = "gpt-3.5-turbo"
+
+
+class LLMClient:
+    """Process-wide OpenAI client shared by every request handler.
+
+    A single ``httpx.AsyncClient`` keeps a pool of keep-alive connections to
+    the API. Completions go through the "openai" Upstream (resilience.py):
+    an adaptive limit of at most ``max_concurrency`` in flight, so a burst
+    queues here instead of overwhelming the API, deadline-bounded retries of
+    transient errors and a circuit breaker that fails fast during outages.
+    """
+
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        base_url: Optional[str] = None,
+        max_concurrency: Optional[int] = None,
+        timeout: Optional[float] = None,
+        max_connections: Optional[int] = None,
+    ):
+        self.api_key = api_key or os.getenv('OPENAI_API_KEY')
+        self.base_url = base_url or os.getenv('OPENAI_BASE_URL') or None
+        self.max_concurrency = max_concurrency or int(os.getenv('LLM_MAX_CONCURRENCY', '32'))
+        self.timeout = timeout or float(os.getenv('LLM_TIMEOUT', '30'))
+        self.max_connections = max_connections or int(
+            os.getenv('LLM_MAX_CONNECTIONS', str(self.max_concurrency))
+        )
+        self._client: Optional["AsyncOpenAI"] = None
+        self.upstream = get_upstream('openai', timeout=self.timeout, max_concurrency=self.max_concurrency)
+
+    @staticmethod
+    def warm_up():
+        """Import the OpenAI SDK ahead of time, so the first completion does not pay for it"""
+        import httpx  # noqa: F401
+        import openai  # noqa: F401
+
+    @property
+    def client(self) -> "AsyncOpenAI":
+        """Create the pooled client on first use, inside the running event loop"""
+        if self._client is None:
+            import httpx
+            from openai import AsyncOpenAI
+
+            http_client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                ),
+                timeout=httpx.Timeout(self.timeout, connect=5.0),
+            )
+            self._client = AsyncOpenAI(
+                api_key=self.api_key,
+                base_url=self.base_url,
+                http_client=http_client,
+                max_retries=0,
+            )
+        return self._client
+
+    async def chat(
+        self,
+        messages: List[Dict[str, str]],
+        model: str = DEFAULT_MODEL,
+        max_tokens: int = 200,
+        temperature: float = 0.7,
+        timeout: Optional[float] = None,
+    ) -> str:
+        """Run one chat completion and return the message text; ``timeout`` caps each attempt"""
+        response = await self.upstream.acall(
+            lambda attempt_timeout: self.client.chat.completions.create(
+                model=model,
+                messages=messages,
+                max_tokens=max_tokens,
+                temperature=temperature,
+                timeout=attempt_timeout,
+            ),
+            stage_name='llm',
+            timeout=timeout,
+        )
+        return response.choices[0].message.content
+
+    async def aclose(self):
+        """Close pooled connections on shutdown"""
+        if self._client is not None:
+            await self._client.close()
+            self._client = None
@@ -4,22 +4,33 @@ Email Automation Bot
 AI-powered email automation for customer support and follow-ups
 """
 
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+from fastapi import FastAPI, HTTPException, Response
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, Field
 import smtplib
 import imaplib
 import email
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-import openai
 import os
 from dotenv import load_dotenv
 import json
 import logging
-from datetime import datetime, timedelta
+from datetime import datetime
 from typing import List, Optional
 import asyncio
+import re
+import time
+
+from batcher import MicroBatcher
+from classifier import LocalCategorizer
+from email_log import EmailLog, WorkerIdUnavailable
+from imap_ingest import IMAPIngestor
+from llm_client import LLMClient
+from metrics import instrument_fastapi, stage
+from reply_cache import ReplyCache
+from resilience import UpstreamUnavailable, upstream_stats
+from smtp_sender import MailSender
 
 # Load environment variables
 load_dotenv()
@@ -42,9 +53,16 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+instrument_fastapi(app)
 
 # Configure OpenAI
-openai.api_key = os.getenv('OPENAI_API_KEY')
+llm = LLMClient()
+
+CATEGORIZE_BATCH_SIZE = int(os.getenv('CATEGORIZE_BATCH_SIZE', '20'))
+CATEGORIZE_BATCH_WAIT_MS = float(os.getenv('CATEGORIZE_BATCH_WAIT_MS', '25'))
+CATEGORIZE_BATCH_MAX_ITEMS = int(os.getenv('CATEGORIZE_BATCH_MAX_ITEMS', '500'))
+CATEGORIZE_BATCH_CONCURRENCY = int(os.getenv('CATEGORIZE_BATCH_CONCURRENCY', '4'))
+AUTO_RESPONSE_ENABLED = os.getenv('EMAIL_BOT_AUTO_RESPONSE_ENABLED', 'true').lower() == 'true'
 
 class EmailRequest(BaseModel):
     to_email: EmailStr
@@ -59,23 +77,136 @@ class EmailResponse(BaseModel):
     timestamp: datetime
     ai_generated: bool
 
+class CategorizeItem(BaseModel):
+    subject: str
+    content: str
+
+class CategorizeBatchRequest(BaseModel):
+    emails: List[CategorizeItem] = Field(..., max_length=CATEGORIZE_BATCH_MAX_ITEMS)
+
 class EmailBot:
     def __init__(self):
-        self.email_history = {}
+        self.email_log = EmailLog()
         self.categories = {
             "support": "Customer support inquiries",
             "sales": "Sales and lead generation",
             "billing": "Billing and payment issues",
             "general": "General inquiries"
         }
+        self.categorization_batcher = MicroBatcher(
+            self.categorize_many, max_batch=CATEGORIZE_BATCH_SIZE, max_wait_ms=CATEGORIZE_BATCH_WAIT_MS
+        )
+        self.batch_fallbacks = 0
+        self.local_categorizer = LocalCategorizer(list(self.categories))
+        self.reply_cache = ReplyCache()
+    
+    async def categorize_email(self, subject: str, content: str) -> str:
+        """Categorize email locally when confident, otherwise with batched AI calls; only real LLM answers become labels"""
+        text = self.local_categorizer.text_for(subject, content)
+        with stage('categorize_local'):
+            guess = self.local_categorizer.predict(text)
+        if self.local_categorizer.is_confident(guess):
+            self.local_categorizer.local_hits += 1
+            if self.local_categorizer.should_audit():
+                asyncio.ensure_future(self.audit_local_category(subject, content, guess[0]))
+            return guess[0]
+        
+        self.local_categorizer.escalations += 1
+        try:
+            async with stage('categorize_llm'):
+                category = await self.categorization_batcher.submit((subject, content))
+        except UpstreamUnavailable as e:
+            # The LLM is down or saturated: make do with the local guess and learn nothing from it
+            logger.warning(f"Categorizing without the LLM: {e}")
+            return guess[0] if guess else "general"
+        if category is None:
+            return guess[0] if guess else "general"
+        self.local_categorizer.record_label(text, category, guess)
+        self.local_categorizer.schedule_retrain()
+        return category
+    
+    async def audit_local_category(self, subject: str, content: str, local_category: str):
+        """Shadow-check a confident local answer against the LLM to track agreement"""
+        try:
+            llm_category = await self.categorization_batcher.submit((subject, content))
+        except UpstreamUnavailable:
+            return
+        if llm_category is None:
+            return
+        self.local_categorizer.record_audit(local_category, llm_category)
+        self.local_categorizer.record_label(self.local_categorizer.text_for(subject, content), llm_category)
+    
+    async def categorize_many(self, emails: List[tuple]) -> List[Optional[str]]:
+        """Categorize several (subject, content) pairs with a single completion; None where the LLM gave no category"""
+        if len(emails) == 1:
+            return [await self.categorize_single(*emails[0])]
+        
+        items = "\n\n".join(
+            f"Email {i}:\nSubject: {subject}\nContent: {content[:500]}"
+            for i, (subject, content) in enumerate(emails, 1)
+        )
+        prompt = (
+            f"{items}\n\nCategorize each email above into one of these categories: "
+            f"{', '.join(self.categories.keys())}. Return only a JSON array with one object per email, "
+            f'in order, like [{{"id": 1, "category": "support"}}].'
+        )
+        try:
+            response = await llm.chat(
+                messages=[
+                    {"role": "system", "content": "You are an email categorization expert. Return only valid JSON."},
+                    {"role": "user", "content": prompt}
+                ],
+                max_tokens=20 * len(emails) + 20,
+                temperature=0.3
+            )
+            parsed = self.parse_batch_categories(response, len(emails))
+        except UpstreamUnavailable:
+            # Retrying each email on its own would only add calls to an upstream that is refusing them
+            raise
+        except Exception as e:
+            logger.error(f"Error categorizing email batch: {e}")
+            parsed = {}
+        
+        # Anything the batch answer did not cover cleanly is retried one by one
+        missing = [i for i in range(len(emails)) if i not in parsed]
+        if missing:
+            self.batch_fallbacks += len(missing)
+            retried = await asyncio.gather(*(self.categorize_single(*emails[i]) for i in missing))
+            parsed.update(zip(missing, retried))
+        return [parsed[i] for i in range(len(emails))]
+    
+    def parse_batch_categories(self, response: str, count: int) -> dict:
+        """Map 0-based item index to category from a batched answer, skipping anything invalid"""
+        parsed = {}
+        match = re.search(r"\[.*\]", response, re.DOTALL)
+        if match:
+            try:
+                entries = json.loads(match.group(0))
+                for position, entry in enumerate(entries):
+                    if isinstance(entry, dict):
+                        index = int(entry.get("id", position + 1)) - 1
+                        category = str(entry.get("category", "")).strip().lower()
+                    else:
+                        index, category = position, str(entry).strip().lower()
+                    if 0 <= index < count and category in self.categories:
+                        parsed[index] = category
+                return parsed
+            except (ValueError, TypeError):
+                pass
+        
+        # Not JSON: accept "1: support" / "2. billing" style lines
+        for number, category in re.findall(r"(\d+)\s*[:.)\-]\s*\"?([a-zA-Z]+)", response):
+            index = int(number) - 1
+            if 0 <= index < count and category.lower() in self.categories:
+                parsed[index] = category.lower()
+        return parsed
     
-    def categorize_email(self, subject: str, content: str) -> str:
-        """Categorize email using AI"""
+    async def categorize_single(self, subject: str, content: str) -> Optional[str]:
+        """Categorize one email with its own completion, or None when the call fails or names no known category"""
         try:
             prompt = f"Subject: {subject}\nContent: {content[:500]}\n\nCategorize this email into one of these categories: {', '.join(self.categories.keys())}. Return only the category name."
             
-            response = openai.ChatCompletion.create(
-                model="gpt-3.5-turbo",
+            response = await llm.chat(
                 messages=[
                     {"role": "system", "content": "You are an email categorization expert. Return only the category name."},
                     {"role": "user", "content": prompt}
@@ -84,20 +215,28 @@ class EmailBot:
                 temperature=0.3
             )
             
-            category = response.choices[0].message.content.strip().lower()
-            return category if category in self.categories else "general"
+            category = response.strip().lower()
+            return category if category in self.categories else None
             
+        except UpstreamUnavailable:
+            raise
         except Exception as e:
             logger.error(f"Error categorizing email: {e}")
-            return "general"
+            return None
     
-    def generate_response(self, email_content: str, category: str) -> str:
-        """Generate AI-powered email response"""
+    async def generate_response(self, email_content: str, category: str, sender_name: str = "") -> str:
+        """Generate AI-powered email response, reusing the reply to a near-duplicate email when there is one"""
+        # MinHash signing is CPU work, so it runs off the event loop
+        with stage('reply_cache_lookup'):
+            cached = await asyncio.to_thread(self.reply_cache.lookup, category, email_content, sender_name)
+        if cached is not None:
+            return cached
+        
         try:
             system_prompt = f"You are a professional customer service representative. Generate a helpful, professional response for a {category} email. Keep it concise and friendly."
             
-            response = openai.ChatCompletion.create(
-                model="gpt-3.5-turbo",
+            started = time.perf_counter()
+            reply = await llm.chat(
                 messages=[
                     {"role": "system", "content": system_prompt},
                     {"role": "user", "content": email_content}
@@ -105,8 +244,10 @@ class EmailBot:
                 max_tokens=200,
                 temperature=0.7
             )
-            
-            return response.choices[0].message.content
+            await asyncio.to_thread(
+                self.reply_cache.store, category, email_content, reply, time.perf_counter() - started, sender_name
+            )
+            return reply
             
         except Exception as e:
             logger.error(f"Error generating response: {e}")
@@ -114,81 +255,168 @@ class EmailBot:
 
 # Initialize bot
 bot = EmailBot()
+mail_sender = MailSender()
+
+async def process_inbound_email(item: dict):
+    """Categorize a message read from the mailbox and queue an AI reply"""
+    category = await bot.categorize_email(item["subject"], item["body"])
+    reply = None
+    if AUTO_RESPONSE_ENABLED:
+        reply = await bot.generate_response(item["body"], category, item.get("from_name", ""))
+    
+    message_id = bot.email_log.new_message_id()
+    bot.email_log.record(
+        message_id, "inbound", item["from"], item["subject"], item["body"],
+        category, "normal", reply is not None
+    )
+    
+    if reply and item["from"]:
+        subject = item["subject"] if item["subject"].lower().startswith("re:") else f"Re: {item['subject']}"
+        # RFC 3834: mark the reply as automatic so other responders leave it alone, and thread it
+        headers = {"Auto-Submitted": "auto-replied"}
+        if item.get("message_id"):
+            headers["In-Reply-To"] = item["message_id"]
+            headers["References"] = " ".join(filter(None, [item.get("references"), item["message_id"]]))
+        await mail_sender.submit(item["from"], subject, reply, message_id, headers)
+
+inbox = IMAPIngestor(process_inbound_email)
 
 @app.post("/send-email", response_model=EmailResponse)
-async def send_email(email_req: EmailRequest, background_tasks: BackgroundTasks):
+async def send_email(email_req: EmailRequest):
     """Send automated email"""
     try:
-        # Categorize email
-        category = bot.categorize_email(email_req.subject, email_req.content)
+        # Categorize email; an explicit category from the caller doubles as a training label
+        category = await bot.categorize_email(email_req.subject, email_req.content)
+        if email_req.category != "general" and email_req.category in bot.categories:
+            bot.local_categorizer.record_label(
+                bot.local_categorizer.text_for(email_req.subject, email_req.content), email_req.category
+            )
         
-        # Generate AI response if needed
-        if email_req.content.lower().startswith("auto"):
-            ai_response = bot.generate_response(email_req.content, category)
+        # Generate AI response if needed; decided before the content is replaced by the reply
+        ai_generated = email_req.content.lower().startswith("auto")
+        if ai_generated:
+            ai_response = await bot.generate_response(email_req.content, category)
             email_req.content = ai_response
         
-        # Send email (simulated for demo)
-        message_id = f"msg_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        message_id = bot.email_log.new_message_id()
         
-        # Store in history
-        bot.email_history[message_id] = {
-            "to": email_req.to_email,
-            "subject": email_req.subject,
-            "content": email_req.content,
-            "category": category,
-            "priority": email_req.priority,
-            "timestamp": datetime.now(),
-            "ai_generated": email_req.content.lower().startswith("auto")
-        }
+        # Store in history; written to the database in the next batch
+        bot.email_log.record(
+            message_id, "outbound", email_req.to_email, email_req.subject, email_req.content,
+            category, email_req.priority, ai_generated
+        )
         
-        # Background task for actual email sending
-        background_tasks.add_task(send_email_task, email_req)
+        # Durably queue for the SMTP sender; delivery and retries happen off the request path
+        await mail_sender.submit(email_req.to_email, email_req.subject, email_req.content, message_id)
         
         return EmailResponse(
             message_id=message_id,
-            status="sent",
+            status="queued",
             timestamp=datetime.now(),
-            ai_generated=email_req.content.lower().startswith("auto")
+            ai_generated=ai_generated
         )
         
+    except WorkerIdUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         logger.error(f"Error sending email: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
-async def send_email_task(email_req: EmailRequest):
-    """Background task to send email"""
-    # Simulate email sending
-    await asyncio.sleep(1)
-    logger.info(f"Email sent to {email_req.to_email}")
+@app.post("/categorize-batch")
+async def categorize_batch(batch: CategorizeBatchRequest):
+    """Categorize many emails with as few completions as possible"""
+    emails = [(item.subject, item.content) for item in batch.emails]
+    chunks = [emails[i:i + CATEGORIZE_BATCH_SIZE] for i in range(0, len(emails), CATEGORIZE_BATCH_SIZE)]
+    # A few chunks in flight at a time, so one large request cannot take every LLM slot
+    slots = asyncio.Semaphore(CATEGORIZE_BATCH_CONCURRENCY)
+    
+    async def categorize_chunk(chunk):
+        async with slots:
+            return await bot.categorize_many(chunk)
+    
+    try:
+        results = await asyncio.gather(*(categorize_chunk(chunk) for chunk in chunks))
+    except UpstreamUnavailable as e:
+        retry_after = max(1, round(e.retry_after or 1))
+        raise HTTPException(status_code=503, detail="Categorization temporarily unavailable",
+                            headers={"Retry-After": str(retry_after)})
+    categories = [category or "general" for chunk in results for category in chunk]
+    return {
+        "categories": categories,
+        "total": len(categories),
+        "uncategorized": sum(category is None for chunk in results for category in chunk),
+        "llm_batches": len(chunks)
+    }
 
 @app.get("/email-stats")
 async def get_email_stats():
     """Get email statistics"""
-    total_emails = len(bot.email_history)
-    ai_generated = sum(1 for email in bot.email_history.values() if email["ai_generated"])
-    
-    category_counts = {}
-    for email in bot.email_history.values():
-        cat = email["category"]
-        category_counts[cat] = category_counts.get(cat, 0) + 1
+    history = await asyncio.to_thread(bot.email_log.stats)
+    delivery = await asyncio.to_thread(mail_sender.stats)
     
     return {
-        "total_emails": total_emails,
-        "ai_generated": ai_generated,
-        "category_distribution": category_counts,
-        "last_24h": len([e for e in bot.email_history.values() 
-                         if e["timestamp"] > datetime.now() - timedelta(days=1)])
+        **history,
+        "categorization": {
+            **bot.categorization_batcher.stats(),
+            "single_call_fallbacks": bot.batch_fallbacks
+        },
+        "local_classifier": bot.local_categorizer.stats(),
+        "reply_cache": bot.reply_cache.stats(),
+        "delivery": delivery,
+        "inbound": inbox.stats(),
+        "upstreams": upstream_stats()
     }
 
+async def warm_up():
+    """Load the local classifier and import the OpenAI SDK in the background, then report ready"""
+    try:
+        await asyncio.gather(asyncio.to_thread(bot.local_categorizer.warm_up), asyncio.to_thread(llm.warm_up))
+    except Exception as e:
+        logger.error(f"Error warming up: {e}")
+        return
+    app.state.ready = True
+
+@app.on_event("startup")
+async def start_mail_sender():
+    """Start the email log writer and the outbox sender (which resumes unsent mail), follow the inbox and warm up"""
+    app.state.ready = False
+    app.state.warm_up_task = asyncio.create_task(warm_up())
+    bot.email_log.start()
+    mail_sender.start()
+    if inbox.enabled:
+        inbox.start()
+
+@app.on_event("shutdown")
+async def close_llm_client():
+    """Stop the inbox follower, flush the email log and release pooled OpenAI and SMTP connections"""
+    app.state.warm_up_task.cancel()
+    if inbox.enabled:
+        await inbox.stop()
+    await mail_sender.stop()
+    await bot.email_log.stop()
+    await llm.aclose()
+
 @app.get("/health")
 async def health_check():
-    """Health check endpoint"""
+    """Liveness probe: answers as soon as the server is up"""
     return {
         "status": "healthy",
         "timestamp": datetime.now().isoformat(),
         "service": "Email Automation Bot"
     }
 
+@app.get("/ready")
+async def readiness_check(response: Response):
+    """Readiness probe: 503 until the start-up warm-up has finished and the email log can issue message ids"""
+    ready = app.state.ready and bot.email_log.ready
+    if not ready:
+        response.status_code = 503
+    return {
+        "status": "ready" if ready else "warming_up",
+        "classifier_loaded": bot.local_categorizer.loaded,
+        "email_log_ready": bot.email_log.ready
+    }
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,226 @@
+"""
+Reply Cache
+MinHash/LSH lookup of earlier AI replies to near-duplicate emails in the same category
+"""
+
+import hashlib
+import os
+import random
+import re
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from typing import Dict, List, Optional, Tuple
+
+MERSENNE_PRIME = (1 << 61) - 1
+IDENTIFIER_RE = re.compile(r"\b[\w-]*\d[\w-]*\b")
+WORD_RE = re.compile(r"[a-z0-9#']+")
+ADDRESS_RE = re.compile(r"\S+@\S+")
+# "Dear Jane Doe," / "Hi Sam!" at the start of a line: the words after the salutation
+GREETING_RE = re.compile(r"^[ \t]*(?:dear|hi|hello|hey)\b[ \t]+([^\n,!:;.]+)", re.IGNORECASE | re.MULTILINE)
+# "Thanks,\nJane" at the end of an email: the line after the closing
+SIGN_OFF_RE = re.compile(
+    r"^[ \t]*(?:(?:kind |best |warm )?regards|best|thanks|thank you|many thanks|sincerely|cheers)\b[^\n]*\n+[ \t]*([^\n]+)",
+    re.IGNORECASE | re.MULTILINE,
+)
+NAME_RE = re.compile(r"\b[A-Z][\w'-]+")
+NOT_NAMES = {"there", "team", "customer", "customers", "valued", "sir", "madam", "all", "everyone", "friend",
+             "support", "mr", "mrs", "ms", "dr", "hi", "hello", "hey", "dear", "thanks", "thank", "regards",
+             "best", "cheers", "sincerely", "kind", "warm", "many"}
+# Short lines of capitalised words at the end of an email, such as a bare "John Smith" signature
+SIGNATURE_LINES = 3
+SIGNATURE_MAX_WORDS = 4
+
+
+def _mentions(text: str, detail: str) -> bool:
+    return re.search(rf"(?<![\w@.]){re.escape(detail)}(?![\w@])", text) is not None
+
+
+class ReplyCache:
+    """Near-duplicate reply reuse for high-volume categories.
+
+    Each email is normalised (lowercased, identifiers such as order numbers
+    replaced by ``#``), cut into word shingles and summarised by a MinHash
+    signature. Only the first ``max_chars`` characters are shingled, which
+    bounds the cost of a lookup however long the email is. LSH bands find candidate earlier emails in the same category
+    without comparing against all of them, and a candidate is used only if
+    its estimated Jaccard similarity reaches ``threshold``.
+
+    A reused reply is adapted by swapping the identifiers of the earlier
+    email for those of the new one. If the earlier reply quotes identifiers
+    that cannot be mapped one-to-one, the hit is rejected rather than
+    answering with someone else's order number. Names and email addresses
+    are not swapped: a reply that quotes an address, or a name of the
+    earlier sender (from the From header, the greeting, the signature or any
+    capitalised word the reply repeats from the email), is only reused for
+    an email that contains the same details.
+    """
+
+    def __init__(
+        self,
+        threshold: Optional[float] = None,
+        num_perm: int = 64,
+        bands: Optional[int] = None,
+        shingle_size: int = 3,
+        max_entries: Optional[int] = None,
+        ttl: Optional[float] = None,
+        max_chars: Optional[int] = None,
+        seed: int = 1,
+    ):
+        self.threshold = threshold or float(os.getenv('REPLY_CACHE_THRESHOLD', '0.85'))
+        self.bands = bands or int(os.getenv('REPLY_CACHE_BANDS', '8'))
+        if num_perm % self.bands:
+            raise ValueError(f"num_perm {num_perm} is not divisible by {self.bands} bands")
+        self.rows = num_perm // self.bands
+        self.shingle_size = shingle_size
+        self.max_entries = max_entries or int(os.getenv('REPLY_CACHE_MAX_ENTRIES', '5000'))
+        self.ttl = ttl or float(os.getenv('REPLY_CACHE_TTL', str(7 * 24 * 3600)))
+        self.max_chars = max_chars or int(os.getenv('REPLY_CACHE_MAX_CHARS', '4000'))
+        rng = random.Random(seed)
+        self._perms = [(rng.randrange(1, MERSENNE_PRIME), rng.randrange(0, MERSENNE_PRIME)) for _ in range(num_perm)]
+        # entry id -> (category, signature, identifiers, reply, created_at, personal details), least recently used first
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()
+        self._buckets: Dict[tuple, set] = defaultdict(set)  # (category, band, band signature) -> entry ids
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.lookups = 0
+        self.hits = 0
+        self.adapted_hits = 0
+        self.rejected = 0
+        self.rejected_personal = 0
+        self.evictions = 0
+        self.saved_llm_seconds = 0.0
+        self._llm_seconds = 0.0  # running average cost of the generation a hit avoids
+
+    def _normalise(self, content: str) -> Tuple[List[str], List[str]]:
+        # Identifiers come from the whole email so none quoted in a reply is left unmapped
+        identifiers = IDENTIFIER_RE.findall(content)
+        words = WORD_RE.findall(IDENTIFIER_RE.sub("#", content[:self.max_chars].lower()))
+        return words, identifiers
+
+    @staticmethod
+    def _personal_details(content: str, reply: str, sender_name: str = "") -> Tuple[str, ...]:
+        """Names and addresses in ``reply`` that belong to whoever wrote ``content``"""
+        details = set(ADDRESS_RE.findall(reply))
+        lines = [line.strip() for line in content.splitlines() if line.strip()]
+        signature = [line for line in lines[-SIGNATURE_LINES:]
+                     if len(line.split()) <= SIGNATURE_MAX_WORDS and all(w[:1].isupper() for w in line.split())]
+        sources = GREETING_RE.findall(reply) + SIGN_OFF_RE.findall(content) + signature + [sender_name]
+        names = set(NAME_RE.findall(" ".join(sources)))
+        # Any other capitalised word the reply repeats from the email, unless it just starts a sentence
+        for match in NAME_RE.finditer(reply):
+            before = reply[:match.start()].rstrip()
+            starts_sentence = not before or before[-1] in ".!?:\n"
+            if not starts_sentence or reply[match.end():match.end() + 1] == ",":
+                names.add(match.group(0))
+        for name in names:
+            if name.lower() not in NOT_NAMES and _mentions(reply, name) and (
+                    _mentions(content, name) or name in sender_name):
+                details.add(name)
+        return tuple(sorted(details))
+
+    def signature(self, words: List[str]) -> Tuple[int, ...]:
+        size = self.shingle_size
+        shingles = {" ".join(words[i:i + size]) for i in range(max(1, len(words) - size + 1))}
+        hashes = [int.from_bytes(hashlib.blake2b(s.encode(), digest_size=8).digest(), "big") for s in shingles]
+        return tuple(min((a * h + b) % MERSENNE_PRIME for h in hashes) for a, b in self._perms)
+
+    def _band_keys(self, category: str, signature: Tuple[int, ...]) -> List[tuple]:
+        rows = self.rows
+        return [(category, band, hash(signature[band * rows:(band + 1) * rows])) for band in range(self.bands)]
+
+    @staticmethod
+    def similarity(left: Tuple[int, ...], right: Tuple[int, ...]) -> float:
+        return sum(a == b for a, b in zip(left, right)) / len(left)
+
+    def lookup(self, category: str, content: str, sender_name: str = "") -> Optional[str]:
+        """Adapted earlier reply for a near-duplicate email, or None"""
+        words, identifiers = self._normalise(content)
+        signature = self.signature(words)
+        now = time.time()
+        with self._lock:
+            self.lookups += 1
+            candidates = set()
+            for key in self._band_keys(category, signature):
+                candidates.update(self._buckets.get(key, ()))
+            best, best_score = None, 0.0
+            for entry_id in candidates:
+                entry = self._entries[entry_id]
+                if now - entry[4] > self.ttl:
+                    continue
+                score = self.similarity(signature, entry[1])
+                if score > best_score:
+                    best, best_score = entry_id, score
+            if best is None or best_score < self.threshold:
+                return None
+            _, _, old_identifiers, reply, _, personal = self._entries[best]
+            if any(not _mentions(content, detail) and detail not in sender_name for detail in personal):
+                self.rejected_personal += 1
+                return None
+            adapted = self._adapt(reply, old_identifiers, identifiers)
+            if adapted is None:
+                self.rejected += 1
+                return None
+            self._entries.move_to_end(best)
+            self.hits += 1
+            self.adapted_hits += adapted != reply
+            self.saved_llm_seconds += self._llm_seconds
+            return adapted
+
+    @staticmethod
+    def _adapt(reply: str, old: List[str], new: List[str]) -> Optional[str]:
+        quoted = [identifier for identifier in dict.fromkeys(old) if identifier in reply]
+        if not quoted:
+            return reply
+        if len(old) != len(new):
+            return None
+        mapping = {}
+        for before, after in zip(old, new):
+            if mapping.setdefault(before, after) != after:
+                return None
+        pattern = re.compile("|".join(rf"\b{re.escape(identifier)}\b" for identifier in quoted))
+        return pattern.sub(lambda match: mapping[match.group(0)], reply)
+
+    def store(self, category: str, content: str, reply: str, llm_seconds: float = 0.0, sender_name: str = ""):
+        """Remember a freshly generated reply; ``sender_name`` is the From display name, when known"""
+        words, identifiers = self._normalise(content)
+        signature = self.signature(words)
+        personal = self._personal_details(content, reply, sender_name)
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = (category, signature, identifiers, reply, time.time(), personal)
+            for key in self._band_keys(category, signature):
+                self._buckets[key].add(entry_id)
+            if llm_seconds:
+                self._llm_seconds = 0.9 * self._llm_seconds + 0.1 * llm_seconds if self._llm_seconds else llm_seconds
+            self._evict()
+
+    def _evict(self):
+        now = time.time()
+        while self._entries:
+            entry_id, entry = next(iter(self._entries.items()))
+            if len(self._entries) <= self.max_entries and now - entry[4] <= self.ttl:
+                break
+            del self._entries[entry_id]
+            for key in self._band_keys(entry[0], entry[1]):
+                bucket = self._buckets.get(key)
+                if bucket is not None:
+                    bucket.discard(entry_id)
+                    if not bucket:
+                        del self._buckets[key]
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "threshold": self.threshold,
+            "lookups": self.lookups,
+            "hits": self.hits,
+            "adapted_hits": self.adapted_hits,
+            "rejected_unadaptable": self.rejected,
+            "rejected_personal": self.rejected_personal,
+            "hit_rate": round(self.hits / self.lookups, 4) if self.lookups else 0.0,
+            "evictions": self.evictions,
+            "saved_llm_seconds": round(self.saved_llm_seconds, 1),
+        }
@@ -0,0 +1,393 @@
+"""
+SMTP Sending Engine
+Durable outbox, pooled SMTP connections, per-domain limits and retry with backoff
+"""
+
+import asyncio
+import json
+import logging
+import os
+import queue
+import random
+import re
+import smtplib
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from email.message import EmailMessage
+from email.utils import make_msgid
+from typing import Dict, List, Optional
+
+from metrics import stage
+
+logger = logging.getLogger(__name__)
+
+# CR and LF end a header line; in a subject they would fail the message or inject headers
+LINE_BREAK_RE = re.compile(r"[\r\n]+")
+
+
+class RelayUnavailable(Exception):
+    """The SMTP session could not be set up: connection, TLS or login failed.
+
+    Says nothing about the message itself, so it is never a permanent
+    failure, whatever reply code the server gave.
+    """
+
+    def __init__(self, message: str, retry_at: float):
+        super().__init__(message)
+        self.retry_at = retry_at
+
+
+class Outbox:
+    """sqlite-backed queue of outgoing mail; anything not yet sent survives a restart"""
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS outbox ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, message_id TEXT, to_addr TEXT NOT NULL, "
+            "domain TEXT NOT NULL, subject TEXT, body TEXT, status TEXT NOT NULL DEFAULT 'queued', "
+            "attempts INTEGER NOT NULL DEFAULT 0, next_attempt_at REAL NOT NULL, last_error TEXT, "
+            "created_at REAL NOT NULL, sent_at REAL)"
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(outbox)")}
+        if 'headers' not in columns:
+            # Extra headers as a JSON object; added after the first release of the outbox
+            self._conn.execute("ALTER TABLE outbox ADD COLUMN headers TEXT")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_outbox_due ON outbox(status, next_attempt_at)")
+        # Messages claimed by a process that died mid-send go back in the queue
+        self._conn.execute("UPDATE outbox SET status = 'queued' WHERE status = 'sending'")
+        self._conn.commit()
+
+    def enqueue(self, to_addr: str, subject: str, body: str, message_id: Optional[str] = None,
+                headers: Optional[Dict[str, str]] = None) -> int:
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO outbox (message_id, to_addr, domain, subject, body, headers, next_attempt_at, "
+                "created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (message_id, to_addr, to_addr.rsplit('@', 1)[-1].lower(), subject, body,
+                 json.dumps(headers) if headers else None, now, now)
+            )
+            self._conn.commit()
+            return cursor.lastrowid
+
+    def claim_due(self, limit: int) -> List[dict]:
+        """Mark up to ``limit`` due messages as sending and return them"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, message_id, to_addr, domain, subject, body, attempts, headers FROM outbox "
+                "WHERE status = 'queued' AND next_attempt_at <= ? ORDER BY next_attempt_at LIMIT ?",
+                (time.time(), limit)
+            ).fetchall()
+            if rows:
+                self._conn.executemany("UPDATE outbox SET status = 'sending' WHERE id = ?", [(r[0],) for r in rows])
+                self._conn.commit()
+        keys = ("id", "message_id", "to_addr", "domain", "subject", "body", "attempts")
+        return [dict(zip(keys, row), headers=json.loads(row[7]) if row[7] else {}) for row in rows]
+
+    def mark_sent(self, outbox_id: int):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE outbox SET status = 'sent', sent_at = ?, body = NULL WHERE id = ?", (time.time(), outbox_id)
+            )
+            self._conn.commit()
+
+    def mark_retry(self, outbox_id: int, attempts: int, next_attempt_at: float, error: str):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE outbox SET status = 'queued', attempts = ?, next_attempt_at = ?, last_error = ? WHERE id = ?",
+                (attempts, next_attempt_at, error, outbox_id)
+            )
+            self._conn.commit()
+
+    def mark_failed(self, outbox_id: int, attempts: int, error: str):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE outbox SET status = 'failed', attempts = ?, last_error = ? WHERE id = ?",
+                (attempts, error, outbox_id)
+            )
+            self._conn.commit()
+
+    def counts(self) -> Dict[str, int]:
+        """Messages still queued, in flight or failed; sent rows are left out so this stays an index range scan"""
+        with self._lock:
+            return dict(self._conn.execute(
+                "SELECT status, COUNT(*) FROM outbox WHERE status IN ('queued', 'sending', 'failed') GROUP BY status"
+            ).fetchall())
+
+
+class SMTPConnectionPool:
+    """Persistent, authenticated SMTP sessions reused across many messages.
+
+    Each sending thread checks a session out, so the pool never holds more
+    connections than there are threads. Sessions are recycled after
+    ``max_messages`` sends because many providers cap messages per session.
+    When a session cannot be opened, further attempts fail fast with
+    ``RelayUnavailable`` until an exponentially growing backoff has passed,
+    so an outage or a bad password does not cost one connection per message.
+    """
+
+    def __init__(self, host: str, port: int, username: Optional[str], password: Optional[str],
+                 use_tls: bool, max_messages: int = 100, timeout: float = 30,
+                 backoff_base: float = 5, backoff_max: float = 300):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.max_messages = max_messages
+        self.timeout = timeout
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._connect_failures = 0
+        self._unavailable_until = 0.0
+        self._last_error = ''
+        self.connections_opened = 0
+        self.connect_errors = 0
+
+    def _connect(self) -> list:
+        with self._lock:
+            if time.time() < self._unavailable_until:
+                raise RelayUnavailable(f"relay backing off: {self._last_error}", self._unavailable_until)
+        smtp = None
+        try:
+            smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+            smtp.ehlo()
+            if self.use_tls:
+                smtp.starttls()
+                smtp.ehlo()
+            if self.username:
+                smtp.login(self.username, self.password or '')
+        except (smtplib.SMTPException, OSError) as e:
+            if smtp is not None:
+                smtp.close()
+            with self._lock:
+                self.connect_errors += 1
+                self._connect_failures += 1
+                delay = min(self.backoff_base * 2 ** (self._connect_failures - 1), self.backoff_max)
+                self._unavailable_until = time.time() + delay * random.uniform(0.8, 1.2)
+                self._last_error = f"{type(e).__name__}: {e}"
+                raise RelayUnavailable(self._last_error, self._unavailable_until) from e
+        with self._lock:
+            self._connect_failures = 0
+            self.connections_opened += 1
+        return [smtp, 0]
+
+    def _checkout(self) -> list:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            return self._connect()
+
+    @staticmethod
+    def _close(conn: list):
+        try:
+            conn[0].quit()
+        except (smtplib.SMTPException, OSError):
+            conn[0].close()
+
+    def send(self, message: EmailMessage):
+        """Send on a pooled session, reconnecting once if the server dropped it"""
+        conn = self._checkout()
+        try:
+            try:
+                conn[0].send_message(message)
+            except smtplib.SMTPServerDisconnected:
+                conn = self._connect()
+                conn[0].send_message(message)
+        except (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused):
+            # The server answered and smtplib already reset the transaction; the session is still good
+            self._idle.put(conn)
+            raise
+        except Exception:
+            self._close(conn)
+            raise
+        conn[1] += 1
+        if conn[1] >= self.max_messages:
+            self._close(conn)
+        else:
+            self._idle.put(conn)
+
+    def close_all(self):
+        while True:
+            try:
+                self._close(self._idle.get_nowait())
+            except queue.Empty:
+                return
+
+
+class DomainLimiter:
+    """Per-recipient-domain concurrency cap and token-bucket rate limit"""
+
+    def __init__(self, concurrency: int, rate_per_second: float):
+        self.concurrency = concurrency
+        self.rate = rate_per_second
+        self._slots: Dict[str, asyncio.Semaphore] = {}
+        self._buckets: Dict[str, list] = {}  # domain -> [tokens, last_refill]
+
+    @asynccontextmanager
+    async def slot(self, domain: str):
+        semaphore = self._slots.setdefault(domain, asyncio.Semaphore(self.concurrency))
+        async with semaphore:
+            await self._take_token(domain)
+            yield
+
+    async def _take_token(self, domain: str):
+        bucket = self._buckets.setdefault(domain, [self.rate, time.monotonic()])
+        while True:
+            now = time.monotonic()
+            bucket[0] = min(self.rate, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+                return
+            await asyncio.sleep((1 - bucket[0]) / self.rate)
+
+
+class MailSender:
+    """Drains the outbox through the SMTP pool until stopped"""
+
+    def __init__(self):
+        self.from_addr = os.getenv('EMAIL_FROM') or os.getenv('EMAIL_USERNAME') or 'noreply@localhost'
+        port = int(os.getenv('EMAIL_PORT', '587'))
+        self.pool_size = int(os.getenv('SMTP_POOL_SIZE', '8'))
+        self.max_attempts = int(os.getenv('SMTP_MAX_ATTEMPTS', '5'))
+        self.retry_base = float(os.getenv('SMTP_RETRY_BASE_SECONDS', '30'))
+        self.retry_max = float(os.getenv('SMTP_RETRY_MAX_SECONDS', '3600'))
+        self.outbox = Outbox(os.getenv('OUTBOX_DB', '/tmp/email_outbox.sqlite3'))
+        self.pool = SMTPConnectionPool(
+            host=os.getenv('EMAIL_SERVER', 'localhost'),
+            port=port,
+            username=os.getenv('EMAIL_USERNAME'),
+            password=os.getenv('EMAIL_PASSWORD'),
+            use_tls=os.getenv('SMTP_USE_TLS', 'true' if port == 587 else 'false').lower() == 'true',
+            max_messages=int(os.getenv('SMTP_MESSAGES_PER_CONNECTION', '100')),
+        )
+        self.limiter = DomainLimiter(
+            concurrency=int(os.getenv('SMTP_DOMAIN_CONCURRENCY', '4')),
+            rate_per_second=float(os.getenv('SMTP_DOMAIN_RATE', '20')),
+        )
+        self._executor = ThreadPoolExecutor(max_workers=self.pool_size, thread_name_prefix='smtp')
+        self._wake: Optional[asyncio.Event] = None
+        self._pending: Optional[asyncio.Semaphore] = None
+        self._tasks = set()
+        self._dispatcher: Optional[asyncio.Task] = None
+        self.sent = 0
+        self.retried = 0
+        self.deferred = 0
+        self.failed = 0
+
+    def build_message(self, item: dict) -> EmailMessage:
+        message = EmailMessage()
+        message['From'] = self.from_addr
+        message['To'] = item['to_addr']
+        message['Subject'] = item['subject'] or ''
+        message['Message-ID'] = make_msgid(idstring=str(item['id']))
+        for name, value in item.get('headers', {}).items():
+            message[name] = value
+        message.set_content(item['body'] or '')
+        return message
+
+    async def submit(self, to_addr: str, subject: str, body: str, message_id: Optional[str] = None,
+                     headers: Optional[Dict[str, str]] = None) -> int:
+        """Durably queue a message, with any extra headers (In-Reply-To, Auto-Submitted), and wake the dispatcher"""
+        if LINE_BREAK_RE.search(to_addr):
+            raise ValueError("Recipient address contains a line break")
+        subject = LINE_BREAK_RE.sub(" ", subject or "")
+        headers = {name: LINE_BREAK_RE.sub(" ", value) for name, value in (headers or {}).items()}
+        outbox_id = await asyncio.to_thread(self.outbox.enqueue, to_addr, subject, body, message_id, headers)
+        if self._wake is not None:
+            self._wake.set()
+        return outbox_id
+
+    def start(self):
+        self._wake = asyncio.Event()
+        self._pending = asyncio.Semaphore(self.pool_size * 4)
+        self._dispatcher = asyncio.ensure_future(self._dispatch_loop())
+
+    async def stop(self):
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+        if self._tasks:
+            await asyncio.wait(self._tasks, timeout=30)
+        await asyncio.to_thread(self.pool.close_all)
+        self._executor.shutdown(wait=False)
+
+    async def _dispatch_loop(self):
+        while True:
+            try:
+                batch = await asyncio.to_thread(self.outbox.claim_due, self.pool_size * 4)
+            except Exception as e:
+                logger.error(f"Error reading outbox: {e}")
+                batch = []
+            if not batch:
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout=1.0)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            for item in batch:
+                await self._pending.acquire()
+                task = asyncio.ensure_future(self._deliver(item))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+
+    async def _deliver(self, item: dict):
+        attempts = item['attempts'] + 1
+        try:
+            async with self.limiter.slot(item['domain']), stage('smtp_send', upstream='smtp'):
+                await asyncio.get_running_loop().run_in_executor(
+                    self._executor, self.pool.send, self.build_message(item)
+                )
+            await asyncio.to_thread(self.outbox.mark_sent, item['id'])
+            self.sent += 1
+        except RelayUnavailable as e:
+            # Not the message's fault: keep it queued without using up an attempt
+            await asyncio.to_thread(
+                self.outbox.mark_retry, item['id'], item['attempts'], e.retry_at + random.uniform(0, 1), str(e)
+            )
+            self.deferred += 1
+        except smtplib.SMTPResponseException as e:
+            # Only reached for replies to the message itself (MAIL, RCPT, DATA); session setup raises above
+            await self._handle_failure(item, attempts, f"{e.smtp_code} {e.smtp_error!r}", permanent=e.smtp_code >= 500)
+        except smtplib.SMTPRecipientsRefused as e:
+            await self._handle_failure(item, attempts, str(e.recipients), permanent=True)
+        except (smtplib.SMTPException, OSError) as e:
+            await self._handle_failure(item, attempts, str(e), permanent=False)
+        except Exception as e:
+            # Anything else (a message that cannot be built, say) will not go better on a retry
+            await self._handle_failure(item, attempts, f"{type(e).__name__}: {e}", permanent=True)
+        finally:
+            self._pending.release()
+
+    async def _handle_failure(self, item: dict, attempts: int, error: str, permanent: bool):
+        if permanent or attempts >= self.max_attempts:
+            logger.error(f"Giving up on email {item['id']} to {item['to_addr']}: {error}")
+            await asyncio.to_thread(self.outbox.mark_failed, item['id'], attempts, error)
+            self.failed += 1
+            return
+        delay = min(self.retry_base * 2 ** (attempts - 1), self.retry_max) * random.uniform(0.5, 1.5)
+        logger.warning(f"Retrying email {item['id']} in {delay:.0f}s: {error}")
+        await asyncio.to_thread(self.outbox.mark_retry, item['id'], attempts, time.time() + delay, error)
+        self.retried += 1
+
+    def stats(self) -> dict:
+        return {
+            "sent": self.sent,
+            "retried": self.retried,
+            "deferred": self.deferred,
+            "failed": self.failed,
+            "in_flight": len(self._tasks),
+            "connections_opened": self.pool.connections_opened,
+            "connect_errors": self.pool.connect_errors,
+            "outbox": self.outbox.counts(),
+        }
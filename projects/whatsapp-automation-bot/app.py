@@ -6,13 +6,21 @@ A comprehensive business automation solution for WhatsApp
 
 from flask import Flask, request, jsonify
 from flask_cors import CORS
-import openai
 import os
 from dotenv import load_dotenv
 import json
 import logging
+import requests
+import threading
 from datetime import datetime
 
+from context_builder import ContextBuilder
+from conversation_store import create_conversation_store
+from faq_index import FAQIndex
+from job_queue import JobQueue
+from metrics import instrument_flask, stage
+from resilience import UpstreamUnavailable, deadline, get_upstream, upstream_stats
+
 # Load environment variables
 load_dotenv()
 
@@ -22,98 +30,197 @@ logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
 CORS(app)
+instrument_flask(app)
+
+# "sync" answers in the webhook response; "queue" acks at once and replies from workers
+WEBHOOK_MODE = os.getenv('WEBHOOK_MODE', 'sync')
+# "background" builds the FAQ index and loads the OpenAI SDK after start-up; "eager" does it on import
+# (gunicorn.conf.py forces eager when the app is preloaded, so forked workers start warm)
+WARMUP_MODE = os.getenv('WARMUP_MODE', 'background')
+# Upper bound on OpenAI time per reply, retries included
+RESPONSE_DEADLINE = float(os.getenv('WHATSAPP_RESPONSE_DEADLINE', '20'))
+
+SYSTEM_PROMPT = "You are a helpful business assistant. Be professional, friendly, and concise."
+
+openai_upstream = get_upstream('openai')
+# Sending is not idempotent (a retry could deliver the message twice), so it is never retried or hedged
+whatsapp_upstream = get_upstream('whatsapp', timeout=10)
 
-# Configure OpenAI
-openai.api_key = os.getenv('OPENAI_API_KEY')
+_openai_client = None
+_openai_lock = threading.Lock()
+
+def get_openai_client():
+    """Shared OpenAI client, created on first use; the SDK import is a large share of start-up time"""
+    global _openai_client
+    if _openai_client is None:
+        with _openai_lock:
+            if _openai_client is None:
+                from openai import OpenAI
+                # Retries and timeouts come from openai_upstream rather than the SDK
+                _openai_client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'), timeout=30, max_retries=0)
+    return _openai_client
+
+WHATSAPP_API_URL = os.getenv('WHATSAPP_API_URL', 'https://graph.facebook.com/v17.0')
+
+def summarize_conversation(summary, turns, max_tokens):
+    """Fold older turns into the user's running summary (runs on the context builder's background threads)"""
+    transcript = "\n".join(f"User: {turn['user']}\nBot: {turn['bot']}" for turn in turns)
+    if summary:
+        transcript = f"Summary so far: {summary}\n{transcript}"
+    with deadline(RESPONSE_DEADLINE):
+        response = openai_upstream.call(
+            lambda timeout: get_openai_client().chat.completions.create(
+                model="gpt-3.5-turbo",
+                messages=[
+                    {"role": "system", "content": "Summarize this customer conversation for the assistant's memory. "
+                                                  "Keep names, orders, requests and open questions; be brief."},
+                    {"role": "user", "content": transcript}
+                ],
+                max_tokens=max_tokens,
+                temperature=0,
+                timeout=timeout
+            ),
+            stage_name='llm_summary'
+        )
+    return response.choices[0].message.content
 
 class WhatsAppBot:
     def __init__(self):
-        self.conversation_history = {}
-        self.faq_database = self.load_faq_database()
+        self.conversation_history = create_conversation_store()
+        self.context = ContextBuilder(self.conversation_history, SYSTEM_PROMPT, summarize_conversation)
+        self.faq_index = FAQIndex('faq_database.json', self.load_faq_database, lazy=True)
     
     def load_faq_database(self):
         """Load FAQ database from JSON file"""
         try:
             with open('faq_database.json', 'r') as f:
                 return json.load(f)
-            except FileNotFoundError:
-                return {
-                    "general": [
-                        {"question": "What are your business hours?", "answer": "We're open 24/7 for online support!"},
-                        {"question": "How can I contact support?", "answer": "You can reach us through this WhatsApp number or email us at support@company.com"}
-                    ]
-                }
+        except FileNotFoundError:
+            return {
+                "general": [
+                    {"question": "What are your business hours?", "answer": "We're open 24/7 for online support!"},
+                    {"question": "How can I contact support?", "answer": "You can reach us through this WhatsApp number or email us at support@company.com"}
+                ]
+            }
     
     def generate_response(self, message, user_id):
-        """Generate intelligent response using OpenAI"""
+        """Generate intelligent response, answering known FAQs without calling OpenAI"""
+        with stage('faq_match'):
+            faq_answer = self.faq_index.match(message)
+        if faq_answer is not None:
+            self.update_conversation_history(user_id, message, faq_answer)
+            return faq_answer
+        
         try:
             # Build conversation context
-            context = self.get_conversation_context(user_id, message)
+            prompt = self.get_conversation_context(user_id, message)
             
-            response = openai.ChatCompletion.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": "You are a helpful business assistant. Be professional, friendly, and concise."},
-                    {"role": "user", "content": context}
-                ],
-                max_tokens=150,
-                temperature=0.7
-            )
+            with deadline(RESPONSE_DEADLINE):
+                response = openai_upstream.call(
+                    lambda timeout: get_openai_client().chat.completions.create(
+                        model="gpt-3.5-turbo",
+                        messages=prompt.messages,
+                        max_tokens=150,
+                        temperature=0.7,
+                        timeout=timeout
+                    ),
+                    stage_name='llm'
+                )
             
             response_text = response.choices[0].message.content
-            self.update_conversation_history(user_id, message, response_text)
+            self.update_conversation_history(user_id, prompt.message, response_text, prompt.message_tokens)
             
             return response_text
             
+        except UpstreamUnavailable as e:
+            # OpenAI is down, saturated or too slow: answer at once instead of waiting on it
+            logger.warning(f"Not generating response: {e}")
+            return "I apologize, but I'm experiencing technical difficulties. Please try again later."
         except Exception as e:
             logger.error(f"Error generating response: {e}")
             return "I apologize, but I'm experiencing technical difficulties. Please try again later."
     
     def get_conversation_context(self, user_id, current_message):
-        """Get conversation context for better responses"""
-        if user_id in self.conversation_history:
-            recent_messages = self.conversation_history[user_id][-5:]  # Last 5 messages
-            context = "\n".join([f"User: {msg['user']}\nBot: {msg['bot']}" for msg in recent_messages])
-            return f"{context}\nUser: {current_message}"
-        return f"User: {current_message}"
+        """Chat messages for the reply: summary, recent turns and the current message within CONTEXT_TOKEN_BUDGET"""
+        return self.context.build(user_id, current_message)
     
-    def update_conversation_history(self, user_id, user_message, bot_response):
-        """Update conversation history"""
-        if user_id not in self.conversation_history:
-            self.conversation_history[user_id] = []
-        
-        self.conversation_history[user_id].append({
-            'user': user_message,
-            'bot': bot_response,
-            'timestamp': datetime.now().isoformat()
-        })
-        
-        # Keep only last 10 messages
-        if len(self.conversation_history[user_id]) > 10:
-            self.conversation_history[user_id] = self.conversation_history[user_id][-10:]
+    def update_conversation_history(self, user_id, user_message, bot_response, message_tokens=None):
+        """Update conversation history; the store keeps only the last few turns per user"""
+        self.context.record(user_id, user_message, bot_response, message_tokens)
+
+def send_whatsapp_message(user_id, text):
+    """Send a text reply through the WhatsApp Business API"""
+    def send(timeout):
+        response = requests.post(
+            f"{WHATSAPP_API_URL}/{os.getenv('WHATSAPP_PHONE_NUMBER')}/messages",
+            headers={'Authorization': f"Bearer {os.getenv('WHATSAPP_API_KEY')}"},
+            json={
+                'messaging_product': 'whatsapp',
+                'to': user_id,
+                'type': 'text',
+                'text': {'body': text}
+            },
+            timeout=timeout
+        )
+        response.raise_for_status()
+    
+    whatsapp_upstream.call(send, stage_name='whatsapp_send', idempotent=False)
+
+def process_queued_message(job):
+    """Worker-side handling of a queued webhook message"""
+    response = bot.generate_response(job['text'], job['user_id'])
+    send_whatsapp_message(job['user_id'], response)
+
+def warm_up():
+    """Build the FAQ index, load the tokenizer and create the OpenAI client; /ready answers 503 until then"""
+    try:
+        bot.faq_index.warm_up()
+        bot.context.counter.load()
+        get_openai_client()
+    except Exception as e:
+        logger.error(f"Error warming up: {e}")
+        return
+    warmed_up.set()
 
 # Initialize bot
 bot = WhatsAppBot()
+job_queue = JobQueue(process_queued_message) if WEBHOOK_MODE == 'queue' else None
+warmed_up = threading.Event()
+if WARMUP_MODE == 'eager':
+    warm_up()
+else:
+    threading.Thread(target=warm_up, name='warm-up', daemon=True).start()
 
 @app.route('/webhook', methods=['POST'])
 def webhook():
     """Webhook endpoint for WhatsApp messages"""
     try:
         data = request.get_json()
-        logger.info(f"Received webhook data: {data}")
         
         # Extract message details
         message = data.get('message', {})
         user_id = message.get('from', 'unknown')
         text = message.get('text', {}).get('body', '')
+        message_id = message.get('id', '')
+        # Message contents stay out of the INFO log
+        logger.info(f"Received webhook message {message_id} from {user_id}")
+        
+        if text and job_queue is not None:
+            # Acknowledge right away; a worker generates and sends the reply
+            accepted = job_queue.enqueue(message_id, user_id, text)
+            return jsonify({
+                'status': 'queued' if accepted else 'duplicate',
+                'message_id': message_id,
+                'user_id': user_id
+            }), 202 if accepted else 200
         
         if text:
             # Generate response
             response = bot.generate_response(text, user_id)
             
             # Log interaction
-            logger.info(f"User {user_id}: {text}")
-            logger.info(f"Bot response: {response}")
+            logger.debug(f"User {user_id}: {text}")
+            logger.debug(f"Bot response: {response}")
             
             return jsonify({
                 'status': 'success',
@@ -129,26 +236,35 @@ def webhook():
 
 @app.route('/health', methods=['GET'])
 def health_check():
-    """Health check endpoint"""
+    """Liveness probe: answers as soon as the server is up"""
     return jsonify({
         'status': 'healthy',
         'timestamp': datetime.now().isoformat(),
         'service': 'WhatsApp Automation Bot'
     })
 
+@app.route('/ready', methods=['GET'])
+def readiness_check():
+    """Readiness probe: 503 until the start-up warm-up has finished"""
+    ready = warmed_up.is_set()
+    return jsonify({
+        'status': 'ready' if ready else 'warming_up',
+        'faq_index_built': bot.faq_index.ready
+    }), 200 if ready else 503
+
 @app.route('/stats', methods=['GET'])
 def get_stats():
     """Get bot statistics"""
-    total_conversations = len(bot.conversation_history)
-    total_messages = sum(len(conv) for conv in bot.conversation_history.values())
-    
-    return jsonify({
-        'total_conversations': total_conversations,
-        'total_messages': total_messages,
-        'active_users': len([conv for conv in bot.conversation_history.values() if conv])
-    })
+    stats = bot.conversation_history.stats()
+    stats['faq'] = bot.faq_index.stats()
+    stats['context'] = bot.context.stats()
+    stats['upstreams'] = upstream_stats()
+    if job_queue is not None:
+        stats['queue'] = job_queue.stats()
+    return jsonify(stats)
 
 if __name__ == '__main__':
+    # Development server only; production runs under gunicorn with gunicorn.conf.py
     port = int(os.environ.get('PORT', 5000))
-    app.run(host='0.0.0.0', port=port, debug=True)
+    app.run(host='0.0.0.0', port=port, debug=os.getenv('FLASK_DEBUG', 'false').lower() == 'true')
 
@@ -0,0 +1,249 @@
+"""
+Context Builder
+Token-budgeted multi-turn prompts from conversation history, with older turns folded into a running summary
+"""
+
+import logging
+import math
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, List, NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+# Chat formatting costs a few tokens per message, plus a few to prime the reply
+MESSAGE_OVERHEAD = 4
+REPLY_OVERHEAD = 3
+SUMMARY_PREFIX = "Summary of the earlier conversation: "
+
+
+class TokenCounter:
+    """Local token counts for the chat model.
+
+    Uses tiktoken when it is installed and its encoding can be loaded (the
+    Docker image bakes the encoding in). Otherwise counts are estimated from
+    UTF-8 bytes and words; the estimate errs high, so prompts
+    still stay inside the budget. The encoding is loaded on first use, not
+    on import.
+    """
+
+    def __init__(self, model: str = 'gpt-3.5-turbo'):
+        self.model = model
+        self._encoder = None
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def load(self):
+        if self._loaded:
+            return self._encoder
+        with self._lock:
+            if not self._loaded:
+                try:
+                    import tiktoken
+                    self._encoder = tiktoken.encoding_for_model(self.model)
+                except Exception as e:
+                    logger.warning(f"tiktoken unavailable, estimating token counts: {e}")
+                self._loaded = True
+        return self._encoder
+
+    @property
+    def name(self) -> str:
+        if not self._loaded:
+            return 'not loaded'
+        return 'tiktoken' if self._encoder is not None else 'estimate'
+
+    @staticmethod
+    def estimate(text: str) -> int:
+        # BPE averages about four bytes a token on English and fewer on other scripts
+        return max(len(text.split()), math.ceil(len(text.encode('utf-8')) / 3))
+
+    def count(self, text: str) -> int:
+        encoder = self.load()
+        if encoder is not None:
+            return len(encoder.encode(text, disallowed_special=()))
+        return self.estimate(text)
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """The longest prefix of ``text`` within ``max_tokens``"""
+        encoder = self.load()
+        if encoder is not None:
+            tokens = encoder.encode(text, disallowed_special=())
+            return text if len(tokens) <= max_tokens else encoder.decode(tokens[:max_tokens])
+        if self.estimate(text) <= max_tokens:
+            return text
+        text = text.encode('utf-8')[:max_tokens * 3].decode('utf-8', 'ignore')
+        while text and self.estimate(text) > max_tokens:
+            text = text[:len(text) * 9 // 10]
+        return text
+
+
+class Prompt(NamedTuple):
+    messages: List[dict]
+    tokens: int  # the whole prompt, formatting overhead included
+    message: str  # the current message as sent, after any truncation
+    message_tokens: int
+    turns: int  # earlier turns included verbatim
+
+
+class ContextBuilder:
+    """Chat messages for one reply, kept under a fixed token budget.
+
+    A prompt is the system prompt, the user's running summary, as many of
+    the turns since that summary as fit (newest first) and the current
+    message cut to ``max_message_tokens``. Each turn's token count is stored
+    with the turn when it is recorded, so building a prompt adds up cached
+    numbers instead of re-tokenizing the history.
+
+    Turns beyond the newest ``max_turns``, and any that did not fit, are
+    folded into the summary by ``summarize(summary, turns, max_tokens)`` on
+    a background thread once ``summary_batch`` of them have built up, so a
+    long conversation costs one summary call every few messages. Replies
+    never wait on it; turns stay in the prompt while they fit until the new
+    summary replaces them. A fold is also forced once the store's ring
+    buffer is nearly full, so turns are summarized before the store drops
+    them.
+    """
+
+    def __init__(
+        self,
+        store,
+        system_prompt: str,
+        summarize: Callable[[str, List[dict], int], str],
+        counter: Optional[TokenCounter] = None,
+        token_budget: Optional[int] = None,
+        max_turns: Optional[int] = None,
+        max_message_tokens: Optional[int] = None,
+        summary_tokens: Optional[int] = None,
+        summary_batch: Optional[int] = None,
+        workers: Optional[int] = None,
+        max_pending: Optional[int] = None,
+    ):
+        self.store = store
+        self.system_prompt = system_prompt
+        self.summarize = summarize
+        self.counter = counter or TokenCounter()
+        self.token_budget = token_budget or int(os.getenv('CONTEXT_TOKEN_BUDGET', '1200'))
+        self.max_message_tokens = max_message_tokens or int(os.getenv('CONTEXT_MAX_MESSAGE_TOKENS', '400'))
+        self.summary_tokens = summary_tokens or int(os.getenv('CONTEXT_SUMMARY_TOKENS', '200'))
+        max_turns = max_turns or int(os.getenv('CONTEXT_MAX_TURNS', '6'))
+        self.max_turns = max(0, min(max_turns, store.max_turns - 1))
+        self.summary_batch = summary_batch or int(os.getenv('CONTEXT_SUMMARY_BATCH', '3'))
+        self.workers = workers or int(os.getenv('CONTEXT_SUMMARY_WORKERS', '2'))
+        # Users waiting for a summary; past this, overflow waits for a later message to be scheduled
+        self.max_pending = max_pending or int(os.getenv('CONTEXT_SUMMARY_QUEUE', '1000'))
+        self._system_tokens = None
+        self._executor = None
+        self._pending = set()
+        self._lock = threading.Lock()
+        self.prompts = 0
+        self.prompt_tokens = 0
+        self.max_prompt_tokens = 0
+        self.truncated = 0
+        self.summaries = 0
+        self.summary_failures = 0
+
+    def turn_tokens(self, turn: dict) -> int:
+        tokens = turn.get('tokens')
+        if tokens is None:
+            # Turns recorded before token counts were stored
+            tokens = self.counter.count(turn['user']) + self.counter.count(turn['bot']) + 2 * MESSAGE_OVERHEAD
+        return tokens
+
+    def build(self, user_id: str, message: str) -> Prompt:
+        if self._system_tokens is None:
+            self._system_tokens = self.counter.count(self.system_prompt) + MESSAGE_OVERHEAD
+        room = self.token_budget - self._system_tokens - REPLY_OVERHEAD - MESSAGE_OVERHEAD
+        message_tokens = self.counter.count(message)
+        limit = max(0, min(self.max_message_tokens, room))
+        if message_tokens > limit:
+            message = self.counter.truncate(message, limit)
+            message_tokens = self.counter.count(message)
+            self.truncated += 1
+        room -= message_tokens
+
+        messages = [{"role": "system", "content": self.system_prompt}]
+        summary = self.store.summary(user_id)
+        turns = self.store.recent(user_id, self.store.max_turns)
+        if summary is not None:
+            turns = [turn for turn in turns if turn.get('timestamp', '') > summary['through']]
+            if summary['tokens'] <= room:
+                messages.append({"role": "system", "content": SUMMARY_PREFIX + summary['text']})
+                room -= summary['tokens']
+
+        kept = []
+        for turn in reversed(turns):
+            tokens = self.turn_tokens(turn)
+            if tokens > room:
+                break
+            kept.append(turn)
+            room -= tokens
+        kept.reverse()
+        for turn in kept:
+            messages.append({"role": "user", "content": turn['user']})
+            messages.append({"role": "assistant", "content": turn['bot']})
+        messages.append({"role": "user", "content": message})
+
+        fold = turns[:max(len(turns) - len(kept), len(turns) - self.max_turns)]
+        if fold and (len(fold) >= self.summary_batch or len(turns) >= self.store.max_turns - 1):
+            self._schedule(user_id, summary, fold)
+
+        tokens = self.token_budget - room
+        self.prompts += 1
+        self.prompt_tokens += tokens
+        self.max_prompt_tokens = max(self.max_prompt_tokens, tokens)
+        return Prompt(messages, tokens, message, message_tokens, len(kept))
+
+    def record(self, user_id: str, message: str, reply: str, message_tokens: Optional[int] = None):
+        """Append a turn with its token count; messages that were not built into a prompt are truncated here"""
+        if message_tokens is None:
+            message = self.counter.truncate(message, self.max_message_tokens)
+            message_tokens = self.counter.count(message)
+        self.store.append(user_id, {
+            'user': message,
+            'bot': reply,
+            # Microseconds always included, so timestamps order correctly as strings (see ``through``)
+            'timestamp': datetime.now().isoformat(timespec='microseconds'),
+            'tokens': message_tokens + self.counter.count(reply) + 2 * MESSAGE_OVERHEAD,
+        })
+
+    def _schedule(self, user_id: str, summary: Optional[dict], turns: List[dict]):
+        with self._lock:
+            if user_id in self._pending or len(self._pending) >= self.max_pending:
+                return
+            self._pending.add(user_id)
+            if self._executor is None:
+                # Created on first use so no thread exists before gunicorn forks a preloaded app
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='context-summary')
+        self._executor.submit(self._fold, user_id, summary, turns)
+
+    def _fold(self, user_id: str, summary: Optional[dict], turns: List[dict]):
+        try:
+            text = self.summarize(summary['text'] if summary else '', turns, self.summary_tokens)
+            text = self.counter.truncate(text.strip(), self.summary_tokens)
+            self.store.save_summary(user_id, {
+                'text': text,
+                'tokens': self.counter.count(SUMMARY_PREFIX + text) + MESSAGE_OVERHEAD,
+                'through': turns[-1]['timestamp'],
+            })
+            self.summaries += 1
+        except Exception as e:
+            self.summary_failures += 1
+            logger.error(f"Error summarizing conversation for {user_id}: {e}")
+        finally:
+            with self._lock:
+                self._pending.discard(user_id)
+
+    def stats(self) -> dict:
+        return {
+            'tokenizer': self.counter.name,
+            'token_budget': self.token_budget,
+            'prompts': self.prompts,
+            'avg_prompt_tokens': round(self.prompt_tokens / self.prompts, 1) if self.prompts else 0,
+            'max_prompt_tokens': self.max_prompt_tokens,
+            'truncated_messages': self.truncated,
+            'summaries': self.summaries,
+            'summary_failures': self.summary_failures,
+            'summaries_pending': len(self._pending),
+        }
@@ -0,0 +1,194 @@
+"""
+Conversation Store
+Bounded per-user conversation history and running summaries with idle eviction, in memory or in Redis
+"""
+
+import json
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Optional
+
+try:
+    import redis
+except ImportError:  # pragma: no cover - redis is optional for local runs
+    redis = None
+
+
+class MemoryConversationStore:
+    """Per-user ring buffers kept in LRU order for a single process.
+
+    Users are evicted once idle for ``ttl`` seconds or when more than
+    ``max_users`` are held; both checks only look at the least recently
+    active end, and the message total is maintained incrementally.
+    """
+
+    backend = "memory"
+
+    def __init__(self, max_turns: int, max_users: int, ttl: int):
+        self.max_turns = max_turns
+        self.max_users = max_users
+        self.ttl = ttl
+        self._users = OrderedDict()  # user_id -> (last_active, deque of turns)
+        self._summaries = {}  # user_id -> summary of turns older than the ones kept
+        self._lock = threading.Lock()
+        self.total_messages = 0
+
+    def append(self, user_id: str, turn: dict):
+        now = time.time()
+        with self._lock:
+            entry = self._users.pop(user_id, None)
+            turns = entry[1] if entry else deque(maxlen=self.max_turns)
+            if len(turns) == self.max_turns:
+                self.total_messages -= 1
+            turns.append(turn)
+            self.total_messages += 1
+            self._users[user_id] = (now, turns)
+            self._evict(now)
+
+    def recent(self, user_id: str, limit: int) -> list:
+        with self._lock:
+            entry = self._users.get(user_id)
+            if entry is None or entry[0] < time.time() - self.ttl:
+                return []
+            turns = entry[1]
+            return list(turns)[-limit:]
+
+    def summary(self, user_id: str) -> Optional[dict]:
+        with self._lock:
+            entry = self._users.get(user_id)
+            if entry is None or entry[0] < time.time() - self.ttl:
+                return None
+            return self._summaries.get(user_id)
+
+    def save_summary(self, user_id: str, summary: dict) -> bool:
+        """Store a summary unless the user is gone or a summary through a later turn is already stored"""
+        with self._lock:
+            current = self._summaries.get(user_id)
+            if user_id not in self._users or (current is not None and current['through'] >= summary['through']):
+                return False
+            self._summaries[user_id] = summary
+            return True
+
+    def _evict(self, now: float):
+        cutoff = now - self.ttl
+        while self._users:
+            user_id, (last_active, turns) = next(iter(self._users.items()))
+            if last_active >= cutoff and len(self._users) <= self.max_users:
+                break
+            del self._users[user_id]
+            self._summaries.pop(user_id, None)
+            self.total_messages -= len(turns)
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._evict(time.time())
+            return {
+                'total_conversations': len(self._users),
+                'total_messages': self.total_messages,
+                'active_users': len(self._users)
+            }
+
+
+class RedisConversationStore:
+    """Conversation history shared by every gunicorn worker.
+
+    Each user's turns live in a capped Redis list. A sorted set scored by
+    last activity drives idle and overflow eviction, and a counter key keeps
+    the message total so /stats never has to scan user lists. A user's
+    running summary is a JSON string key next to the turns.
+    """
+
+    backend = "redis"
+
+    def __init__(self, url: str, max_turns: int, max_users: int, ttl: int, prefix: str = "whatsapp:conv"):
+        self._redis = redis.Redis.from_url(url, decode_responses=True)
+        self.max_turns = max_turns
+        self.max_users = max_users
+        self.ttl = ttl
+        self.prefix = prefix
+        self.active_key = f"{prefix}:active"
+        self.messages_key = f"{prefix}:messages"
+
+    def _turns_key(self, user_id: str) -> str:
+        return f"{self.prefix}:turns:{user_id}"
+
+    def _summary_key(self, user_id: str) -> str:
+        return f"{self.prefix}:summary:{user_id}"
+
+    def append(self, user_id: str, turn: dict):
+        key = self._turns_key(user_id)
+        pipe = self._redis.pipeline()
+        pipe.rpush(key, json.dumps(turn))
+        pipe.ltrim(key, -self.max_turns, -1)
+        pipe.zadd(self.active_key, {user_id: time.time()})
+        length, _, _ = pipe.execute()
+        self._redis.incrby(self.messages_key, 1 if length <= self.max_turns else 0)
+        self._evict()
+
+    def recent(self, user_id: str, limit: int) -> list:
+        return [json.loads(turn) for turn in self._redis.lrange(self._turns_key(user_id), -limit, -1)]
+
+    def summary(self, user_id: str) -> Optional[dict]:
+        summary = self._redis.get(self._summary_key(user_id))
+        return json.loads(summary) if summary else None
+
+    def save_summary(self, user_id: str, summary: dict) -> bool:
+        """Store a summary unless one through a later turn is already stored, e.g. by another worker"""
+        key = self._summary_key(user_id)
+        with self._redis.pipeline() as pipe:
+            try:
+                pipe.watch(key)
+                current = pipe.get(key)
+                if current and json.loads(current)['through'] >= summary['through']:
+                    return False
+                pipe.multi()
+                # Expires on its own in case the user was evicted while it was being written
+                pipe.set(key, json.dumps(summary), ex=self.ttl)
+                pipe.execute()
+                return True
+            except redis.WatchError:
+                return False
+
+    def _drop(self, user_ids):
+        if not user_ids:
+            return
+        pipe = self._redis.pipeline()
+        for user_id in user_ids:
+            pipe.llen(self._turns_key(user_id))
+        lengths = pipe.execute()
+        pipe = self._redis.pipeline()
+        for user_id in user_ids:
+            pipe.delete(self._turns_key(user_id), self._summary_key(user_id))
+        pipe.zrem(self.active_key, *user_ids)
+        pipe.decrby(self.messages_key, sum(lengths))
+        pipe.execute()
+
+    def _evict(self, batch: int = 100):
+        """Remove idle users, then the least recently active ones above max_users"""
+        cutoff = time.time() - self.ttl
+        self._drop(self._redis.zrangebyscore(self.active_key, '-inf', cutoff, start=0, num=batch))
+        overflow = self._redis.zcard(self.active_key) - self.max_users
+        if overflow > 0:
+            self._drop(self._redis.zrange(self.active_key, 0, min(overflow, batch) - 1))
+
+    def stats(self) -> dict:
+        self._evict()
+        users = self._redis.zcard(self.active_key)
+        return {
+            'total_conversations': users,
+            'total_messages': int(self._redis.get(self.messages_key) or 0),
+            'active_users': users
+        }
+
+
+def create_conversation_store():
+    """Redis-backed store when REDIS_URL is set, otherwise an in-process one"""
+    max_turns = int(os.getenv('CONVERSATION_MAX_TURNS', '10'))
+    max_users = int(os.getenv('CONVERSATION_MAX_USERS', '100000'))
+    ttl = int(os.getenv('CONVERSATION_TTL', str(7 * 24 * 3600)))
+    redis_url = os.getenv('REDIS_URL', '')
+    if redis_url and redis is not None:
+        return RedisConversationStore(redis_url, max_turns, max_users, ttl)
+    return MemoryConversationStore(max_turns, max_users, ttl)
@@ -0,0 +1,121 @@
+"""
+FAQ Index
+TF-IDF similarity search over the FAQ database, answering common questions without the LLM
+"""
+
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class FAQIndex:
+    """Vectorized nearest-question lookup with hot reload.
+
+    Questions are embedded with character n-gram TF-IDF, which tolerates the
+    typos and abbreviations common in chat. Rows are L2-normalised, so one
+    sparse matrix-vector product gives the cosine similarity to every FAQ.
+    The index is rebuilt in the background when the JSON file changes and
+    swapped in atomically, so lookups never wait on a rebuild.
+
+    With ``lazy`` the first build (and the scikit-learn import) is left to
+    ``warm_up()``; until then every lookup is a miss.
+    """
+
+    def __init__(self, path, loader, threshold=None, reload_interval=None, lazy=False):
+        self.path = path
+        self.loader = loader
+        self.threshold = threshold or float(os.getenv('FAQ_MATCH_THRESHOLD', '0.7'))
+        self.reload_interval = reload_interval or float(os.getenv('FAQ_RELOAD_INTERVAL', '5'))
+        self._state = None  # (vectorizer, matrix, answers, questions)
+        self._mtime = self._current_mtime()
+        self._next_check = 0.0
+        self._reload_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+        self.ready = False
+        if not lazy:
+            self.warm_up()
+
+    def warm_up(self):
+        """First build of the index from the loader"""
+        self.build(self.loader())
+        self.ready = True
+
+    def _current_mtime(self):
+        try:
+            return os.path.getmtime(self.path)
+        except OSError:
+            return None
+
+    def build(self, faq_database):
+        """Vectorize every question and swap the new index in"""
+        questions, answers = [], []
+        for entries in faq_database.values():
+            for entry in entries:
+                questions.append(entry['question'])
+                answers.append(entry['answer'])
+        if not questions:
+            self._state = None
+            return
+        from sklearn.feature_extraction.text import TfidfVectorizer
+
+        vectorizer = TfidfVectorizer(analyzer='char_wb', ngram_range=(3, 5), sublinear_tf=True, lowercase=True)
+        matrix = vectorizer.fit_transform(questions)
+        self._state = (vectorizer, matrix, answers, questions)
+
+    def _maybe_reload(self):
+        now = time.monotonic()
+        if now < self._next_check:
+            return
+        self._next_check = now + self.reload_interval
+        mtime = self._current_mtime()
+        if mtime == self._mtime or not self._reload_lock.acquire(blocking=False):
+            return
+        self._mtime = mtime
+        threading.Thread(target=self._reload, daemon=True).start()
+
+    def _reload(self):
+        try:
+            self.build(self.loader())
+            self.reloads += 1
+            logger.info(f"Reloaded FAQ index from {self.path}")
+        except Exception as e:
+            logger.error(f"Error reloading FAQ index: {e}")
+        finally:
+            self._reload_lock.release()
+
+    def search(self, message):
+        """Return (answer, question, score) of the closest FAQ, or None if the index is empty"""
+        state = self._state
+        if state is None:
+            return None
+        vectorizer, matrix, answers, questions = state
+        scores = (matrix @ vectorizer.transform([message]).T).toarray().ravel()
+        best = int(scores.argmax())
+        return answers[best], questions[best], float(scores[best])
+
+    def match(self, message):
+        """Answer for a confident match, or None to fall through to the LLM"""
+        self._maybe_reload()
+        result = self.search(message)
+        if result is not None and result[2] >= self.threshold:
+            self.hits += 1
+            return result[0]
+        self.misses += 1
+        return None
+
+    def stats(self):
+        state = self._state
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(state[2]) if state else 0,
+            'threshold': self.threshold,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            'reloads': self.reloads
+        }
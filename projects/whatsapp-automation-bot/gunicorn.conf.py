@@ -0,0 +1,72 @@
+"""
+Gunicorn Configuration
+Production serving profile for the WhatsApp bot: threaded workers, preloaded app state and recycled workers
+"""
+
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+
+# Sync-mode webhooks spend most of their time waiting on OpenAI, so each worker
+# serves many requests on threads instead of one at a time
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS', '32'))
+
+# Conversations and webhook dedupe are shared through Redis when REDIS_URL is set;
+# without it they live in each worker, so a single worker keeps them consistent
+SHARED_STATE = bool(os.getenv('REDIS_URL'))
+workers = int(os.getenv('GUNICORN_WORKERS', str(multiprocessing.cpu_count() * 2 + 1 if SHARED_STATE else 1)))
+
+# Import the app (and build the FAQ index) once in the master; workers fork with it in memory
+preload_app = os.getenv('GUNICORN_PRELOAD', 'true').lower() == 'true'
+if preload_app:
+    # A background warm-up thread started in the master would not survive the fork
+    os.environ['WARMUP_MODE'] = 'eager'
+
+# Recycle workers after a jittered number of requests so they never restart together
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', '2000'))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', '200'))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '60'))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', '30'))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', '5'))
+
+if workers > 1 and not os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+    # Must be set before prometheus_client is imported by the preloaded app
+    os.environ['PROMETHEUS_MULTIPROC_DIR'] = tempfile.mkdtemp(prefix='whatsapp-metrics-')
+
+
+def on_starting(server):
+    # Metric files from a previous run would be added to this one's totals
+    metrics_dir = os.getenv('PROMETHEUS_MULTIPROC_DIR')
+    if metrics_dir and os.path.isdir(metrics_dir):
+        for name in os.listdir(metrics_dir):
+            path = os.path.join(metrics_dir, name)
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                os.remove(path)
+
+
+def when_ready(server):
+    if server.cfg.workers > 1 and not SHARED_STATE:
+        server.log.warning(
+            "REDIS_URL is not set: conversation history and webhook dedupe are not shared between workers"
+        )
+
+
+def worker_exit(server, worker):
+    # Recycled (max_requests) and stopped workers finish their webhook jobs before exiting
+    app_module = sys.modules.get('app')
+    job_queue = getattr(app_module, 'job_queue', None)
+    if job_queue is not None:
+        job_queue.stop(timeout=max(1, server.cfg.graceful_timeout - 5))
+
+
+def child_exit(server, worker):
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
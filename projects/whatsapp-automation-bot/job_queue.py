@@ -0,0 +1,370 @@
+"""
+Webhook Job Queue
+Enqueue-and-ack processing of incoming WhatsApp messages with a worker pool, acknowledgements and retries
+"""
+
+import heapq
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict, deque
+
+logger = logging.getLogger(__name__)
+
+try:
+    import redis
+except ImportError:  # pragma: no cover - redis is optional for local runs
+    redis = None
+
+
+class InProcessBackend:
+    """Queue and idempotency keys held in this process; for local runs and tests.
+
+    Jobs still queued when the process exits are lost, so ``JobQueue.stop``
+    drains the queue first.
+    """
+
+    name = "memory"
+
+    def __init__(self, dedupe_ttl: int, max_seen: int = 100000):
+        self._queue = queue.Queue()
+        self._delayed = []  # (due, sequence, payload) heap of jobs waiting for a retry
+        self._delayed_lock = threading.Lock()
+        self._sequence = 0
+        self._seen = OrderedDict()
+        self._seen_lock = threading.Lock()
+        self.dedupe_ttl = dedupe_ttl
+        self.max_seen = max_seen
+        self.drains = True
+
+    def claim(self, message_id: str) -> bool:
+        """Return True the first time a message id is seen within the TTL"""
+        now = time.time()
+        with self._seen_lock:
+            while self._seen:
+                oldest_id, seen_at = next(iter(self._seen.items()))
+                if seen_at > now - self.dedupe_ttl and len(self._seen) < self.max_seen:
+                    break
+                del self._seen[oldest_id]
+            if message_id in self._seen:
+                return False
+            self._seen[message_id] = now
+            return True
+
+    def release(self, message_id: str):
+        with self._seen_lock:
+            self._seen.pop(message_id, None)
+
+    def push(self, payload: str):
+        self._queue.put(payload)
+
+    def pop(self, timeout: float):
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def ack(self, payload: str):
+        pass
+
+    def retry(self, payload: str, new_payload: str, due: float):
+        with self._delayed_lock:
+            self._sequence += 1
+            heapq.heappush(self._delayed, (due, self._sequence, new_payload))
+
+    def reclaim(self) -> int:
+        """Queue retries that are due"""
+        now = time.time()
+        with self._delayed_lock:
+            while self._delayed and self._delayed[0][0] <= now:
+                self._queue.put(heapq.heappop(self._delayed)[2])
+        return 0
+
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    def in_flight(self) -> int:
+        return 0
+
+    def delayed(self) -> int:
+        return len(self._delayed)
+
+
+class RedisBackend:
+    """Queue shared by every gunicorn worker; jobs survive worker restarts.
+
+    A popped job is moved atomically (BLMOVE) to a processing list and given
+    a deadline; it leaves that list only when acknowledged. Jobs whose
+    deadline passed, because the worker holding them died or was recycled,
+    are put back at the head of the queue by ``reclaim``, which any worker
+    runs every few seconds. Retries wait in a sorted set until they are due.
+    """
+
+    name = "redis"
+
+    # KEYS: queue, processing, deadlines, delayed; ARGV: now, deadline for jobs found without one
+    RECLAIM_SCRIPT = """
+    for _, payload in ipairs(redis.call('LRANGE', KEYS[2], 0, -1)) do
+        if not redis.call('ZSCORE', KEYS[3], payload) then
+            redis.call('ZADD', KEYS[3], ARGV[2], payload)
+        end
+    end
+    local moved = 0
+    for _, payload in ipairs(redis.call('ZRANGEBYSCORE', KEYS[3], '-inf', ARGV[1], 'LIMIT', 0, 100)) do
+        redis.call('ZREM', KEYS[3], payload)
+        if redis.call('LREM', KEYS[2], 1, payload) > 0 then
+            redis.call('RPUSH', KEYS[1], payload)
+            moved = moved + 1
+        end
+    end
+    for _, payload in ipairs(redis.call('ZRANGEBYSCORE', KEYS[4], '-inf', ARGV[1], 'LIMIT', 0, 100)) do
+        redis.call('ZREM', KEYS[4], payload)
+        redis.call('RPUSH', KEYS[1], payload)
+    end
+    return moved
+    """
+
+    def __init__(self, url: str, dedupe_ttl: int, visibility_timeout: float, key: str = "whatsapp:webhook:jobs"):
+        self._redis = redis.Redis.from_url(url)
+        self.dedupe_ttl = dedupe_ttl
+        self.visibility_timeout = visibility_timeout
+        self.key = key
+        self.processing_key = f"{key}:processing"
+        self.deadlines_key = f"{key}:deadlines"
+        self.delayed_key = f"{key}:delayed"
+        self._reclaim = self._redis.register_script(self.RECLAIM_SCRIPT)
+        self.drains = False
+
+    def claim(self, message_id: str) -> bool:
+        return bool(self._redis.set(f"{self.key}:seen:{message_id}", 1, nx=True, ex=self.dedupe_ttl))
+
+    def release(self, message_id: str):
+        self._redis.delete(f"{self.key}:seen:{message_id}")
+
+    def push(self, payload: str):
+        self._redis.lpush(self.key, payload)
+
+    def pop(self, timeout: float):
+        payload = self._redis.blmove(self.key, self.processing_key, max(1, int(timeout)), "RIGHT", "LEFT")
+        if payload is not None:
+            self._redis.zadd(self.deadlines_key, {payload: time.time() + self.visibility_timeout})
+        return payload
+
+    def ack(self, payload):
+        with self._redis.pipeline() as pipe:
+            pipe.lrem(self.processing_key, 1, payload)
+            pipe.zrem(self.deadlines_key, payload)
+            pipe.execute()
+
+    def retry(self, payload, new_payload: str, due: float):
+        with self._redis.pipeline() as pipe:
+            pipe.lrem(self.processing_key, 1, payload)
+            pipe.zrem(self.deadlines_key, payload)
+            pipe.zadd(self.delayed_key, {new_payload: due})
+            pipe.execute()
+
+    def reclaim(self) -> int:
+        """Requeue jobs whose worker missed their deadline and retries that are due; returns the reclaimed count"""
+        now = time.time()
+        keys = [self.key, self.processing_key, self.deadlines_key, self.delayed_key]
+        return int(self._reclaim(keys=keys, args=[now, now + self.visibility_timeout]))
+
+    def depth(self) -> int:
+        return self._redis.llen(self.key)
+
+    def in_flight(self) -> int:
+        return self._redis.llen(self.processing_key)
+
+    def delayed(self) -> int:
+        return self._redis.zcard(self.delayed_key)
+
+
+class JobQueue:
+    """Acknowledges webhooks immediately and generates replies on worker threads.
+
+    ``handler`` receives each job dict. Workers are started lazily on the
+    first enqueue so they are created inside the serving process rather than
+    a pre-fork parent. A job that raises is retried with backoff up to
+    ``max_attempts`` times; after the last attempt its dedupe claim is
+    released, so a redelivery of the same message is processed again.
+    ``stop`` (called from gunicorn's ``worker_exit``) lets in-flight jobs
+    finish and, for the in-process backend, drains what is still queued.
+    """
+
+    def __init__(self, handler, workers: int = None, redis_url: str = None, dedupe_ttl: int = None,
+                 max_attempts: int = None, retry_base: float = None, visibility_timeout: float = None):
+        self.handler = handler
+        self.workers = workers or int(os.getenv('WEBHOOK_WORKERS', '8'))
+        self.max_attempts = max_attempts or int(os.getenv('WEBHOOK_MAX_ATTEMPTS', '3'))
+        self.retry_base = retry_base or float(os.getenv('WEBHOOK_RETRY_BASE_SECONDS', '5'))
+        dedupe_ttl = dedupe_ttl or int(os.getenv('WEBHOOK_DEDUPE_TTL', '86400'))
+        visibility_timeout = visibility_timeout or float(os.getenv('WEBHOOK_JOB_TIMEOUT', '300'))
+        redis_url = redis_url if redis_url is not None else os.getenv('REDIS_URL', '')
+        if redis_url and redis is not None:
+            self.backend = RedisBackend(redis_url, dedupe_ttl, visibility_timeout)
+        else:
+            self.backend = InProcessBackend(dedupe_ttl)
+        self.reclaim_interval = 5.0
+        self._next_reclaim = 0.0
+        self._threads = []
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stopping = threading.Event()
+        self.enqueued = 0
+        self.duplicates = 0
+        self.processed = 0
+        self.retried = 0
+        self.failed = 0
+        self.reclaimed = 0
+        self.queue_wait_ms = deque(maxlen=1000)
+        self.end_to_end_ms = deque(maxlen=1000)
+
+    def enqueue(self, message_id: str, user_id: str, text: str) -> bool:
+        """Queue a message for processing; returns False for a duplicate delivery"""
+        if message_id and not self.backend.claim(message_id):
+            with self._stats_lock:
+                self.duplicates += 1
+            return False
+        self._ensure_started()
+        try:
+            self.backend.push(json.dumps({
+                "message_id": message_id,
+                "user_id": user_id,
+                "text": text,
+                "enqueued_at": time.time(),
+                "attempts": 0,
+            }))
+        except Exception:
+            # Not queued, so a redelivery must not be answered as a duplicate
+            if message_id:
+                self.backend.release(message_id)
+            raise
+        with self._stats_lock:
+            self.enqueued += 1
+        return True
+
+    def _ensure_started(self):
+        if self._threads:
+            return
+        with self._start_lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f"webhook-worker-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _maybe_reclaim(self):
+        now = time.monotonic()
+        with self._stats_lock:
+            if now < self._next_reclaim:
+                return
+            self._next_reclaim = now + self.reclaim_interval
+        reclaimed = self.backend.reclaim()
+        if reclaimed:
+            logger.warning(f"Requeued {reclaimed} webhook jobs abandoned by their worker")
+            with self._stats_lock:
+                self.reclaimed += reclaimed
+
+    def _work(self):
+        while True:
+            stopping = self._stopping.is_set()
+            if stopping and not self.backend.drains:
+                return
+            try:
+                self._maybe_reclaim()
+                payload = self.backend.pop(timeout=0.2 if stopping else 1.0)
+            except Exception as e:
+                logger.error(f"Error reading webhook queue: {e}")
+                time.sleep(1)
+                continue
+            if payload is None:
+                if stopping:
+                    return
+                continue
+            self._process(payload)
+
+    def _process(self, payload):
+        job = json.loads(payload)
+        started = time.time()
+        try:
+            self.handler(job)
+            outcome = "processed"
+        except Exception as e:
+            attempts = job.get("attempts", 0) + 1
+            if attempts < self.max_attempts:
+                logger.warning(f"Retrying message {job.get('message_id')} (attempt {attempts}): {e}")
+                outcome = "retried"
+            else:
+                logger.error(f"Giving up on message {job.get('message_id')} after {attempts} attempts: {e}")
+                outcome = "failed"
+        finished = time.time()
+
+        try:
+            if outcome == "retried":
+                delay = self.retry_base * 2 ** (attempts - 1)
+                self.backend.retry(payload, json.dumps(dict(job, attempts=attempts)), finished + delay)
+            else:
+                self.backend.ack(payload)
+                if outcome == "failed" and job.get("message_id"):
+                    self.backend.release(job["message_id"])
+        except Exception as e:
+            # Left in the processing list, so it is reclaimed once its deadline passes
+            logger.error(f"Error acknowledging message {job.get('message_id')}: {e}")
+
+        with self._stats_lock:
+            setattr(self, outcome, getattr(self, outcome) + 1)
+            if outcome != "retried":
+                self.queue_wait_ms.append((started - job["enqueued_at"]) * 1000)
+                self.end_to_end_ms.append((finished - job["enqueued_at"]) * 1000)
+
+    def stop(self, timeout: float = 30.0):
+        """Stop taking jobs and wait up to ``timeout`` seconds for in-flight (and, in memory, queued) ones"""
+        self._stopping.set()
+        deadline = time.monotonic() + timeout
+        for thread in self._threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+        if self.backend.drains:
+            lost = self.backend.depth() + self.backend.delayed()
+            if lost:
+                logger.warning(f"Dropping {lost} queued webhook jobs held in process memory")
+
+    @staticmethod
+    def _percentiles(samples) -> dict:
+        if not samples:
+            return {"p50": 0.0, "p95": 0.0, "p99": 0.0}
+        ordered = sorted(samples)
+        pick = lambda pct: round(ordered[min(len(ordered) - 1, int(len(ordered) * pct))], 1)
+        return {"p50": pick(0.50), "p95": pick(0.95), "p99": pick(0.99)}
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            queue_wait = list(self.queue_wait_ms)
+            end_to_end = list(self.end_to_end_ms)
+            counters = {
+                "enqueued": self.enqueued,
+                "duplicates": self.duplicates,
+                "processed": self.processed,
+                "retried": self.retried,
+                "failed": self.failed,
+                "reclaimed": self.reclaimed,
+            }
+        try:
+            depth = self.backend.depth()
+            in_flight = self.backend.in_flight()
+            delayed = self.backend.delayed()
+        except Exception:
+            depth = in_flight = delayed = None
+        return {
+            "backend": self.backend.name,
+            "workers": self.workers,
+            "depth": depth,
+            "in_flight": in_flight,
+            "awaiting_retry": delayed,
+            **counters,
+            "queue_wait_ms": self._percentiles(queue_wait),
+            "end_to_end_ms": self._percentiles(end_to_end),
+        }
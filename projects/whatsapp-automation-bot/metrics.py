@@ -0,0 +1,215 @@
+"""
+Service Metrics
+Prometheus request histograms, per-stage timers, upstream error counters and in-flight gauges
+"""
+
+import os
+import time
+from typing import Optional, Tuple
+
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+from prometheus_client import multiprocess
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+REQUEST_LATENCY = Histogram(
+    'http_request_duration_seconds', 'HTTP request latency by route template',
+    ['method', 'route', 'status'], buckets=LATENCY_BUCKETS
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    'http_requests_in_flight', 'HTTP requests currently being handled', multiprocess_mode='livesum'
+)
+STAGE_LATENCY = Histogram(
+    'stage_duration_seconds', 'Time spent in a processing stage', ['stage'], buckets=LATENCY_BUCKETS
+)
+STAGE_ERRORS = Counter('stage_errors_total', 'Processing stages that raised', ['stage'])
+UPSTREAM_ERRORS = Counter('upstream_errors_total', 'Failed calls to external services', ['upstream', 'kind'])
+UPSTREAM_IN_FLIGHT = Gauge(
+    'upstream_requests_in_flight', 'Calls to external services in progress', ['upstream'],
+    multiprocess_mode='livesum'
+)
+CIRCUIT_STATE = Gauge(
+    'upstream_circuit_state', 'Circuit breaker state per external service: 0 closed, 1 half-open, 2 open',
+    ['upstream'], multiprocess_mode='max'
+)
+UPSTREAM_CONCURRENCY_LIMIT = Gauge(
+    'upstream_concurrency_limit', 'Adaptive limit on concurrent calls to an external service', ['upstream'],
+    multiprocess_mode='livesum'
+)
+UPSTREAM_RETRIES = Counter('upstream_retries_total', 'Calls to external services retried after a transient failure',
+                           ['upstream'])
+UPSTREAM_HEDGES = Counter('upstream_hedged_requests_total', 'Backup requests sent for slow calls, by winning attempt',
+                          ['upstream', 'winner'])
+UPSTREAM_REJECTED = Counter('upstream_rejected_total', 'Calls refused without reaching an external service',
+                            ['upstream', 'reason'])
+
+_stage_children = {}
+
+
+class stage:
+    """Time a block as a stage: ``with stage('tts'):`` or ``async with stage('llm', upstream='openai'):``.
+
+    With ``upstream`` set, the block also counts as an in-flight external
+    call and exceptions are counted as upstream errors by exception type.
+    Label lookups are cached, so entering a stage costs a dict lookup and
+    two clock reads.
+    """
+
+    __slots__ = ('_histogram', '_errors', '_in_flight', '_upstream', '_started')
+
+    def __init__(self, name: str, upstream: Optional[str] = None):
+        children = _stage_children.get((name, upstream))
+        if children is None:
+            children = (
+                STAGE_LATENCY.labels(name),
+                STAGE_ERRORS.labels(name),
+                UPSTREAM_IN_FLIGHT.labels(upstream) if upstream else None,
+            )
+            _stage_children[(name, upstream)] = children
+        self._histogram, self._errors, self._in_flight = children
+        self._upstream = upstream
+
+    def __enter__(self):
+        if self._in_flight is not None:
+            self._in_flight.inc()
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._histogram.observe(time.perf_counter() - self._started)
+        if self._in_flight is not None:
+            self._in_flight.dec()
+        if exc_type is not None:
+            self._errors.inc()
+            if self._upstream:
+                UPSTREAM_ERRORS.labels(self._upstream, exc_type.__name__).inc()
+        return False
+
+    async def __aenter__(self):
+        return self.__enter__()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return self.__exit__(exc_type, exc, tb)
+
+
+def upstream_error(upstream: str, kind: str):
+    """Count an upstream failure that was handled without raising"""
+    UPSTREAM_ERRORS.labels(upstream, kind).inc()
+
+
+def render_metrics() -> Tuple[bytes, str]:
+    """Exposition body and content type; aggregates all workers when PROMETHEUS_MULTIPROC_DIR is set"""
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+
+def _observe_request(method: str, route: str, status: int, started: float):
+    REQUESTS_IN_FLIGHT.dec()
+    REQUEST_LATENCY.labels(method, route, str(status)).observe(time.perf_counter() - started)
+
+
+class ASGIMetricsMiddleware:
+    """Pure ASGI middleware (no per-request Request object) timing every HTTP request"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        status = [500]
+
+        async def send_with_status(message):
+            if message['type'] == 'http.response.start':
+                status[0] = message['status']
+            await send(message)
+
+        REQUESTS_IN_FLIGHT.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            _observe_request(scope['method'], self._route(scope), status[0], started)
+
+    def _route(self, scope) -> str:
+        # The router stores the matched route in the shared scope; fall back to matching by hand
+        route = scope.get('route')
+        if route is None:
+            from starlette.routing import Match
+            router = scope.get('router') or getattr(scope.get('app'), 'router', None)
+            for candidate in getattr(router, 'routes', ()):
+                if candidate.matches(scope)[0] == Match.FULL:
+                    route = candidate
+                    break
+        return getattr(route, 'path', None) or 'unmatched'
+
+
+def instrument_fastapi(app):
+    """Add request timing middleware and a /metrics endpoint to a FastAPI app"""
+    from starlette.responses import Response
+
+    app.add_middleware(ASGIMetricsMiddleware)
+
+    @app.get('/metrics', include_in_schema=False)
+    def metrics():
+        body, content_type = render_metrics()
+        return Response(body, media_type=content_type)
+
+
+def instrument_flask(app):
+    """Add request timing hooks and a /metrics endpoint to a Flask app"""
+    from flask import Response, g, request
+
+    @app.before_request
+    def start_request_timer():
+        REQUESTS_IN_FLIGHT.inc()
+        g.metrics_started = time.perf_counter()
+
+    @app.after_request
+    def remember_status(response):
+        g.metrics_status = response.status_code
+        return response
+
+    @app.teardown_request
+    def observe_request(exc):
+        started = g.pop('metrics_started', None)
+        if started is None:
+            return
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        _observe_request(request.method, route, g.pop('metrics_status', 500), started)
+
+    @app.route('/metrics', methods=['GET'])
+    def metrics():
+        body, content_type = render_metrics()
+        return Response(body, content_type=content_type)
+
+
+class DjangoMetricsMiddleware:
+    """Django middleware timing every request by its URL pattern"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        REQUESTS_IN_FLIGHT.inc()
+        started = time.perf_counter()
+        status = 500
+        try:
+            response = self.get_response(request)
+            status = response.status_code
+            return response
+        finally:
+            match = getattr(request, 'resolver_match', None)
+            route = match.route if match is not None and match.route else 'unmatched'
+            _observe_request(request.method, route, status, started)
+
+
+def django_metrics_view(request):
+    from django.http import HttpResponse
+
+    body, content_type = render_metrics()
+    return HttpResponse(body, content_type=content_type)
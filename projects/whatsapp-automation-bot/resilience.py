@@ -0,0 +1,613 @@
+"""
+Upstream Resilience
+Per-upstream circuit breakers, deadlines, jittered retries, hedged requests and adaptive concurrency limits
+"""
+
+import asyncio
+import contextvars
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from typing import Awaitable, Callable, Dict, Optional, TypeVar
+
+from metrics import CIRCUIT_STATE, UPSTREAM_CONCURRENCY_LIMIT, UPSTREAM_HEDGES, UPSTREAM_REJECTED, \
+    UPSTREAM_RETRIES, stage
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+# HTTP statuses that say the upstream is overloaded or broken rather than that the request was wrong
+TRANSIENT_STATUSES = frozenset({408, 425, 429, 500, 502, 503, 504})
+# Timeout and connection errors of the HTTP clients in use (openai, httpx, requests), matched by name
+# so this module does not import any of them
+TRANSIENT_ERROR_NAMES = frozenset({
+    'APIConnectionError', 'APITimeoutError', 'ConnectError', 'ConnectTimeout', 'ReadTimeout', 'ReadError',
+    'RemoteProtocolError', 'PoolTimeout', 'Timeout', 'ConnectionError', 'ChunkedEncodingError',
+})
+# An attempt with less time than this left is not worth starting
+MIN_ATTEMPT_TIME = 0.05
+
+_deadline = contextvars.ContextVar('upstream_deadline', default=None)
+
+
+class UpstreamUnavailable(Exception):
+    """Raised instead of calling an upstream that is failing, saturated or out of time"""
+
+    reason = 'unavailable'
+
+    def __init__(self, upstream: str, message: str, retry_after: Optional[float] = None):
+        super().__init__(f"{upstream}: {message}")
+        self.upstream = upstream
+        self.retry_after = retry_after
+
+
+class CircuitOpenError(UpstreamUnavailable):
+    reason = 'circuit_open'
+
+
+class ConcurrencyLimitExceeded(UpstreamUnavailable):
+    reason = 'concurrency_limit'
+
+
+class DeadlineExceeded(UpstreamUnavailable):
+    reason = 'deadline'
+
+
+@contextmanager
+def deadline(seconds: Optional[float]):
+    """Bound every upstream call made inside the block to ``seconds`` from now.
+
+    The deadline lives in a context variable, so it follows the request into
+    asyncio tasks and ``asyncio.to_thread`` calls. A nested deadline can only
+    shorten the one around it. ``None`` or 0 leaves the current one in place.
+    """
+    if not seconds:
+        yield
+        return
+    at = time.monotonic() + seconds
+    current = _deadline.get()
+    token = _deadline.set(at if current is None else min(at, current))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def time_remaining() -> Optional[float]:
+    """Seconds left before the current deadline, or None without one"""
+    at = _deadline.get()
+    return None if at is None else at - time.monotonic()
+
+
+def is_timeout(exc: BaseException) -> bool:
+    return isinstance(exc, (TimeoutError, asyncio.TimeoutError, DeadlineExceeded)) or 'Timeout' in type(exc).__name__
+
+
+def status_code(exc: BaseException) -> Optional[int]:
+    """HTTP status carried by an SDK or HTTP client error, if any"""
+    status = getattr(exc, 'status_code', None)
+    if status is None:
+        status = getattr(getattr(exc, 'response', None), 'status_code', None)
+    return status if isinstance(status, int) else None
+
+
+def is_transient(exc: BaseException) -> bool:
+    """True for failures worth retrying, which also signal an overloaded or failing upstream"""
+    if isinstance(exc, UpstreamUnavailable):
+        return False
+    if isinstance(exc, (TimeoutError, asyncio.TimeoutError, ConnectionError)):
+        return True
+    status = status_code(exc)
+    if status is not None:
+        return status in TRANSIENT_STATUSES or status >= 500
+    return type(exc).__name__ in TRANSIENT_ERROR_NAMES
+
+
+def _setting(upstream: str, key: str, default: str) -> str:
+    """``<UPSTREAM>_<KEY>`` from the environment, then ``UPSTREAM_<KEY>``, then the default"""
+    return os.getenv(f"{upstream.upper()}_{key}") or os.getenv(f"UPSTREAM_{key}") or default
+
+
+def _close_loser(future):
+    """Done callback for the attempt that lost a hedge race: close what it returned, e.g. an open stream"""
+    if future.cancelled() or future.exception() is not None:
+        return
+    close = getattr(future.result(), 'close', None)
+    if callable(close):
+        try:
+            close()
+        except Exception as e:
+            logger.warning(f"Error closing a hedged attempt that lost: {e}")
+
+
+class CircuitBreaker:
+    """Stops calling an upstream while most of its recent calls fail.
+
+    Closed, every outcome goes into a window of the last ``window`` calls. With
+    at least ``min_calls`` recorded and a failure rate of ``failure_rate`` or
+    more the breaker opens: calls fail at once with CircuitOpenError for
+    ``open_seconds``. It then lets one probe through (half-open); a success
+    closes it again, a failure re-opens it.
+    """
+
+    CLOSED, HALF_OPEN, OPEN = 'closed', 'half_open', 'open'
+    _GAUGE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+    def __init__(self, name: str, window: int = 20, min_calls: int = 10, failure_rate: float = 0.5,
+                 open_seconds: float = 10.0):
+        self.name = name
+        self.min_calls = min(min_calls, window)
+        self.failure_rate = failure_rate
+        self.open_seconds = open_seconds
+        self.state = self.CLOSED
+        self.opened = 0
+        self._outcomes = deque(maxlen=window)
+        self._opened_at = 0.0
+        self._probe_started: Optional[float] = None
+        self._lock = threading.Lock()
+        self._gauge = CIRCUIT_STATE.labels(name)
+        self._gauge.set(0)
+
+    def _set_state(self, state: str):
+        self.state = state
+        self._gauge.set(self._GAUGE_VALUES[state])
+
+    def _open(self, now: float):
+        self._opened_at = now
+        self._probe_started = None
+        self.opened += 1
+        self._set_state(self.OPEN)
+        logger.warning(f"Circuit for {self.name} opened; failing fast for {self.open_seconds:.0f}s")
+
+    def allow(self):
+        """Raise CircuitOpenError unless a call may go to the upstream now"""
+        if self.state == self.CLOSED:
+            return
+        with self._lock:
+            now = time.monotonic()
+            if self.state == self.OPEN:
+                wait_for = self._opened_at + self.open_seconds - now
+                if wait_for > 0:
+                    raise CircuitOpenError(self.name, "circuit open", retry_after=wait_for)
+                self._set_state(self.HALF_OPEN)
+            if self.state == self.HALF_OPEN:
+                # One probe at a time; a probe that never reported back is replaced after open_seconds
+                if self._probe_started is not None and now - self._probe_started < self.open_seconds:
+                    raise CircuitOpenError(self.name, "circuit half-open, probe in flight", retry_after=1.0)
+                self._probe_started = now
+
+    def record(self, ok: bool):
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                if ok:
+                    self._outcomes.clear()
+                    self._probe_started = None
+                    self._set_state(self.CLOSED)
+                    logger.info(f"Circuit for {self.name} closed")
+                else:
+                    self._open(time.monotonic())
+                return
+            if self.state == self.OPEN:
+                # A late result from a call admitted before the breaker opened
+                return
+            self._outcomes.append(ok)
+            if len(self._outcomes) >= self.min_calls:
+                failures = len(self._outcomes) - sum(self._outcomes)
+                if failures / len(self._outcomes) >= self.failure_rate:
+                    self._open(time.monotonic())
+
+
+class AdaptiveLimiter:
+    """AIMD limit on concurrent calls to one upstream.
+
+    A success raises the limit by 1/limit, about one slot per limit's worth
+    of calls, while at least half of it is in use (an idle limit says nothing
+    about what the upstream could take); an overload
+    signal (timeout, 429, 5xx, connection error) multiplies it by
+    ``backoff``. Only calls admitted after the last decrease can cause another
+    one, so a burst of failures from the same flight cuts the limit once
+    instead of collapsing it. Callers over the limit wait for a slot, from
+    threads or from coroutines, up to a timeout.
+    """
+
+    def __init__(self, name: str, initial: float, min_limit: float = 1, max_limit: Optional[float] = None,
+                 backoff: float = 0.9):
+        self.name = name
+        self.min_limit = min_limit
+        self.max_limit = max_limit or initial
+        self.backoff = backoff
+        self.limit = float(min(max(initial, min_limit), self.max_limit))
+        self.in_flight = 0
+        self.decreases = 0
+        self._last_decrease = float('-inf')
+        self._waiters = deque()
+        self._lock = threading.Lock()
+        self._gauge = UPSTREAM_CONCURRENCY_LIMIT.labels(name)
+        self._gauge.set(self.limit)
+
+    def _try_acquire(self) -> Optional[float]:
+        if self.in_flight < int(self.limit):
+            self.in_flight += 1
+            return time.monotonic()
+        return None
+
+    def _wake(self):
+        # Called with the lock held; woken waiters re-check, so waking one too many is harmless
+        for _ in range(min(len(self._waiters), int(self.limit) - self.in_flight)):
+            self._waiters.popleft()()
+
+    def _give_up(self, wake) -> ConcurrencyLimitExceeded:
+        with self._lock:
+            try:
+                self._waiters.remove(wake)
+            except ValueError:
+                # Woken just as the wait timed out: pass the free slot on
+                self._wake()
+        return ConcurrencyLimitExceeded(self.name, f"{self.in_flight} calls in flight at limit {int(self.limit)}",
+                                        retry_after=1.0)
+
+    def acquire(self, timeout: float) -> float:
+        """Take a slot, waiting up to ``timeout``; returns the admission time to pass to release()"""
+        ends = time.monotonic() + timeout
+        while True:
+            with self._lock:
+                started = self._try_acquire()
+                if started is not None:
+                    return started
+                event = threading.Event()
+                self._waiters.append(event.set)
+            if not event.wait(max(0.0, ends - time.monotonic())):
+                raise self._give_up(event.set)
+
+    async def acquire_async(self, timeout: float) -> float:
+        loop = asyncio.get_running_loop()
+        ends = loop.time() + timeout
+        while True:
+            with self._lock:
+                started = self._try_acquire()
+                if started is not None:
+                    return started
+                future = loop.create_future()
+
+                def wake(future=future):
+                    loop.call_soon_threadsafe(lambda: future.done() or future.set_result(None))
+
+                self._waiters.append(wake)
+            try:
+                await asyncio.wait_for(future, max(0.0, ends - loop.time()))
+            except asyncio.TimeoutError:
+                raise self._give_up(wake) from None
+            except asyncio.CancelledError:
+                self._give_up(wake)
+                raise
+
+    def release(self, started: float, overloaded: Optional[bool]):
+        """Free a slot; ``overloaded`` True cuts the limit, False grows it, None (e.g. a 4xx) leaves it"""
+        with self._lock:
+            if overloaded:
+                if started >= self._last_decrease:
+                    self.limit = max(self.min_limit, self.limit * self.backoff)
+                    self._last_decrease = time.monotonic()
+                    self.decreases += 1
+                    self._gauge.set(self.limit)
+            elif overloaded is not None and self.limit < self.max_limit and self.in_flight * 2 >= self.limit:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+                self._gauge.set(self.limit)
+            self.in_flight -= 1
+            self._wake()
+
+
+class Upstream:
+    """Resilient calls to one external API.
+
+    Each attempt passes the circuit breaker, takes an adaptive concurrency
+    slot and runs with a timeout no longer than the caller's deadline allows.
+    Transient failures are retried with full-jitter exponential backoff while
+    time remains. With ``hedge_after`` set, an attempt still running after
+    that many seconds (or after the recent p95 latency, for "auto") gets a
+    backup request, and the first success wins; a losing attempt that also
+    succeeds has its result closed if it has a ``close()`` method, so hedged
+    streaming responses do not leak connections.
+
+    The callable receives the attempt timeout in seconds and must honour it,
+    e.g. by passing it to the HTTP client; async attempts are also cancelled
+    when it runs out. Settings default to ``<NAME>_<KEY>``, then
+    ``UPSTREAM_<KEY>`` environment variables.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        timeout: Optional[float] = None,
+        retries: Optional[int] = None,
+        retry_base_delay: Optional[float] = None,
+        retry_max_delay: Optional[float] = None,
+        max_concurrency: Optional[int] = None,
+        min_concurrency: Optional[int] = None,
+        queue_timeout: Optional[float] = None,
+        hedge_after: Optional[str] = None,
+        hedge_max_ratio: Optional[float] = None,
+        breaker: Optional[CircuitBreaker] = None,
+    ):
+        self.name = name
+        self.timeout = timeout or float(_setting(name, 'TIMEOUT', '30'))
+        self.retries = int(_setting(name, 'RETRIES', '2')) if retries is None else retries
+        self.retry_base_delay = retry_base_delay or float(_setting(name, 'RETRY_BASE_DELAY', '0.2'))
+        self.retry_max_delay = retry_max_delay or float(_setting(name, 'RETRY_MAX_DELAY', '2'))
+        self.queue_timeout = queue_timeout or float(_setting(name, 'QUEUE_TIMEOUT', str(self.timeout)))
+        # "auto" hedges after the recent p95 latency, a number after that many seconds; empty or 0 disables it
+        hedge_after = _setting(name, 'HEDGE_AFTER', '') if hedge_after is None else str(hedge_after)
+        self.hedge_after = hedge_after if hedge_after == 'auto' else float(hedge_after or 0) or None
+        self.hedge_max_ratio = hedge_max_ratio or float(_setting(name, 'HEDGE_MAX_RATIO', '0.1'))
+        self.breaker = breaker or CircuitBreaker(
+            name,
+            window=int(_setting(name, 'BREAKER_WINDOW', '20')),
+            min_calls=int(_setting(name, 'BREAKER_MIN_CALLS', '10')),
+            failure_rate=float(_setting(name, 'BREAKER_FAILURE_RATE', '0.5')),
+            open_seconds=float(_setting(name, 'BREAKER_OPEN_SECONDS', '10')),
+        )
+        max_concurrency = max_concurrency or int(_setting(name, 'MAX_CONCURRENCY', '32'))
+        self.limiter = AdaptiveLimiter(
+            name, initial=max_concurrency, max_limit=max_concurrency,
+            min_limit=min_concurrency or int(_setting(name, 'MIN_CONCURRENCY', '1')),
+        )
+        self._latencies = deque(maxlen=200)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+        self.calls = 0
+        self.retried = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.rejected: Dict[str, int] = {}
+
+    # -- shared steps -----------------------------------------------------
+
+    def _reject(self, error: UpstreamUnavailable) -> UpstreamUnavailable:
+        self.rejected[error.reason] = self.rejected.get(error.reason, 0) + 1
+        UPSTREAM_REJECTED.labels(self.name, error.reason).inc()
+        return error
+
+    def _budget(self, timeout: Optional[float]) -> float:
+        """Time this attempt may take: the per-attempt timeout, cut to what the deadline leaves"""
+        budget = min(timeout or self.timeout, self.timeout)
+        remaining = time_remaining()
+        if remaining is not None:
+            if remaining < MIN_ATTEMPT_TIME:
+                raise self._reject(DeadlineExceeded(self.name, "deadline exceeded before the call"))
+            budget = min(budget, remaining)
+        return budget
+
+    def _queue_budget(self) -> float:
+        """How long to wait for a concurrency slot: the queue timeout, cut to what the deadline leaves"""
+        remaining = time_remaining()
+        if remaining is None:
+            return self.queue_timeout
+        if remaining < MIN_ATTEMPT_TIME:
+            raise self._reject(DeadlineExceeded(self.name, "deadline exceeded before the call"))
+        return min(self.queue_timeout, remaining)
+
+    def _admit(self):
+        try:
+            self.breaker.allow()
+        except CircuitOpenError as e:
+            raise self._reject(e) from None
+
+    def _finish(self, started: float, error: Optional[BaseException]):
+        if error is None:
+            self._latencies.append(time.monotonic() - started)
+            self.breaker.record(True)
+            self.limiter.release(started, overloaded=False)
+        elif isinstance(error, (asyncio.CancelledError, UpstreamUnavailable)):
+            # A hedge that lost the race, a caller that went away or a deadline that ran out while
+            # queued: none of these says anything about the upstream
+            self.limiter.release(started, overloaded=None)
+        else:
+            transient = is_transient(error)
+            # A 429 comes from an upstream that works but is saturated: the limiter backs off, the breaker stays shut
+            self.breaker.record(not transient or status_code(error) == 429)
+            self.limiter.release(started, overloaded=True if transient else None)
+
+    def _retry_delay(self, attempt: int, error: Exception) -> Optional[float]:
+        """Seconds to wait before retrying, or None when the error or the deadline rules a retry out"""
+        if attempt >= self.retries or not is_transient(error):
+            return None
+        delay = random.uniform(0, min(self.retry_max_delay, self.retry_base_delay * 2 ** attempt))
+        remaining = time_remaining()
+        if remaining is not None and remaining < delay + MIN_ATTEMPT_TIME:
+            return None
+        self.retried += 1
+        UPSTREAM_RETRIES.labels(self.name).inc()
+        return delay
+
+    def _hedge_delay(self) -> Optional[float]:
+        if self.hedge_after != 'auto':
+            return self.hedge_after
+        if len(self._latencies) < 20:
+            return None
+        ordered = sorted(self._latencies)
+        return ordered[int(len(ordered) * 0.95)]
+
+    def _may_hedge(self) -> bool:
+        # Never hedge into a struggling or saturated upstream, and keep backups a small share of calls
+        return (self.breaker.state == CircuitBreaker.CLOSED
+                and self.limiter.in_flight < int(self.limiter.limit)
+                and self.hedges < self.hedge_max_ratio * self.calls)
+
+    def _hedge_won(self, backup: bool):
+        UPSTREAM_HEDGES.labels(self.name, 'backup' if backup else 'primary').inc()
+        if backup:
+            self.hedge_wins += 1
+
+    # -- blocking calls ---------------------------------------------------
+
+    def call(self, fn: Callable[[float], T], stage_name: Optional[str] = None, idempotent: bool = True,
+             timeout: Optional[float] = None) -> T:
+        """Run ``fn(attempt_timeout)`` with the breaker, limiter, retries and (if idempotent) hedging"""
+        self.calls += 1
+        attempt = 0
+        while True:
+            try:
+                if idempotent and self.hedge_after:
+                    return self._call_hedged(fn, stage_name, timeout)
+                return self._attempt(fn, stage_name, timeout)
+            except Exception as e:
+                delay = self._retry_delay(attempt, e) if idempotent else None
+                if delay is None:
+                    raise
+                logger.warning(f"Retrying {self.name} in {delay:.2f}s after {type(e).__name__}: {e}")
+                time.sleep(delay)
+                attempt += 1
+
+    def _attempt(self, fn: Callable[[float], T], stage_name: Optional[str], timeout: Optional[float]) -> T:
+        self._admit()
+        try:
+            started = self.limiter.acquire(self._queue_budget())
+        except ConcurrencyLimitExceeded as e:
+            raise self._reject(e) from None
+        error = None
+        try:
+            budget = self._budget(timeout)
+            if stage_name is None:
+                return fn(budget)
+            with stage(stage_name, upstream=self.name):
+                return fn(budget)
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            self._finish(started, error)
+
+    def _call_hedged(self, fn: Callable[[float], T], stage_name: Optional[str], timeout: Optional[float]) -> T:
+        pool = self._pool()
+        primary = pool.submit(contextvars.copy_context().run, self._attempt, fn, stage_name, timeout)
+        hedge_delay = self._hedge_delay()
+        if hedge_delay is None or wait([primary], timeout=hedge_delay).done or not self._may_hedge():
+            return primary.result()
+        self.hedges += 1
+        backup = pool.submit(contextvars.copy_context().run, self._attempt, fn, stage_name, timeout)
+        pending = {primary, backup}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    # The other attempt finishes in the background and frees its own slot
+                    self._hedge_won(future is backup)
+                    (primary if future is backup else backup).add_done_callback(_close_loser)
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    def _pool(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=int(self.limiter.max_limit) * 2, thread_name_prefix=f"{self.name}-hedge"
+                    )
+        return self._executor
+
+    # -- async calls ------------------------------------------------------
+
+    async def acall(self, fn: Callable[[float], Awaitable[T]], stage_name: Optional[str] = None,
+                    idempotent: bool = True, timeout: Optional[float] = None) -> T:
+        """Async ``call``: ``fn(attempt_timeout)`` returns an awaitable, cancelled if it runs past the timeout"""
+        self.calls += 1
+        attempt = 0
+        while True:
+            try:
+                if idempotent and self.hedge_after:
+                    return await self._acall_hedged(fn, stage_name, timeout)
+                return await self._aattempt(fn, stage_name, timeout)
+            except Exception as e:
+                delay = self._retry_delay(attempt, e) if idempotent else None
+                if delay is None:
+                    raise
+                logger.warning(f"Retrying {self.name} in {delay:.2f}s after {type(e).__name__}: {e}")
+                await asyncio.sleep(delay)
+                attempt += 1
+
+    async def _aattempt(self, fn: Callable[[float], Awaitable[T]], stage_name: Optional[str],
+                        timeout: Optional[float]) -> T:
+        self._admit()
+        try:
+            started = await self.limiter.acquire_async(self._queue_budget())
+        except ConcurrencyLimitExceeded as e:
+            raise self._reject(e) from None
+        error = None
+        try:
+            budget = self._budget(timeout)
+            if stage_name is None:
+                return await asyncio.wait_for(fn(budget), budget)
+            async with stage(stage_name, upstream=self.name):
+                return await asyncio.wait_for(fn(budget), budget)
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            self._finish(started, error)
+
+    async def _acall_hedged(self, fn: Callable[[float], Awaitable[T]], stage_name: Optional[str],
+                            timeout: Optional[float]) -> T:
+        primary = asyncio.ensure_future(self._aattempt(fn, stage_name, timeout))
+        hedge_delay = self._hedge_delay()
+        if hedge_delay is not None:
+            await asyncio.wait({primary}, timeout=hedge_delay)
+        if hedge_delay is None or primary.done() or not self._may_hedge():
+            return await primary
+        self.hedges += 1
+        backup = asyncio.ensure_future(self._aattempt(fn, stage_name, timeout))
+        pending = {primary, backup}
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        self._hedge_won(task is backup)
+                        (primary if task is backup else backup).add_done_callback(_close_loser)
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def stats(self) -> dict:
+        return {
+            "circuit": self.breaker.state,
+            "circuit_opened": self.breaker.opened,
+            "concurrency_limit": round(self.limiter.limit, 1),
+            "in_flight": self.limiter.in_flight,
+            "limit_decreases": self.limiter.decreases,
+            "calls": self.calls,
+            "retries": self.retried,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "rejected": dict(self.rejected),
+        }
+
+
+_upstreams: Dict[str, Upstream] = {}
+_upstreams_lock = threading.Lock()
+
+
+def get_upstream(name: str, **settings) -> Upstream:
+    """The process-wide Upstream for ``name``; ``settings`` apply only when it is first created"""
+    upstream = _upstreams.get(name)
+    if upstream is None:
+        with _upstreams_lock:
+            upstream = _upstreams.get(name)
+            if upstream is None:
+                upstream = _upstreams[name] = Upstream(name, **settings)
+    return upstream
+
+
+def upstream_stats() -> dict:
+    return {name: upstream.stats() for name, upstream in _upstreams.items()}
@@ -0,0 +1,23 @@
+from rest_framework import serializers
+
+from automation.tasks import BlockedURL, check_url_syntax
+
+
+class ScrapeRequestSerializer(serializers.Serializer):
+    urls = serializers.ListField(child=serializers.URLField(), min_length=1, max_length=50)
+    selector = serializers.CharField(required=False, allow_blank=True, default='')
+    instructions = serializers.CharField(required=False, allow_blank=True, default='')
+
+    def validate_urls(self, urls):
+        # Hostnames are resolved and checked again by the worker right before each fetch
+        for url in urls:
+            try:
+                check_url_syntax(url)
+            except BlockedURL as e:
+                raise serializers.ValidationError(str(e))
+        return urls
+
+
+class ExtractRequestSerializer(serializers.Serializer):
+    text = serializers.CharField()
+    fields = serializers.ListField(child=serializers.CharField(max_length=100), min_length=1, max_length=50)
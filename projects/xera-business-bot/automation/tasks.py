@@ -0,0 +1,166 @@
+"""
+Scraping and AI automation tasks
+"""
+
+import ipaddress
+import json
+import socket
+from urllib.parse import urljoin, urlsplit
+
+import requests
+from celery import chord, group, shared_task
+from django.conf import settings
+
+from tasks.base import JobTask
+
+USER_AGENT = 'XeraBot/1.0 (+business automation)'
+MAX_REDIRECTS = 5
+
+# One session per worker process keeps connections to frequently scraped hosts alive
+_session = requests.Session()
+_session.headers['User-Agent'] = USER_AGENT
+_openai_client = None
+
+
+class BlockedURL(ValueError):
+    """A scrape target that is not a public http(s) address (private, loopback, link-local, metadata...)"""
+
+
+def is_public_address(address):
+    ip = ipaddress.ip_address(address.split('%', 1)[0])
+    if ip.version == 6 and ip.ipv4_mapped:
+        ip = ip.ipv4_mapped
+    return ip.is_global and not ip.is_multicast
+
+
+def check_url_syntax(url):
+    """Checks that need no DNS lookup: scheme, and a host that is not a literal internal address"""
+    parts = urlsplit(url)
+    host = (parts.hostname or '').rstrip('.').lower()
+    if parts.scheme not in ('http', 'https') or not host:
+        raise BlockedURL(f"Only http(s) URLs can be scraped: {url}")
+    if host == 'localhost' or host.endswith('.localhost'):
+        raise BlockedURL(f"Refusing to scrape a local address: {url}")
+    try:
+        literal = not is_public_address(host)
+    except ValueError:
+        return parts
+    if literal:
+        raise BlockedURL(f"Refusing to scrape a non-public address: {url}")
+    return parts
+
+
+def check_public_url(url):
+    """Resolve the host and refuse the URL unless every address it resolves to is public"""
+    parts = check_url_syntax(url)
+    port = parts.port or (443 if parts.scheme == 'https' else 80)
+    try:
+        addresses = {info[4][0] for info in socket.getaddrinfo(parts.hostname, port, proto=socket.IPPROTO_TCP)}
+    except socket.gaierror as e:
+        raise requests.ConnectionError(f"Cannot resolve {parts.hostname}: {e}")
+    blocked = [address for address in addresses if not is_public_address(address)]
+    if blocked:
+        raise BlockedURL(f"Refusing to scrape {url}: {parts.hostname} resolves to {', '.join(sorted(blocked))}")
+
+
+def fetch_public(url):
+    """GET a public URL, checking the target of every redirect too"""
+    for _ in range(MAX_REDIRECTS + 1):
+        check_public_url(url)
+        response = _session.get(url, timeout=(5, 30), allow_redirects=False)
+        if not response.is_redirect:
+            return response
+        url = urljoin(url, response.headers['Location'])
+        response.close()
+    raise requests.TooManyRedirects(f"More than {MAX_REDIRECTS} redirects")
+
+
+class AIUnavailable(Exception):
+    """Transient OpenAI failure (connection, rate limit, server error) that AI tasks retry on"""
+
+
+AI_RETRY_ERRORS = (AIUnavailable,)
+
+
+def ai_client():
+    global _openai_client
+    if _openai_client is None:
+        # Imported here: the web process only queues these tasks, and workers preload it (xera_bot/celery.py)
+        import openai
+        _openai_client = openai.OpenAI(timeout=60, max_retries=0)
+    return _openai_client
+
+
+def chat(prompt, system, max_tokens=500):
+    import openai
+
+    try:
+        response = ai_client().chat.completions.create(
+            model=settings.XERA_AI_MODEL,
+            messages=[
+                {"role": "system", "content": system},
+                {"role": "user", "content": prompt},
+            ],
+            max_tokens=max_tokens,
+            temperature=0.2,
+        )
+    except (openai.APIConnectionError, openai.RateLimitError, openai.InternalServerError) as e:
+        raise AIUnavailable(str(e)) from e
+    return response.choices[0].message.content
+
+
+@shared_task(base=JobTask, autoretry_for=(requests.ConnectionError, requests.Timeout), retry_backoff=True,
+             retry_jitter=True, max_retries=3, soft_time_limit=60, time_limit=90)
+def scrape_page(url, selector=None, job_id=None):
+    """Fetch a page and return its title and visible text (optionally only ``selector`` matches)"""
+    from bs4 import BeautifulSoup
+
+    response = fetch_public(url)
+    response.raise_for_status()
+    soup = BeautifulSoup(response.text, 'html.parser')
+    for node in soup(['script', 'style', 'noscript']):
+        node.decompose()
+    nodes = soup.select(selector) if selector else [soup.body or soup]
+    text = "\n".join(node.get_text(" ", strip=True) for node in nodes)
+    return {
+        'url': url,
+        'title': soup.title.get_text(strip=True) if soup.title else '',
+        'text': text[:settings.SCRAPE_MAX_CHARS],
+    }
+
+
+@shared_task(base=JobTask, autoretry_for=AI_RETRY_ERRORS, retry_backoff=True, retry_jitter=True, max_retries=3,
+             soft_time_limit=120, time_limit=150)
+def summarize_pages(pages, instructions='', job_id=None):
+    """Chord callback: one AI summary over every scraped page"""
+    budget = settings.SCRAPE_MAX_CHARS // max(1, len(pages))
+    sources = "\n\n".join(f"Source: {page['url']}\nTitle: {page['title']}\n{page['text'][:budget]}" for page in pages)
+    summary = chat(
+        f"{instructions or 'Summarize the key business information in these pages.'}\n\n{sources}",
+        "You are a business analyst. Be concise and factual, and cite sources by URL.",
+    )
+    return {'summary': summary, 'sources': [page['url'] for page in pages]}
+
+
+@shared_task(base=JobTask, autoretry_for=AI_RETRY_ERRORS, retry_backoff=True, retry_jitter=True, max_retries=3,
+             soft_time_limit=120, time_limit=150)
+def extract_document(text, fields, job_id=None):
+    """Pull the named fields out of a document's text as a JSON object"""
+    content = chat(
+        f"Extract these fields: {', '.join(fields)}. Return only a JSON object with exactly those keys, "
+        f"using null for anything missing.\n\nDocument:\n{text[:settings.SCRAPE_MAX_CHARS]}",
+        "You extract structured data from business documents.",
+    )
+    try:
+        data = json.loads(content)
+    except ValueError:
+        raise ValueError(f"AI returned non-JSON output: {content[:200]}")
+    return {field: data.get(field) for field in fields}
+
+
+def scrape_signature(urls, selector=None, instructions='', job_id=None):
+    """A single tracked scrape, or a fan-out of scrapes joined by an AI summary"""
+    if len(urls) == 1 and not instructions:
+        return scrape_page.s(urls[0], selector, job_id=job_id)
+    return chord(group(scrape_page.s(url, selector) for url in urls),
+                 summarize_pages.s(instructions=instructions, job_id=job_id))
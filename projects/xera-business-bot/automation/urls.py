@@ -0,0 +1,8 @@
+from django.urls import path
+
+from automation.views import ExtractView, ScrapeView
+
+urlpatterns = [
+    path('scrape/', ScrapeView.as_view(), name='automation-scrape'),
+    path('extract/', ExtractView.as_view(), name='automation-extract'),
+]
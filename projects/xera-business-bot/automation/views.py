@@ -0,0 +1,38 @@
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from automation.serializers import ExtractRequestSerializer, ScrapeRequestSerializer
+from automation.tasks import extract_document, scrape_signature
+from tasks.dispatch import enqueue_job
+from tasks.serializers import AutomationJobSerializer
+
+
+class ScrapeView(APIView):
+    """Queue a scrape of one or more pages; several pages (or instructions) add an AI summary"""
+
+    def post(self, request):
+        serializer = ScrapeRequestSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        params = serializer.validated_data
+        job = enqueue_job(
+            'scrape', params,
+            lambda job: scrape_signature(params['urls'], params['selector'] or None, params['instructions'], job.id),
+            request.user,
+        )
+        return Response(AutomationJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+
+
+class ExtractView(APIView):
+    """Queue AI extraction of named fields from a document's text"""
+
+    def post(self, request):
+        serializer = ExtractRequestSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        params = serializer.validated_data
+        job = enqueue_job(
+            'extract', {'fields': params['fields'], 'chars': len(params['text'])},
+            lambda job: extract_document.s(params['text'], params['fields'], job_id=job.id),
+            request.user,
+        )
+        return Response(AutomationJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
@@ -0,0 +1,9 @@
+from django.contrib import admin
+
+from reports.models import Report
+
+
+@admin.register(Report)
+class ReportAdmin(admin.ModelAdmin):
+    list_display = ['id', 'name', 'rows', 'created_by', 'created_at']
+    readonly_fields = ['job', 'file', 'rows', 'created_at']
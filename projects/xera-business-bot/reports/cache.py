@@ -0,0 +1,59 @@
+"""
+Caching helpers for the reports API
+"""
+
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.response import Response
+
+GENERATION_KEY = 'reports:generation'
+
+
+def generation():
+    """Current cache generation of the reports API; entries from older generations are never read"""
+    return cache.get_or_set(GENERATION_KEY, time.time_ns, timeout=None)
+
+
+def invalidate():
+    # A new timestamp rather than incr: if the key is evicted, counting would restart and revive stale entries
+    cache.set(GENERATION_KEY, time.time_ns(), timeout=None)
+
+
+def cached_query(key, compute, timeout=None):
+    """Per-queryset cache: the result of ``compute()`` for ``timeout`` seconds (REPORTS_CACHE_TTL by default).
+
+    ``compute`` must return plain data (lists and dicts), not a lazy QuerySet.
+    """
+    timeout = settings.REPORTS_CACHE_TTL if timeout is None else timeout
+    if not timeout:
+        return compute()
+    return cache.get_or_set(key, compute, timeout)
+
+
+class CachedReadMixin:
+    """Per-view cache for list and retrieve responses.
+
+    Entries are keyed by user, generation and full path, so pagination and
+    filters get their own entries, and ``invalidate()`` drops them all at once.
+    """
+
+    def _cached(self, handler, request, *args, **kwargs):
+        timeout = settings.REPORTS_CACHE_TTL
+        if not timeout:
+            return handler(request, *args, **kwargs)
+        key = f"reports:view:{request.user.pk}:{generation()}:{request.get_full_path()}"
+        data = cache.get(key)
+        if data is not None:
+            return Response(data)
+        response = handler(request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(key, response.data, timeout)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self._cached(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._cached(super().retrieve, request, *args, **kwargs)
@@ -0,0 +1,29 @@
+"""
+Report models for Xera Business Automation Bot
+"""
+
+from django.conf import settings
+from django.db import models
+
+from tasks.models import AutomationJob
+
+REPORT_SECTIONS = ['jobs_by_status', 'jobs_by_kind', 'daily_volume']
+
+
+class Report(models.Model):
+    """A generated spreadsheet; its progress is the progress of ``job``"""
+
+    name = models.CharField(max_length=200)
+    sections = models.JSONField(default=list)
+    days = models.PositiveIntegerField(default=30)
+    job = models.ForeignKey(AutomationJob, null=True, blank=True, on_delete=models.SET_NULL, related_name='reports')
+    file = models.FileField(upload_to='reports/', blank=True)
+    rows = models.PositiveIntegerField(default=0)
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return self.name
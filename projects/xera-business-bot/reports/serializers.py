@@ -0,0 +1,16 @@
+from rest_framework import serializers
+
+from reports.models import REPORT_SECTIONS, Report
+
+
+class ReportSerializer(serializers.ModelSerializer):
+    status = serializers.CharField(source='job.status', default='queued', read_only=True)
+    error = serializers.CharField(source='job.error', default='', read_only=True)
+    sections = serializers.ListField(
+        child=serializers.ChoiceField(choices=REPORT_SECTIONS), min_length=1, default=lambda: list(REPORT_SECTIONS)
+    )
+
+    class Meta:
+        model = Report
+        fields = ['id', 'name', 'sections', 'days', 'status', 'error', 'file', 'rows', 'created_at']
+        read_only_fields = ['file', 'rows', 'created_at']
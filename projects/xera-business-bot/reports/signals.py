@@ -0,0 +1,22 @@
+"""
+Invalidate cached reports API responses when a report or its job changes
+"""
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from reports.cache import invalidate
+from reports.models import Report
+from tasks.signals import job_status_changed
+
+
+@receiver(post_save, sender=Report)
+@receiver(post_delete, sender=Report)
+def report_changed(sender, **kwargs):
+    invalidate()
+
+
+@receiver(job_status_changed)
+def report_job_changed(sender, job_id, **kwargs):
+    if Report.objects.filter(job_id=job_id).exists():
+        invalidate()
@@ -0,0 +1,77 @@
+"""
+Report generation tasks
+"""
+
+import io
+from datetime import timedelta
+
+from celery import chord, group, shared_task
+from django.core.files.base import ContentFile
+from django.db.models import Count, Q
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from reports.models import Report
+from tasks.base import JobTask
+from tasks.models import AutomationJob
+
+
+def jobs_by_status(jobs):
+    return list(jobs.values('status').annotate(count=Count('id')).order_by('status'))
+
+
+def jobs_by_kind(jobs):
+    return list(jobs.values('kind').annotate(
+        total=Count('id'),
+        succeeded=Count('id', filter=Q(status='succeeded')),
+        failed=Count('id', filter=Q(status='failed')),
+    ).order_by('kind'))
+
+
+def daily_volume(jobs):
+    rows = jobs.annotate(day=TruncDate('created_at')).values('day').annotate(count=Count('id')).order_by('day')
+    return [{'day': row['day'].isoformat(), 'count': row['count']} for row in rows]
+
+
+SECTION_BUILDERS = {
+    'jobs_by_status': jobs_by_status,
+    'jobs_by_kind': jobs_by_kind,
+    'daily_volume': daily_volume,
+}
+
+
+@shared_task(soft_time_limit=300, time_limit=330)
+def build_section(report_id, section):
+    """Chord header: aggregate one section in the database and return its rows"""
+    report = Report.objects.get(pk=report_id)
+    jobs = AutomationJob.objects.filter(created_at__gte=report.created_at - timedelta(days=report.days))
+    # Same visibility as the jobs API: non-staff owners only see their own jobs
+    owner = report.created_by
+    if owner is None:
+        jobs = jobs.none()
+    elif not owner.is_staff:
+        jobs = jobs.filter(created_by=owner)
+    return {'section': section, 'rows': SECTION_BUILDERS[section](jobs)}
+
+
+@shared_task(base=JobTask, soft_time_limit=300, time_limit=330)
+def assemble_report(sections, report_id, job_id=None):
+    """Chord callback: write every section to one sheet of an Excel workbook"""
+    import pandas as pd
+
+    report = Report.objects.get(pk=report_id)
+    buffer = io.BytesIO()
+    with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
+        for section in sections:
+            pd.DataFrame(section['rows']).to_excel(writer, sheet_name=section['section'][:31], index=False)
+    report.rows = sum(len(section['rows']) for section in sections)
+    report.file.save(f"report_{report.pk}_{timezone.now():%Y%m%d%H%M%S}.xlsx", ContentFile(buffer.getvalue()),
+                     save=False)
+    report.save(update_fields=['rows', 'file'])
+    return {'report_id': report.pk, 'file': report.file.name, 'rows': report.rows}
+
+
+def report_signature(report, job_id):
+    """Sections are built in parallel on the reports queue, then assembled into one file"""
+    return chord(group(build_section.s(report.pk, section) for section in report.sections),
+                 assemble_report.s(report.pk, job_id=job_id))
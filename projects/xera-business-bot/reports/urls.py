@@ -0,0 +1,8 @@
+from rest_framework.routers import SimpleRouter
+
+from reports.views import ReportViewSet
+
+router = SimpleRouter()
+router.register(r'', ReportViewSet, basename='report')
+
+urlpatterns = router.urls
@@ -0,0 +1,57 @@
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+from rest_framework import mixins, status, viewsets
+from rest_framework.decorators import action
+from rest_framework.response import Response
+
+from reports.cache import CachedReadMixin, cached_query
+from reports.models import REPORT_SECTIONS, Report
+from reports.serializers import ReportSerializer
+from reports.tasks import SECTION_BUILDERS, report_signature
+from tasks.dispatch import enqueue_job
+from tasks.models import AutomationJob
+
+
+class ReportViewSet(CachedReadMixin, mixins.CreateModelMixin, mixins.ListModelMixin, mixins.RetrieveModelMixin,
+                    viewsets.GenericViewSet):
+    """Generated reports; creating one queues it and returns 202 straight away"""
+
+    serializer_class = ReportSerializer
+
+    def get_queryset(self):
+        reports = Report.objects.select_related('job')
+        if not self.request.user.is_staff:
+            reports = reports.filter(created_by=self.request.user)
+        return reports
+
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        with transaction.atomic():
+            report = serializer.save(created_by=request.user)
+            report.job = enqueue_job(
+                'report', {'report_id': report.pk, 'sections': report.sections, 'days': report.days},
+                lambda job: report_signature(report, job.id), request.user,
+            )
+            report.save(update_fields=['job'])
+        return Response(self.get_serializer(report).data, status=status.HTTP_202_ACCEPTED)
+
+    @action(detail=False)
+    def summary(self, request):
+        """Live dashboard figures: every report section over the last ``days`` days, without generating a file"""
+        try:
+            days = min(365, max(1, int(request.query_params.get('days', 30))))
+        except ValueError:
+            days = 30
+        jobs = AutomationJob.objects.filter(created_at__gte=timezone.now() - timedelta(days=days))
+        scope = 'all'
+        if not request.user.is_staff:
+            jobs = jobs.filter(created_by=request.user)
+            scope = request.user.pk
+        data = cached_query(
+            f"reports:summary:{scope}:{days}",
+            lambda: {section: SECTION_BUILDERS[section](jobs) for section in REPORT_SECTIONS},
+        )
+        return Response(data)
@@ -0,0 +1,10 @@
+from django.contrib import admin
+
+from tasks.models import AutomationJob
+
+
+@admin.register(AutomationJob)
+class AutomationJobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'kind', 'status', 'created_by', 'created_at', 'finished_at']
+    list_filter = ['status', 'kind']
+    readonly_fields = ['celery_id', 'created_at', 'started_at', 'finished_at']
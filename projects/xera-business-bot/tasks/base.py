@@ -0,0 +1,45 @@
+"""
+Job-tracking Celery task base class
+"""
+
+from celery import Task
+from django.utils import timezone
+
+from tasks.models import AutomationJob
+from tasks.signals import job_status_changed
+
+
+class JobTask(Task):
+    """Mirrors a task's progress onto its AutomationJob when called with ``job_id``.
+
+    Only the task that finishes a job gets ``job_id``; in a chord that is the
+    callback, so the header tasks run untracked and the job succeeds once.
+    """
+
+    def before_start(self, task_id, args, kwargs):
+        job_id = kwargs.get('job_id')
+        if job_id:
+            AutomationJob.objects.filter(pk=job_id).update(
+                status='running', started_at=timezone.now(), celery_id=task_id
+            )
+            job_status_changed.send(sender=AutomationJob, job_id=job_id)
+
+    def on_success(self, retval, task_id, args, kwargs):
+        job_id = kwargs.get('job_id')
+        if job_id:
+            AutomationJob.objects.filter(pk=job_id).update(
+                status='succeeded', result=retval, finished_at=timezone.now()
+            )
+            job_status_changed.send(sender=AutomationJob, job_id=job_id)
+
+    def on_failure(self, exc, task_id, args, kwargs, einfo):
+        job_id = kwargs.get('job_id')
+        if job_id:
+            mark_failed(job_id, exc)
+
+
+def mark_failed(job_id, exc):
+    AutomationJob.objects.filter(pk=job_id).update(
+        status='failed', error=f"{type(exc).__name__}: {exc}", finished_at=timezone.now()
+    )
+    job_status_changed.send(sender=AutomationJob, job_id=job_id)
@@ -0,0 +1,31 @@
+"""
+Submitting automations to Celery
+"""
+
+from django.db import transaction
+
+from tasks.models import AutomationJob
+from tasks.tasks import mark_job_failed
+
+
+def enqueue_job(kind, params, build_signature, user=None):
+    """Record an AutomationJob and send its Celery canvas once the current transaction commits.
+
+    ``build_signature(job)`` returns the signature, group or chord to run; the
+    task that completes the job must be called with ``job_id=job.id``. Views
+    only ever enqueue, so long automations never run in a gunicorn thread.
+    """
+    job = AutomationJob.objects.create(
+        kind=kind,
+        params=params,
+        created_by=user if user is not None and user.is_authenticated else None,
+    )
+
+    def send():
+        canvas = build_signature(job)
+        canvas.on_error(mark_job_failed.s(job_id=job.id))
+        result = canvas.apply_async()
+        AutomationJob.objects.filter(pk=job.pk, celery_id='').update(celery_id=result.id)
+
+    transaction.on_commit(send)
+    return job
@@ -0,0 +1,10 @@
+from rest_framework import serializers
+
+from tasks.models import AutomationJob
+
+
+class AutomationJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = AutomationJob
+        fields = ['id', 'kind', 'status', 'params', 'result', 'error', 'created_at', 'started_at', 'finished_at']
+        read_only_fields = fields
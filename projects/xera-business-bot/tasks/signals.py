@@ -0,0 +1,4 @@
+from django.dispatch import Signal
+
+# Sent with ``job_id`` whenever a running task changes its AutomationJob's status
+job_status_changed = Signal()
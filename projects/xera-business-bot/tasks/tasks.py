@@ -0,0 +1,14 @@
+"""
+Celery tasks shared by all automations
+"""
+
+from celery import shared_task
+
+from tasks.base import mark_failed
+
+
+@shared_task
+def mark_job_failed(request, exc, traceback, job_id=None):
+    """Errback for a job's canvas: a failed chord header never reaches the task holding ``job_id``"""
+    if job_id:
+        mark_failed(job_id, exc)
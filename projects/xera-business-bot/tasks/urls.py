@@ -0,0 +1,8 @@
+from rest_framework.routers import SimpleRouter
+
+from tasks.views import AutomationJobViewSet
+
+router = SimpleRouter()
+router.register(r'', AutomationJobViewSet, basename='automation-job')
+
+urlpatterns = router.urls
@@ -0,0 +1,19 @@
+from rest_framework import viewsets
+
+from tasks.models import AutomationJob
+from tasks.serializers import AutomationJobSerializer
+
+
+class AutomationJobViewSet(viewsets.ReadOnlyModelViewSet):
+    """Status and results of submitted automations"""
+
+    serializer_class = AutomationJobSerializer
+
+    def get_queryset(self):
+        jobs = AutomationJob.objects.all()
+        if not self.request.user.is_staff:
+            jobs = jobs.filter(created_by=self.request.user)
+        status = self.request.query_params.get('status')
+        if status:
+            jobs = jobs.filter(status=status)
+        return jobs
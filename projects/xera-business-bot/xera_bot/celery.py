@@ -0,0 +1,25 @@
+"""
+Celery application for Xera Business Automation Bot
+Scraping, report and AI automations run on dedicated worker queues, never in gunicorn request threads
+"""
+
+import os
+
+from celery import Celery
+from celery.signals import worker_init
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'xera_bot.settings')
+
+app = Celery('xera_bot')
+
+# All CELERY_* names in settings.py configure the app
+app.config_from_object('django.conf:settings', namespace='CELERY')
+app.autodiscover_tasks()
+
+
+@worker_init.connect
+def preload_task_libraries(**kwargs):
+    """Import the libraries tasks use lazily once in the worker's main process, so pool children fork with them"""
+    import bs4  # noqa: F401
+    import openai  # noqa: F401
+    import pandas  # noqa: F401
@@ -0,0 +1,37 @@
+"""
+Health probes for Xera Business Automation Bot
+Liveness answers without touching any backend; readiness checks the database and the cache
+"""
+
+import logging
+
+from django.core.cache import cache
+from django.db import connection
+from django.http import JsonResponse
+
+logger = logging.getLogger(__name__)
+
+
+def liveness(request):
+    """The process is up and serving requests"""
+    return JsonResponse({'status': 'healthy', 'service': 'Xera Business Automation Bot'})
+
+
+def readiness(request):
+    """503 while the database or the cache cannot be reached, so no traffic is routed here"""
+    checks = {}
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+        checks['database'] = 'ok'
+    except Exception as e:
+        logger.error(f"Readiness: database unavailable: {e}")
+        checks['database'] = 'unavailable'
+    try:
+        cache.get('health:ready')
+        checks['cache'] = 'ok'
+    except Exception as e:
+        logger.error(f"Readiness: cache unavailable: {e}")
+        checks['cache'] = 'unavailable'
+    ready = all(status == 'ok' for status in checks.values())
+    return JsonResponse({'status': 'ready' if ready else 'unavailable', **checks}, status=200 if ready else 503)
@@ -32,6 +32,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'xera_bot.metrics.DjangoMetricsMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
@@ -67,7 +68,7 @@ WSGI_APPLICATION = 'xera_bot.wsgi.application'
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'NAME': os.getenv('SQLITE_PATH', BASE_DIR / 'db.sqlite3'),
     }
 }
 
@@ -123,13 +124,44 @@ CORS_ALLOW_ALL_ORIGINS = True
 CORS_ALLOW_CREDENTIALS = True
 
 # Celery settings
-CELERY_BROKER_URL = 'redis://localhost:6379/0'
-CELERY_RESULT_BACKEND = 'redis://localhost:6379/0'
+CELERY_BROKER_URL = os.getenv('CELERY_BROKER_URL', 'redis://localhost:6379/0')
+CELERY_RESULT_BACKEND = os.getenv('CELERY_RESULT_BACKEND', CELERY_BROKER_URL)
 CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
 
+# One queue per kind of work, each consumed by its own worker pool (see docker-compose.yml):
+# scraping is network-bound, reports are CPU-bound (pandas), ai waits on OpenAI
+CELERY_TASK_DEFAULT_QUEUE = 'default'
+CELERY_TASK_ROUTES = {
+    'automation.tasks.scrape_page': {'queue': 'scraping'},
+    'automation.tasks.summarize_pages': {'queue': 'ai'},
+    'automation.tasks.extract_document': {'queue': 'ai'},
+    'reports.tasks.*': {'queue': 'reports'},
+}
+
+# Workers take one task at a time and acknowledge it after it finishes, so a slow
+# task never holds others hostage and a killed worker's task is redelivered
+CELERY_WORKER_PREFETCH_MULTIPLIER = int(os.getenv('CELERY_PREFETCH_MULTIPLIER', '1'))
+CELERY_TASK_ACKS_LATE = True
+CELERY_TASK_REJECT_ON_WORKER_LOST = True
+CELERY_WORKER_MAX_TASKS_PER_CHILD = int(os.getenv('CELERY_MAX_TASKS_PER_CHILD', '200'))
+# Redelivery window for unacknowledged tasks; must exceed the longest task time limit
+CELERY_BROKER_TRANSPORT_OPTIONS = {'visibility_timeout': 3600}
+
+# Job outcomes are kept on AutomationJob; results only need to live long enough for chords
+CELERY_RESULT_EXPIRES = int(os.getenv('CELERY_RESULT_EXPIRES', '86400'))
+CELERY_TASK_IGNORE_RESULT = False
+
+# Seconds the reports API caches list/detail responses and summaries; 0 disables.
+# Off here because the default in-process cache is not shared between workers.
+REPORTS_CACHE_TTL = int(os.getenv('REPORTS_CACHE_TTL', '0'))
+
+# Automation settings
+XERA_AI_MODEL = os.getenv('XERA_AI_MODEL', 'gpt-3.5-turbo')
+SCRAPE_MAX_CHARS = int(os.getenv('SCRAPE_MAX_CHARS', '20000'))
+
 # Logging
 LOGGING = {
     'version': 1,
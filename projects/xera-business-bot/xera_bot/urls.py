@@ -7,12 +7,18 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 
+from xera_bot.health import liveness, readiness
+from xera_bot.metrics import django_metrics_view
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/automation/', include('automation.urls')),
     path('api/tasks/', include('tasks.urls')),
     path('api/reports/', include('reports.urls')),
     path('api/auth/', include('rest_framework.urls')),
+    path('metrics', django_metrics_view),
+    path('health', liveness),
+    path('ready', readiness),
 ]
 
 # Serve static and media files in development